@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mobilender.settings')
+    # The test suite adds the databases of the routing tests (see mobilender/settings_test.py)
+    settings_module = 'mobilender.settings_test' if sys.argv[1:2] == ['test'] else 'mobilender.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,7 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the metrics of a request cover the other middleware
+    'pedidos.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'pedidos.middleware.DatabaseRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,13 +61,18 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
        'rest_framework.authentication.SessionAuthentication',
     ),
+    'DEFAULT_PERMISSION_CLASSES': (
+       'rest_framework.permissions.IsAuthenticated',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'pedidos.pagination.CursorPagination',
 }
 
 ROOT_URLCONF = 'mobilender.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, timed for the request metrics (see pedidos/metrics.py)
+        'BACKEND': 'pedidos.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,13 +92,107 @@ WSGI_APPLICATION = 'mobilender.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Database profile: 'development' (SQLite defaults) or 'production' (WAL, tuned pragmas,
+# persistent connections and immediate transactions, see mobilender/sqlite3/base.py)
+DATABASE_PROFILE = os.environ.get('PEDIDOS_DATABASE_PROFILE', 'development')
+
+SQLITE_PRODUCTION_OPTIONS = {
+    'transaction_mode': 'IMMEDIATE',
+    'pragmas': {
+        # Readers do not block the writer and the writer does not block readers
+        'journal_mode': 'WAL',
+        # With WAL, NORMAL only syncs at checkpoints (safe against corruption, a power loss
+        # may lose the last transactions)
+        'synchronous': 'NORMAL',
+        # Milliseconds a connection waits for the write lock before "database is locked"
+        'busy_timeout': int(os.environ.get('PEDIDOS_SQLITE_BUSY_TIMEOUT', 5000)),
+        # Page cache of each connection (negative: KiB) and memory mapped I/O (bytes)
+        'cache_size': -int(os.environ.get('PEDIDOS_SQLITE_CACHE_KB', 65536)),
+        'mmap_size': int(os.environ.get('PEDIDOS_SQLITE_MMAP_SIZE', 268435456)),
+        'temp_store': 'MEMORY',
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'mobilender.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS if DATABASE_PROFILE == 'production' else {},
+        # Connections are reused by the requests of a thread for this many seconds
+        'CONN_MAX_AGE': int(os.environ.get('PEDIDOS_CONN_MAX_AGE', 600)) if DATABASE_PROFILE == 'production' else 0,
+        'CONN_HEALTH_CHECKS': DATABASE_PROFILE == 'production',
+    }
+}
+
+# Read replicas of the default database (SQLite files kept up to date by the replication tool
+# of the deployment), comma separated: PEDIDOS_DATABASE_REPLICAS=/data/replica1.sqlite3,/data/replica2.sqlite3
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('PEDIDOS_DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASE_REPLICAS.append('replica%d' % number)
+    DATABASES['replica%d' % number] = {**DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+
+# Seconds the replicas may lag behind: clients read from the default database for this long after
+# they write, and catalog pages read from a replica are cached for at most this long
+REPLICA_MAX_LAG = int(os.environ.get('PEDIDOS_REPLICA_MAX_LAG', 5))
+
+# Suppliers whose items, orders and dispatches are kept in their own database, as
+# file:supplier ids separated by semicolons: PEDIDOS_SUPPLIER_SHARDS=/data/shard1.sqlite3:12,57;/data/shard2.sqlite3:80
+# (run python manage.py sync_shards after changing it)
+SUPPLIER_SHARDS = {}
+for number, shard in enumerate(filter(None, os.environ.get('PEDIDOS_SUPPLIER_SHARDS', '').split(';')), start=1):
+    path, _, suppliers = shard.rpartition(':')
+    SUPPLIER_SHARDS['shard%d' % number] = [int(supplier) for supplier in suppliers.split(',')]
+    DATABASES['shard%d' % number] = {**DATABASES['default'], 'NAME': path}
+
+DATABASE_ROUTERS = ['pedidos.routers.DatabaseRouter']
+
+# Order writes of a process wait for each other instead of competing for the SQLite write lock,
+# and are retried (with exponential backoff) when the database is still locked (see pedidos/writes.py)
+SERIALIZE_WRITES = DATABASE_PROFILE == 'production'
+WRITE_RETRIES = int(os.environ.get('PEDIDOS_WRITE_RETRIES', 3))
+WRITE_RETRY_DELAY = float(os.environ.get('PEDIDOS_WRITE_RETRY_DELAY', 0.05))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# PEDIDOS_CACHE_BACKEND selects where cached catalog pages and items are stored:
+#   locmem (default): memory of each process, for development or a single worker
+#   file: files shared by all the workers of the host
+#   redis: local Redis server (requires the redis package), bound its memory
+#          with maxmemory and maxmemory-policy allkeys-lru in redis.conf
+# locmem and file keep at most PEDIDOS_CACHE_MAX_ENTRIES entries and evict the oldest ones
+
+CACHE_BACKEND = os.environ.get('PEDIDOS_CACHE_BACKEND', 'locmem')
+CACHE_MAX_ENTRIES = int(os.environ.get('PEDIDOS_CACHE_MAX_ENTRIES', 10000))
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pedidos',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('PEDIDOS_CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('PEDIDOS_REDIS_URL', 'redis://127.0.0.1:6379'),
+    },
+}
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'OPTIONS': {
+            'MAX_ENTRIES': CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': 4,
+        } if CACHE_BACKEND != 'redis' else {},
     }
 }
 
+# Seconds a catalog page or item stays cached (changes invalidate them before)
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('PEDIDOS_CATALOG_CACHE_TIMEOUT', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -112,6 +215,42 @@ AUTH_PASSWORD_VALIDATORS = [
 # Custom User model to handle Client and Supplier roles
 AUTH_USER_MODEL = 'pedidos.User'
 
+# The session user and its Client/Supplier profile are loaded in one query and cached
+AUTHENTICATION_BACKENDS = ['pedidos.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = int(os.environ.get('PEDIDOS_USER_CACHE_TIMEOUT', 300))
+
+# Sessions are read from the cache and written through to the database (db fallback)
+# PEDIDOS_SESSION_ENGINE=django.contrib.sessions.backends.db disables the cache
+SESSION_ENGINE = os.environ.get('PEDIDOS_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+# Order numbers each process reserves at once from the order number sequence
+ORDER_NUMBER_BLOCK_SIZE = int(os.environ.get('PEDIDOS_ORDER_NUMBER_BLOCK_SIZE', 100))
+
+# Seconds an idempotency key of an order creation is remembered (retries within this time are not placed again)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('PEDIDOS_IDEMPOTENCY_KEY_TTL', 3600))
+
+# Background jobs, run by the run_jobs command (see pedidos/jobs.py)
+# Failed jobs are retried after JOB_RETRY_DELAY seconds, doubled after every attempt (at most
+# JOB_MAX_RETRY_DELAY), until they fail JOB_MAX_ATTEMPTS times. Jobs running for longer than
+# JOB_TIMEOUT seconds are assumed lost (their worker died) and run again
+JOB_MAX_ATTEMPTS = int(os.environ.get('PEDIDOS_JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_DELAY = float(os.environ.get('PEDIDOS_JOB_RETRY_DELAY', 10))
+JOB_MAX_RETRY_DELAY = float(os.environ.get('PEDIDOS_JOB_MAX_RETRY_DELAY', 3600))
+JOB_TIMEOUT = int(os.environ.get('PEDIDOS_JOB_TIMEOUT', 600))
+
+# Dispatch processing (see pedidos/dispatch.py): jobs running at once across all the workers,
+# directory of the shipping labels and address notified of the dispatches to associated
+# companies (no notification when empty)
+DISPATCH_JOB_CONCURRENCY = int(os.environ.get('PEDIDOS_DISPATCH_JOB_CONCURRENCY', 4))
+DISPATCH_LABEL_DIR = os.environ.get('PEDIDOS_DISPATCH_LABEL_DIR', str(BASE_DIR / 'labels'))
+DISPATCH_NOTIFICATION_EMAIL = os.environ.get('PEDIDOS_DISPATCH_NOTIFICATION_EMAIL', '')
+
+# Request metrics (see pedidos/metrics.py): requests slower than SLOW_REQUEST_THRESHOLD
+# milliseconds are logged with their SQL (logger pedidos.slow_requests). /metrics/ is read
+# by staff users or with the METRICS_TOKEN bearer token (e.g. by Prometheus)
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('PEDIDOS_SLOW_REQUEST_MS', 500))
+METRICS_TOKEN = os.environ.get('PEDIDOS_METRICS_TOKEN', '')
+
 # Urls
 LOGIN_REDIRECT_URL = 'client-home'
 LOGIN_URL = 'login'
@@ -0,0 +1,16 @@
+"""
+Settings of the test suite (selected by manage.py test).
+
+The databases of the routing tests are declared here, before the test runner creates
+the test databases: a replica of the default database (that never lags) and a shard.
+Tests use them through override_settings(DATABASE_REPLICAS=..., SUPPLIER_SHARDS=...).
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+
+DATABASES = {
+    **DATABASES,
+    'replica1': {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+    'shard1': {**DATABASES['default'], 'NAME': BASE_DIR / 'shard1.sqlite3'},
+}
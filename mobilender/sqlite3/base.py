@@ -0,0 +1,32 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''
+    SQLite backend with per-connection pragmas and a configurable transaction mode.
+    Two extra OPTIONS (the other ones go to sqlite3.connect as usual):
+
+        'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', ...}
+            executed on every new connection, in order
+        'transaction_mode': 'IMMEDIATE'
+            transactions take the write lock when they start (BEGIN IMMEDIATE), so a
+            transaction that reads before writing waits for the other writers
+            (busy_timeout) instead of failing with "database is locked" when it writes
+    '''
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute('PRAGMA %s = %s' % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute('BEGIN %s' % self.transaction_mode)
+        else:
+            super()._start_transaction_under_autocommit()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import User, Item, Order, Client, Supplier, ManageOrder
+from django.utils import timezone
+from .models import User, Item, Order, Client, Supplier, ManageOrder, Job
 
 # Register your models here.
 admin.site.register(User)
@@ -7,4 +8,17 @@ admin.site.register(Item)
 admin.site.register(Order)
 admin.site.register(Client)
 admin.site.register(Supplier)
-admin.site.register(ManageOrder)
\ No newline at end of file
+admin.site.register(ManageOrder)
+
+
+# Background jobs (see jobs.py): failed jobs can be run again from the list
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'task', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'finished_at', 'worker')
+    list_filter = ('status', 'task')
+    readonly_fields = ('attempts', 'started_at', 'finished_at', 'worker', 'last_error')
+    actions = ['retry']
+
+    @admin.action(description='Run the selected jobs again')
+    def retry(self, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(status=Job.PENDING, run_after=timezone.now(), attempts=0)
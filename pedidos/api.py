@@ -0,0 +1,224 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db import router as db_router
+from django.http import Http404
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.routers import SimpleRouter
+from .bulk_orders import order_database, place_orders
+from .dispatch import save_dispatch
+from .forms import CatalogFilterForm, CatalogSearchForm, BulkDispatchForm
+from .idempotency import IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_KEY_MAX_LENGTH, run_once
+from .lifecycle import STATUS_NAMES, InvalidTransition, transition
+from .models import Item, Order, ManageOrder
+from .routers import across_databases, get_across_databases, supplier_database
+from .permissions import IsClient, IsSupplier, IsSupplierOrReadOnlyClient, IsClientOrReadOnlySupplier
+from .sequences import order_numbers
+from .serializers import ItemSerializer, OrderSerializer, ManageOrderSerializer, BulkOrderSerializer
+from .writes import serialized_write
+
+
+# Header of the responses of a retry that returns the stored result of the first request
+IDEMPOTENT_REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def idempotency_key(request):
+    # Idempotency key of the request header ('' when there is none)
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER, '').strip()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise serializers.ValidationError(
+            {IDEMPOTENCY_KEY_HEADER: ['Ensure this value has at most %d characters.' % IDEMPOTENCY_KEY_MAX_LENGTH]})
+    return key
+
+
+# Client views of rows kept in every database (see routers.py): lists merge the rows of
+# the databases (see pagination.MergedQuerySet), single rows are read from whichever
+# database holds them. Suppliers only reach their own database (supplier_database()).
+class AcrossDatabasesMixin:
+
+    def paginate_queryset(self, queryset):
+        if self.request.user.is_client:
+            queryset = across_databases(queryset)
+        return super().paginate_queryset(queryset)
+
+    def get_object(self):
+        if not self.request.user.is_client:
+            return super().get_object()
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = get_across_databases(queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}))
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404('No %s matches the given query.' % queryset.model._meta.object_name)
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+# Items: clients read the whole catalog (same filters as the client dashboard),
+# suppliers manage their own items (in their database, see routers.py)
+class ItemViewSet(AcrossDatabasesMixin, viewsets.ModelViewSet):
+    serializer_class = ItemSerializer
+    permission_classes = [IsSupplierOrReadOnlyClient]
+
+    def get_queryset(self):
+        # Swagger schema generation has no authenticated user
+        if getattr(self, 'swagger_fake_view', False):
+            return Item.objects.none()
+        user = self.request.user
+        if user.is_supplier:
+            return Item.objects.using(supplier_database(user.pk)).filter(supplier_id=user.pk)
+        return CatalogFilterForm(self.request.query_params).filter_queryset(Item.objects.all())
+
+    def perform_create(self, serializer):
+        serializer.save(supplier_id=self.request.user.pk)
+
+    # Catalog search: ?q=words and the catalog filters, best matches first
+    # (at most SEARCH_MAX_RESULTS items, not paginated, see search.py)
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        form = CatalogSearchForm(request.query_params)
+        if not form.is_valid():
+            raise serializers.ValidationError(form.errors)
+        return Response(self.get_serializer(form.search(), many=True).data)
+
+
+# Orders: clients manage their own orders, suppliers read the orders of their items
+class OrderViewSet(AcrossDatabasesMixin, viewsets.ModelViewSet):
+    serializer_class = OrderSerializer
+    permission_classes = [IsClientOrReadOnlySupplier]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Order.objects.none()
+        user = self.request.user
+        if user.is_client:
+            orders = Order.objects.filter(client_id=user.pk)
+        else:
+            orders = Order.objects.using(supplier_database(user.pk)).filter(item__supplier_id=user.pk)
+        # Client username is part of every serialized order
+        return orders.select_related('client__user')
+
+    # Requests with an Idempotency-Key header are placed once: a retry with the same key
+    # gets the order created by the first request (see idempotency.run_once)
+    def create(self, request, *args, **kwargs):
+        key = idempotency_key(request)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The key is stored in the database of the order (the one of its item, see routers.py),
+        # in the same transaction. Numbered before the transaction, from the block of order
+        # numbers of this process
+        using = db_router.db_for_write(Order, instance=Order(item=serializer.validated_data['item']))
+        data, replayed = run_once(request.user.client, key, lambda number: self.save_order(serializer, number, using),
+                                  prepare=lambda: order_numbers.allocate()[0], using=using)
+        headers = self.get_success_headers(data)
+        if replayed:
+            headers[IDEMPOTENT_REPLAYED_HEADER] = 'true'
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def save_order(self, serializer, order_number, using):
+        # Runs again when the database was locked: always save a new order
+        serializer.instance = None
+        try:
+            with transaction.atomic(using=using):
+                serializer.save(client=self.request.user.client, orderNo=order_number)
+        except IntegrityError:
+            # One order per client and item (enforced by the database)
+            raise serializers.ValidationError({'item': ['This item has already been ordered.']})
+        return serializer.data
+
+    def perform_update(self, serializer):
+        serializer.save(client=self.request.user.client)
+
+    # Place many orders at once: {"lines": [{"item": 1, "quantity": 3, "is_urgent": true}, ...]}
+    # Valid lines are inserted in one transaction, the result of every line is reported
+    # (idempotent with an Idempotency-Key header, like create)
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[IsClient],
+            serializer_class=BulkOrderSerializer)
+    def bulk(self, request):
+        key = idempotency_key(request)
+        serializer = BulkOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        lines = serializer.validated_data['lines']
+        # The orders and the key are written in one transaction of one database
+        using = order_database(lines)
+
+        def place(numbers):
+            results = place_orders(request.user.client, lines, using=using, numbers=numbers)
+            created = sum(1 for result in results if result['status'] == 'created')
+            return {'created': created, 'failed': len(results) - created, 'results': results}
+
+        # Numbered before the transaction, from the block of order numbers of this process
+        # (one per line, the numbers of the invalid lines are not used)
+        data, replayed = run_once(request.user.client, key, place,
+                                  prepare=lambda: order_numbers.allocate(len(lines)), using=using)
+        headers = {IDEMPOTENT_REPLAYED_HEADER: 'true'} if replayed else None
+        return Response(data, headers=headers,
+                        status=status.HTTP_201_CREATED if data['created'] else status.HTTP_400_BAD_REQUEST)
+
+    def cancel_order(self, order):
+        # Orders are not deleted but cancelled, only while they are placed (see lifecycle.TRANSITIONS)
+        using = db_router.db_for_write(Order, instance=order)
+        try:
+            serialized_write(lambda: transition([order.pk], Order.CANCELLED, using=using), using=using)
+        except InvalidTransition as error:
+            raise serializers.ValidationError(
+                {'status': ['Only placed orders can be cancelled (this one is %s).'
+                            % STATUS_NAMES.get(error.invalid[order.pk], 'deleted').lower()]})
+        order.status = Order.CANCELLED
+
+    # Cancel a placed order (orders the supplier already managed cannot be cancelled)
+    @action(detail=True, methods=['post'], permission_classes=[IsClient])
+    def cancel(self, request, pk=None):
+        order = self.get_object()
+        self.cancel_order(order)
+        return Response(self.get_serializer(order).data)
+
+    # DELETE cancels the order like cancel, its row and history are kept
+    def destroy(self, request, *args, **kwargs):
+        self.cancel_order(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Dispatches of orders: suppliers create and read the dispatches of their orders
+class ManageOrderViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                         viewsets.GenericViewSet):
+    serializer_class = ManageOrderSerializer
+    permission_classes = [IsSupplier]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ManageOrder.objects.none()
+        supplier_id = self.request.user.pk
+        return ManageOrder.objects.using(supplier_database(supplier_id)).filter(orderNo__item__supplier_id=supplier_id)
+
+    # Saved with Model.save() (in the database of the order, see routers.py) together with
+    # the job that processes it (see dispatch.py)
+    def perform_create(self, serializer):
+        dispatch = ManageOrder(**serializer.validated_data)
+        try:
+            serializer.instance = save_dispatch(dispatch, using=db_router.db_for_write(Order, instance=dispatch.orderNo))
+        except InvalidTransition:
+            # Cancelled by the client since the order was validated
+            raise serializers.ValidationError({'orderNo': ['This order is not pending.']})
+
+    # Dispatch many orders at once to one destination:
+    # {"destination": "branch", "reference": "r1", "branch_code": 7, "orders": [1, 2, ...]}
+    # without "orders" the pending orders matching "min_priority" and "item" are dispatched,
+    # highest priority first (see bulk_dispatch.dispatch_orders), the result of every order is reported
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        form = BulkDispatchForm(request.data)
+        if not form.is_valid():
+            raise serializers.ValidationError(form.errors)
+        results = form.dispatch(request.user.pk)
+        dispatched = sum(1 for result in results if result['status'] == 'dispatched')
+        return Response({'dispatched': dispatched, 'failed': len(results) - dispatched, 'results': results},
+                        status=status.HTTP_201_CREATED if dispatched else status.HTTP_400_BAD_REQUEST)
+
+
+router = SimpleRouter()
+router.register('items', ItemViewSet, basename='api-item')
+router.register('orders', OrderViewSet, basename='api-order')
+router.register('manage-orders', ManageOrderViewSet, basename='api-manage-order')
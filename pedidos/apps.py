@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PedidosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pedidos'
+
+    def ready(self):
+        # Register signal receivers and background tasks
+        from . import signals, dispatch
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+# Seconds an authenticated user stays cached (saving the user or its profile invalidates it before)
+USER_CACHE_TIMEOUT = getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def user_cache_key(user_id):
+    return 'pedidos:user:%s' % user_id
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    '''
+    Authentication backend that loads the user of the session together with its
+    Client or Supplier profile in one query, and caches them across requests.
+    Views can then read request.user.client / request.user.supplier without queries.
+    '''
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            user = UserModel._default_manager.select_related('client', 'supplier').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,87 @@
+from django.db import DEFAULT_DB_ALIAS, IntegrityError
+from .dispatch import DISPATCH_TASK
+from .jobs import enqueue_many
+from .lifecycle import STATUS_NAMES, InvalidTransition, transition
+from .models import Order, ManageOrder
+from .routers import supplier_database
+from .writes import serialized_write
+
+# Orders dispatched by one bulk dispatch at most
+BULK_DISPATCH_MAX_ORDERS = 5000
+# Rows inserted per INSERT statement
+BULK_DISPATCH_BATCH_SIZE = 500
+
+# Dispatch fields required by each destination (same as the manage order forms)
+DESTINATION_FIELDS = {
+    'distribution_center': ('warehouse',),
+    'branch': ('reference', 'branch_code'),
+    'associated_company': ('reference', 'branch_code', 'details'),
+}
+DISPATCH_FIELDS = ('warehouse', 'reference', 'branch_code', 'details')
+
+
+def dispatch_orders(supplier_id, destination, values, numbers=None, filter_queryset=None,
+                    limit=BULK_DISPATCH_MAX_ORDERS):
+    '''
+    Dispatch many pending orders of the supplier items to ``destination`` in a single
+    transaction: the dispatches (with the ``values`` of the DESTINATION_FIELDS) and
+    their processing jobs (see dispatch.py) are inserted with batched INSERTs.
+    The orders are the order numbers in ``numbers`` or, without them, the pending orders
+    returned by ``filter_queryset`` (a function that filters an Order queryset), highest
+    dispatch priority first, at most ``limit`` of them.
+    Orders that cannot be dispatched do not prevent the others from being dispatched.
+    Returns one result per order:
+        {'order': 12, 'status': 'dispatched'}
+        {'order': 13, 'status': 'error', 'errors': {'order': [...]}}
+    '''
+    fields = {field: values.get(field) for field in DESTINATION_FIELDS[destination]}
+    # The model has no blank text fields: the ones the destination does not use are empty
+    fields = {field: '' if field != 'branch_code' else None for field in DISPATCH_FIELDS} | fields
+    using = supplier_database(supplier_id) or DEFAULT_DB_ALIAS
+    orders = Order.objects.using(using).filter(item__supplier_id=supplier_id)
+    if numbers is not None:
+        numbers = numbers[:limit]
+
+    def select():
+        # Read in the transaction: the orders dispatched meanwhile are reported as such
+        if numbers is None:
+            pending = orders.filter(status=Order.PLACED)
+            if filter_queryset is not None:
+                pending = filter_queryset(pending)
+            selected = list(pending.order_by('-priority', 'created_at').values_list('orderNo', flat=True)[:limit])
+            return selected, [{'order': number, 'status': 'dispatched'} for number in selected]
+        statuses = dict(orders.filter(orderNo__in=numbers).values_list('orderNo', 'status'))
+        selected = []
+        seen = set()
+        results = []
+        for number in numbers:
+            if number not in statuses:
+                error = 'Order does not exist or does not belong to an item of this supplier.'
+            elif statuses[number] != Order.PLACED:
+                error = 'This order is not pending (%s).' % STATUS_NAMES[statuses[number]].lower()
+            elif number in seen:
+                error = 'Order is repeated in this dispatch.'
+            else:
+                seen.add(number)
+                selected.append(number)
+                results.append({'order': number, 'status': 'dispatched'})
+                continue
+            results.append({'order': number, 'status': 'error', 'errors': {'order': [error]}})
+        return selected, results
+
+    def write():
+        selected, results = select()
+        ManageOrder.objects.using(using).bulk_create(
+            [ManageOrder(orderNo_id=number, **fields) for number in selected], batch_size=BULK_DISPATCH_BATCH_SIZE)
+        transition(selected, Order.MANAGED, using=using)
+        enqueue_many(DISPATCH_TASK, [{'order': number} for number in selected], using=using)
+        return results
+
+    # Retry once if a concurrent request dispatched (or cancelled) one of the orders between
+    # the check and the insert (deferred SQLite transactions do not lock the rows read)
+    for attempt in range(2):
+        try:
+            return serialized_write(write, using=using)
+        except (IntegrityError, InvalidTransition):
+            if attempt:
+                raise
@@ -0,0 +1,127 @@
+import csv
+import json
+from itertools import islice
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+from .caching import bump_catalog_version
+from .models import Item
+from .routers import across_databases, supplier_database
+from .serializers import BulkItemLineSerializer
+from .writes import serialized_write
+
+# Catalog import of a supplier: items (code, description, price) read from a CSV or JSON
+# lines file a batch at a time, validated together and created or updated with batched
+# statements, so memory does not grow with the size of the file.
+
+# Rows validated and written together (one write transaction and one cache bump per batch)
+ITEM_IMPORT_BATCH_SIZE = 1000
+# Row errors kept for the report, the others are only counted
+ITEM_IMPORT_MAX_ERRORS = 1000
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+
+def read_item_rows(file, format):
+    '''
+    Yield (line number, row) for every row of a text ``file``: dicts read from a CSV file
+    with a header line (code, description, price) or from a JSON object per line.
+    Lines that are not JSON objects yield None as the row.
+    '''
+    if format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def import_items(supplier_id, rows, batch_size=ITEM_IMPORT_BATCH_SIZE):
+    '''
+    Create or update the items of the supplier from ``rows`` of (line number, row) (see
+    read_item_rows). Invalid rows, codes repeated in a batch and codes of other suppliers
+    are reported and do not prevent the other rows from being imported. Returns:
+        {'created': 10, 'updated': 2, 'unchanged': 1, 'failed': 1,
+         'errors': [{'line': 3, 'code': 12, 'errors': {'price': [...]}}]}
+    with at most ITEM_IMPORT_MAX_ERRORS errors.
+    '''
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return result
+        _import_batch(supplier_id, batch, result, batch_size)
+
+
+def _import_batch(supplier_id, batch, result, batch_size):
+    def fail(line, code, errors):
+        result['failed'] += 1
+        if len(result['errors']) < ITEM_IMPORT_MAX_ERRORS:
+            result['errors'].append({'line': line, 'code': code, 'errors': errors})
+
+    valid = {}
+    # One serializer validates every row (building its fields for each row would take
+    # most of the import time)
+    serializer = BulkItemLineSerializer()
+    for line, row in batch:
+        if row is None:
+            fail(line, None, {'non_field_errors': ['Invalid JSON object.']})
+            continue
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as error:
+            fail(line, row.get('code'), as_serializer_error(error))
+            continue
+        if data['code'] in valid:
+            fail(line, data['code'], {'code': ['Item code is repeated in this batch.']})
+        else:
+            valid[data['code']] = (line, data)
+    if not valid:
+        return
+
+    using = supplier_database(supplier_id) or DEFAULT_DB_ALIAS
+
+    def write():
+        # Codes are unique in every database (see forms.ItemForm.clean_code)
+        existing = {code: (supplier, description, price) for code, supplier, description, price in
+                    Item.objects.using(using).filter(code__in=list(valid)).values_list('code', 'supplier_id', 'description', 'price')}
+        missing = valid.keys() - existing.keys()
+        elsewhere = set()
+        for items in across_databases(Item.objects.filter(code__in=missing)) if missing else ():
+            if items.db != using:
+                elsewhere.update(items.values_list('code', flat=True))
+        new, changed, unchanged, errors = [], [], 0, []
+        for code, (line, data) in valid.items():
+            item = Item(supplier_id=supplier_id, **data)
+            if code in elsewhere or (code in existing and existing[code][0] != supplier_id):
+                errors.append((line, code, {'code': ['Item with this Code belongs to another supplier.']}))
+            elif code not in existing:
+                new.append(item)
+            elif existing[code][1:] != (item.description, item.price):
+                changed.append(item)
+            else:
+                unchanged += 1
+        # New and changed items in batched INSERT ... ON CONFLICT DO UPDATE statements (the
+        # codes of other suppliers were left out above), the update triggers still run
+        # (bulk_create() sets updated_at of every row, the update keeps it)
+        Item.objects.using(using).bulk_create(new + changed, batch_size=batch_size, update_conflicts=True, unique_fields=['code'],
+                                              update_fields=['description', 'price', 'updated_at'])
+        return len(new), len(changed), unchanged, errors
+
+    created, updated, unchanged, errors = serialized_write(write, using=using)
+    for line, code, error in errors:
+        fail(line, code, error)
+    result['created'] += created
+    result['updated'] += updated
+    result['unchanged'] += unchanged
+    # bulk_create() does not send the signals that invalidate the cached
+    # catalog (see signals.py): once for the whole batch
+    if created or updated:
+        bump_catalog_version(supplier_id)
@@ -0,0 +1,132 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+from .models import Item, Order, OrderEvent, dispatch_priority
+from .routers import across_databases
+from .sequences import order_numbers
+from .serializers import BulkOrderLineSerializer
+
+# Rows inserted per INSERT statement
+BULK_ORDER_BATCH_SIZE = 500
+
+
+def _line_codes(lines):
+    # Item codes of the valid lines, in line order
+    codes = []
+    for line in lines:
+        serializer = BulkOrderLineSerializer(data=line)
+        if serializer.is_valid():
+            codes.append(serializer.validated_data['item'])
+    return codes
+
+
+def _item_databases(codes):
+    # {item code: database that holds the item} (one query per database, see routers.py)
+    databases = {}
+    for items in across_databases(Item.objects.filter(code__in=codes)):
+        for code in items.values_list('code', flat=True):
+            databases.setdefault(code, items.db)
+    return databases
+
+
+def order_database(lines):
+    '''
+    Database where the orders of ``lines`` are placed: the one of the item of the
+    first line that has an item (see routers.py). The orders of a bulk order are
+    placed in one transaction, so items of other databases are rejected by place_orders.
+    '''
+    if not settings.SUPPLIER_SHARDS:
+        return DEFAULT_DB_ALIAS
+    codes = _line_codes(lines)
+    databases = _item_databases(codes)
+    for code in codes:
+        if code in databases:
+            return databases[code]
+    return DEFAULT_DB_ALIAS
+
+
+def place_orders(client, lines, using=None, numbers=None):
+    '''
+    Place one order per line for ``client`` in a single transaction of the ``using``
+    database (see order_database).
+    ``numbers`` are order numbers allocated by the caller before its transaction (at least
+    one per line), otherwise they are allocated here.
+    Lines are validated together (one query for the items, one for the existing
+    orders) and the valid ones are inserted with batched INSERTs. Invalid lines
+    do not prevent the others from being placed.
+    Returns one result per line, in the same order:
+        {'line': 0, 'item': 10, 'status': 'created', 'orderNo': 123}
+        {'line': 1, 'item': 11, 'status': 'error', 'errors': {...}}
+    '''
+    results = []
+    valid = []
+    for number, line in enumerate(lines):
+        serializer = BulkOrderLineSerializer(data=line)
+        if serializer.is_valid():
+            valid.append((number, serializer.validated_data))
+            results.append({'line': number, 'item': serializer.validated_data['item'], 'status': 'created'})
+        else:
+            item = line.get('item') if isinstance(line, dict) else None
+            results.append({'line': number, 'item': item, 'status': 'error', 'errors': serializer.errors})
+
+    def fail(number, field, message):
+        results[number]['status'] = 'error'
+        results[number]['errors'] = {field: [message]}
+
+    using = using or DEFAULT_DB_ALIAS
+    codes = {data['item'] for _, data in valid}
+    prices = dict(Item.objects.using(using).filter(code__in=codes).values_list('code', 'price'))
+    # Items kept in other databases (only looked up when some item is missing here)
+    missing = codes - set(prices)
+    elsewhere = _item_databases(missing) if missing and settings.SUPPLIER_SHARDS else {}
+
+    # Retry once if a concurrent request ordered one of the items between the check and the insert
+    for attempt in range(2):
+        ordered = set(Order.objects.using(using).filter(client=client, item_id__in=codes).values_list('item_id', flat=True))
+        seen = set()
+        orders = []
+        for number, data in valid:
+            if results[number]['status'] != 'created':
+                continue
+            code = data['item']
+            if code in elsewhere:
+                fail(number, 'item', 'Item is kept in another database, order it in another bulk order.')
+            elif code not in prices:
+                fail(number, 'item', 'Item does not exist.')
+            elif code in ordered:
+                fail(number, 'item', 'This item has already been ordered.')
+            elif code in seen:
+                fail(number, 'item', 'Item is repeated in this order.')
+            else:
+                seen.add(code)
+                orders.append(Order(
+                    client=client,
+                    item_id=code,
+                    created_at=timezone.now(),
+                    # bulk_create() does not call Order.save()
+                    unit_price=prices[code],
+                    priority=dispatch_priority(data['is_urgent'], data['distribution_center'], client.client_type),
+                    **{field: value for field, value in data.items() if field != 'item'}
+                ))
+        # bulk_create() does not call Order.save(), number the orders here. Inside a
+        # transaction of the caller the numbers are reserved from the sequence row in that
+        # transaction (see sequences.SequenceAllocator), not taken from the process block
+        for order, number in zip(orders, numbers if numbers is not None else order_numbers.allocate(len(orders))):
+            order.orderNo = number
+        try:
+            with transaction.atomic(using=using):
+                Order.objects.using(using).bulk_create(orders, batch_size=BULK_ORDER_BATCH_SIZE)
+                # Placement events (see Order.save)
+                OrderEvent.objects.using(using).bulk_create(
+                    [OrderEvent(order_no=order.orderNo, to_status=order.status, created_at=order.created_at)
+                     for order in orders], batch_size=BULK_ORDER_BATCH_SIZE)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    numbers = {order.item_id: order.orderNo for order in orders}
+    for result in results:
+        if result['status'] == 'created':
+            result['orderNo'] = numbers[result['item']]
+    return results
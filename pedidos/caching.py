@@ -0,0 +1,146 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .routers import get_across_databases, reading_from_replica
+
+# Versioned read-through cache for the item catalog.
+# Cache keys carry a version number: the global catalog version (all the items)
+# or the version of one supplier (the supplier items and each of them). Changing
+# an item bumps both versions, so stale entries are never read again and expire on
+# their own (the cache backend bounds the number of entries and evicts the old ones).
+
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+# Hits and misses of this process, to follow the cache hit ratio
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+_MISSING = object()
+
+
+def _version_key(supplier_id=None):
+    if supplier_id is None:
+        return 'pedidos:catalog:version'
+    return 'pedidos:catalog:version:%s' % supplier_id
+
+
+def catalog_version(supplier_id=None):
+    '''
+    Current version of the whole catalog (or of one supplier items).
+    A version evicted from the cache starts again from the current time,
+    which is always greater than any version used before.
+    '''
+    key = _version_key(supplier_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_catalog_version(supplier_id=None):
+    '''
+    Invalidate the cached catalog pages and items (global version) and,
+    if given, the cached items of the supplier.
+    '''
+    keys = [_version_key()]
+    if supplier_id is not None:
+        keys.append(_version_key(supplier_id))
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Version not in cache, start a new one
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def _read_through(key, loader):
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        CACHE_STATS['hits'] += 1
+        return value
+    CACHE_STATS['misses'] += 1
+    value = loader()
+    cache.set(key, value, _timeout())
+    return value
+
+
+def _timeout():
+    # A replica may not have the last change yet, do not keep what it returned for long
+    return min(CATALOG_CACHE_TIMEOUT, settings.REPLICA_MAX_LAG) if reading_from_replica() else CATALOG_CACHE_TIMEOUT
+
+
+def _digest(params):
+    return hashlib.md5(repr(params).encode()).hexdigest()
+
+
+def get_catalog_page(params, loader):
+    '''
+    Catalog page identified by ``params`` (filters and cursor), ``loader`` builds it on a cache miss.
+    '''
+    key = 'pedidos:catalog:%s:page:%s' % (catalog_version(), _digest(params))
+    return _read_through(key, loader)
+
+
+def get_catalog_validators(params, loader):
+    '''
+    Last item change of the catalog filtered by ``params`` (validator of its pages, see
+    conditional.py), ``loader`` computes it on a cache miss.
+    '''
+    key = 'pedidos:catalog:%s:validators:%s' % (catalog_version(), _digest(params))
+    return _read_through(key, loader)
+
+
+def get_supplier_items(supplier_id, loader):
+    '''
+    Items published by the supplier, ``loader`` fetches them on a cache miss.
+    '''
+    key = 'pedidos:catalog:%s:supplier:%s' % (catalog_version(supplier_id), supplier_id)
+    return _read_through(key, loader)
+
+
+def get_supplier_choices(loader):
+    '''
+    (id, username) of every supplier for the catalog filter.
+    '''
+    key = 'pedidos:catalog:%s:suppliers' % catalog_version()
+    return _read_through(key, loader)
+
+
+def _item_supplier_key(code):
+    return 'pedidos:catalog:item:%s:supplier' % code
+
+
+def _item_key(code, supplier_id):
+    return 'pedidos:catalog:%s:supplier:%s:item:%s' % (catalog_version(supplier_id), supplier_id, code)
+
+
+def forget_item(code):
+    '''
+    Drop the supplier remembered for the item ``code`` (the code of a deleted item may
+    be used again by another supplier).
+    '''
+    cache.delete(_item_supplier_key(code))
+
+
+def get_item(code):
+    '''
+    Item by code from the database that holds it, raises Item.DoesNotExist like
+    Item.objects.get() (missing items are not cached).
+    Items are cached with the version of their supplier, so only the changes of that
+    supplier invalidate them.
+    '''
+    from .models import Item
+
+    def load():
+        return get_across_databases(Item.objects.filter(code=code))
+
+    supplier_id = cache.get(_item_supplier_key(code))
+    if supplier_id is not None:
+        return _read_through(_item_key(code, supplier_id), load)
+    # First read of the item: its supplier (part of the key) is not known yet
+    CACHE_STATS['misses'] += 1
+    item = load()
+    cache.set(_item_supplier_key(code), item.supplier_id, timeout=None)
+    cache.set(_item_key(code, item.supplier_id), item, _timeout())
+    return item
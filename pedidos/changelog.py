@@ -0,0 +1,96 @@
+import heapq
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import ChangeLogEntry, Item, Order, ManageOrder
+from .routers import primary_databases
+from .serializers import ItemSerializer, OrderSerializer, ManageOrderSerializer
+
+# Entries read per query by the change feed
+CHANGE_FEED_BATCH_SIZE = 500
+
+# Querysets and serializers of the current state of the logged rows
+CHANGE_FEED_MODELS = {
+    'item': (Item.objects.all(), ItemSerializer),
+    'order': (Order.objects.select_related('client__user'), OrderSerializer),
+    'manageorder': (ManageOrder.objects.all(), ManageOrderSerializer),
+}
+
+
+def parse_feed_cursor(value):
+    '''
+    {database: last sequence number read} of a change feed cursor: the sequence numbers
+    of routers.primary_databases() joined by dots ("120.35"), a plain sequence number without shards.
+    Missing or invalid parts start from the beginning of their database.
+    '''
+    parts = (value or '').split('.')
+    cursor = {}
+    for number, alias in enumerate(primary_databases()):
+        try:
+            cursor[alias] = max(0, int(parts[number]))
+        except (IndexError, ValueError):
+            cursor[alias] = 0
+    return cursor
+
+
+def format_feed_cursor(cursor):
+    return '.'.join(str(cursor[alias]) for alias in primary_databases())
+
+
+def _database_entries(alias, after, batch_size):
+    # Entries of one database after the sequence number ``after``, read in batches by
+    # sequence number (no OFFSET)
+    while True:
+        entries = list(ChangeLogEntry.objects.using(alias).filter(seq__gt=after).order_by('seq')[:batch_size])
+        for entry in entries:
+            yield alias, entry
+        if len(entries) < batch_size:
+            break
+        after = entries[-1].seq
+
+
+def _current_data(entries):
+    # Current state of the rows of a batch of (database, entry), one query per model and database
+    pks = {}
+    for alias, entry in entries:
+        if entry.action != ChangeLogEntry.DELETE:
+            pks.setdefault((alias, entry.model), set()).add(entry.object_pk)
+    data = {}
+    for (alias, model), model_pks in pks.items():
+        queryset, serializer_class = CHANGE_FEED_MODELS[model]
+        for pk, obj in queryset.using(alias).in_bulk(model_pks).items():
+            data[(alias, model, pk)] = serializer_class(obj).data
+    return data
+
+
+def stream_changes(after=None, limit=None, batch_size=CHANGE_FEED_BATCH_SIZE):
+    '''
+    Yield the change log entries after the cursor ``after`` (see parse_feed_cursor) as
+    JSON lines, each one with the current state of the row (null when it was deleted since).
+    Every database (see routers.py) keeps its own log, written by its triggers: the logs
+    are merged by the time of the change and every line carries the ``cursor`` to resume
+    from (its ``seq`` is the sequence number in its ``database``).
+    '''
+    cursor = parse_feed_cursor(None if after is None else str(after))
+    order = {alias: number for number, alias in enumerate(primary_databases())}
+    entries = heapq.merge(*[_database_entries(alias, seq, batch_size) for alias, seq in cursor.items()],
+                          key=lambda item: (item[1].created_at, order[item[0]], item[1].seq))
+    sent = 0
+    while limit is None or sent < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent)
+        batch = [entry for _, entry in zip(range(size), entries)]
+        if not batch:
+            break
+        data = _current_data(batch)
+        for alias, entry in batch:
+            cursor[alias] = entry.seq
+            yield json.dumps({
+                'seq': entry.seq,
+                'database': alias,
+                'cursor': format_feed_cursor(cursor),
+                'model': entry.model,
+                'pk': entry.object_pk,
+                'action': entry.get_action_display().lower(),
+                'created_at': entry.created_at,
+                'data': data.get((alias, entry.model, entry.object_pk)),
+            }, cls=DjangoJSONEncoder) + '\n'
+        sent += len(batch)
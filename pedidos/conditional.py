@@ -0,0 +1,57 @@
+import hashlib
+from functools import wraps
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+# Conditional GET of the read-only pages (ETag and Last-Modified).
+# The validators of a page come from aggregate queries over the rows it shows (the last
+# change, updated_at of Item, Order and ManageOrder, and what tells deleted rows apart,
+# e.g. the number of rows), not from rendering it: a browser that already has the current
+# page gets a 304 Not Modified for the price of those queries. Pages belong to a user,
+# the ETag includes the user and the browser revalidates the page every time it uses it.
+
+
+def last_change(querysets, field='updated_at'):
+    '''
+    Latest value of ``field`` in the rows of ``querysets`` (e.g. one queryset in every
+    database, see routers.across_databases), one aggregate query per queryset.
+    '''
+    changes = [queryset.aggregate(latest=Max(field))['latest'] for queryset in querysets]
+    return max((change for change in changes if change is not None), default=None)
+
+
+def conditional_page(validators):
+    '''
+    Decorator for read-only views: ``validators(request, *args, **kwargs)`` returns the
+    values the page depends on and its last modification time, or None to run the view
+    without validators (e.g. a missing object). GET and HEAD requests whose If-None-Match
+    matches get a 304 response without running the view.
+    Deleting a row does not move the last modification time forward: Last-Modified is
+    sent, but only the ETag (which tells deletions apart) answers with a 304.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            result = validators(request, *args, **kwargs)
+            if result is None:
+                return view(request, *args, **kwargs)
+            values, last_modified = result
+            etag = quote_etag(hashlib.md5(repr(
+                (request.user.pk, request.get_full_path()) + tuple(values)).encode()).hexdigest())
+            timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                # Redirects and errors carry no validators
+                if response.status_code != 200:
+                    return response
+            response.headers.setdefault('ETag', etag)
+            if timestamp is not None:
+                response.headers.setdefault('Last-Modified', http_date(timestamp))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
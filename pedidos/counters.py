@@ -0,0 +1,74 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from .models import Order, ItemStats, SupplierStats
+from .writes import serialized_write
+
+# Order counters of the items and suppliers (ItemStats, SupplierStats): the triggers of
+# migrations 0010 and 0012 add the counters of every order inserted, changed or deleted in the same
+# transaction. Databases without the triggers, and counters that drifted (e.g. rows changed
+# with the triggers dropped), are fixed by repair_counters().
+
+COUNTERS = ('orders', 'quantity', 'revenue', 'urgent_orders', 'pending_orders')
+# Revenue is summed in floating point: smaller differences are not drift
+REVENUE_TOLERANCE = 0.01
+
+
+def counter_aggregates():
+    # Counters of a group of orders, as computed by the triggers
+    active = ~Q(status=Order.CANCELLED)
+    return {
+        'orders': Count('pk', filter=active),
+        'quantity': Coalesce(Sum('quantity', filter=active), 0),
+        'revenue': Coalesce(Sum(F('quantity') * F('unit_price'), filter=active), 0.0),
+        'urgent_orders': Count('pk', filter=active & Q(is_urgent=True)),
+        'pending_orders': Count('pk', filter=Q(status=Order.PLACED)),
+    }
+
+
+def computed_counters(using=None):
+    '''
+    Counters of every item and supplier of the ``using`` database computed from its orders:
+    ({item code: {counter: value}}, {supplier id: {counter: value}}).
+    '''
+    orders = Order.objects.using(using or DEFAULT_DB_ALIAS)
+    # Annotated with other names, so they do not shadow the order fields (quantity)
+    aggregates = {'counted_' + name: aggregate for name, aggregate in counter_aggregates().items()}
+
+    def counters(key):
+        return {row[key]: {name: row['counted_' + name] for name in COUNTERS}
+                for row in orders.values(key).annotate(**aggregates).order_by()}
+    return counters('item_id'), counters('item__supplier_id')
+
+
+def drifted(stored, actual):
+    return any(abs(stored[name] - actual[name]) > REVENUE_TOLERANCE if name == 'revenue' else stored[name] != actual[name]
+               for name in COUNTERS)
+
+
+def repair_counters(using=None, dry_run=False):
+    '''
+    Recompute the counters of the ``using`` database from its orders and fix the ones that
+    drifted (unless ``dry_run``), in one write transaction so no order changes meanwhile.
+    Returns the drifted counters: [(model, key, {counter: stored value}, {counter: actual value})].
+    '''
+    using = using or DEFAULT_DB_ALIAS
+    zero = dict.fromkeys(COUNTERS, 0)
+
+    def repair():
+        drift = []
+        items, suppliers = computed_counters(using)
+        for model, key, actual_counters in ((ItemStats, 'item_id', items), (SupplierStats, 'supplier_id', suppliers)):
+            stored_counters = {row.pop(key): row for row in model.objects.using(using).values(key, *COUNTERS)}
+            fixed = []
+            for pk in sorted(stored_counters.keys() | actual_counters.keys()):
+                stored = stored_counters.get(pk, zero)
+                actual = actual_counters.get(pk, zero)
+                if drifted(stored, actual):
+                    drift.append((model.__name__, pk, stored, actual))
+                    fixed.append(model(**{key: pk}, **actual))
+            if fixed and not dry_run:
+                model.objects.using(using).bulk_create(fixed, update_conflicts=True, unique_fields=[key],
+                                                       update_fields=list(COUNTERS), batch_size=500)
+        return drift
+    return serialized_write(repair, using=using)
@@ -29,4 +29,26 @@ def supplier_required(function=None, redirect_field_name=REDIRECT_FIELD_NAME, lo
     )
     if function:
         return actual_decorator(function)
-    return actual_decorator
\ No newline at end of file
+    return actual_decorator
+
+def staff_required(function=None, redirect_field_name=REDIRECT_FIELD_NAME, login_url='login'):
+    '''
+    Decorator for views that checks that the logged in user is a staff member
+    (integration accounts such as the warehouse sync), redirects to the log-in page if necessary.
+    '''
+    actual_decorator = user_passes_test(
+        lambda u: u.is_active and u.is_staff,
+        login_url=login_url,
+        redirect_field_name=redirect_field_name
+    )
+    if function:
+        return actual_decorator(function)
+    return actual_decorator
+
+def replica_reads(function):
+    '''
+    Decorator for read-only views that may read from a database replica
+    (see routers.py and middleware.DatabaseRoutingMiddleware).
+    '''
+    function.replica_reads = True
+    return function
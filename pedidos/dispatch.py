@@ -0,0 +1,93 @@
+import logging
+import os
+import tempfile
+from django.conf import settings
+from django.core.mail import send_mail
+from .jobs import enqueue, task
+from .lifecycle import transition
+from .models import Order, ManageOrder
+from .writes import serialized_write
+
+# Work that follows the dispatch of an order (shipping label, notification of the
+# associated company, audit log), run by the job workers instead of the request that
+# saves the dispatch (see jobs.py)
+
+DISPATCH_TASK = 'process-dispatch'
+
+audit_log = logging.getLogger('pedidos.audit')
+
+
+def save_dispatch(dispatch, using=None):
+    '''
+    Save the dispatch, mark its order as managed and enqueue its processing in the same
+    transaction of the ``using`` database (the one of the order, see routers.py).
+    Saving the dispatch of a managed order again edits it, lifecycle.InvalidTransition is
+    raised for the orders dispatched or cancelled.
+    '''
+    def write():
+        dispatch.save()
+        transition([dispatch.pk], Order.MANAGED, using=using, unchanged={Order.MANAGED})
+        enqueue(DISPATCH_TASK, {'order': dispatch.pk}, using=using)
+        return dispatch
+    return serialized_write(write, using=using)
+
+
+def dispatch_destination(dispatch):
+    # Dispatch forms: a warehouse (distribution center), details (associated company)
+    # or a reference and branch code (branch)
+    if dispatch.warehouse:
+        return 'distribution center'
+    if dispatch.details:
+        return 'associated company'
+    return 'branch'
+
+
+def label_path(dispatch):
+    return os.path.join(settings.DISPATCH_LABEL_DIR, 'pedido-%d.txt' % dispatch.pk)
+
+
+def render_label(dispatch):
+    order = dispatch.orderNo
+    lines = [
+        'Pedido: %d' % order.orderNo,
+        'Cliente: %s (%s)' % (order.client.user.username, order.client.address),
+        'Articulo: %d - %s' % (order.item.code, order.item.description),
+        'Cantidad: %d' % order.quantity,
+        'Destino: %s' % dispatch_destination(dispatch),
+        'Almacen: %s' % dispatch.warehouse,
+        'Referencia: %s' % dispatch.reference,
+        'Sucursal: %s' % ('' if dispatch.branch_code is None else dispatch.branch_code),
+        'Detalles: %s' % dispatch.details,
+        'Urgente: %s' % ('si' if order.is_urgent else 'no'),
+        'Despachado: %s' % dispatch.dispatched_at.isoformat(),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def write_label(dispatch):
+    # Written to a temporary file and renamed, a retry replaces the label of a failed attempt
+    os.makedirs(settings.DISPATCH_LABEL_DIR, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=settings.DISPATCH_LABEL_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as label:
+            label.write(render_label(dispatch))
+        os.replace(temporary, label_path(dispatch))
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return label_path(dispatch)
+
+
+@task(DISPATCH_TASK, concurrency=lambda: settings.DISPATCH_JOB_CONCURRENCY)
+def process_dispatch(using, order):
+    dispatch = ManageOrder.objects.using(using).select_related(
+        'orderNo__client__user', 'orderNo__item').get(pk=order)
+    path = write_label(dispatch)
+    destination = dispatch_destination(dispatch)
+    if destination == 'associated company' and settings.DISPATCH_NOTIFICATION_EMAIL:
+        send_mail('Pedido %d despachado' % dispatch.pk, render_label(dispatch), None,
+                  [settings.DISPATCH_NOTIFICATION_EMAIL])
+    audit_log.info('Order %d dispatched to %s by supplier %d, label %s', dispatch.pk, destination,
+                   dispatch.orderNo.item.supplier_id, path)
+    serialized_write(lambda: transition([dispatch.pk], Order.DISPATCHED, using=using, unchanged={Order.DISPATCHED}),
+                     using=using)
@@ -0,0 +1,89 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .models import Item, Order
+from .routers import supplier_database
+
+# Export of the orders of a supplier (with their dispatches) for accounting, streamed as CSV
+# or JSON lines: the rows are read with a server-side iterator a chunk at a time, so memory
+# does not grow with the number of orders.
+
+# Rows fetched from the database at once
+EXPORT_CHUNK_SIZE = 2000
+
+# (column, Order field) of every exported row, dispatch columns are empty for orders that
+# were not managed
+EXPORT_COLUMNS = [
+    ('order', 'orderNo'),
+    ('created_at', 'created_at'),
+    ('status', 'status'),
+    ('client', 'client__user__username'),
+    ('client_code', 'client__code'),
+    ('item', 'item_id'),
+    ('description', 'item__description'),
+    ('unit_price', 'unit_price'),
+    ('quantity', 'quantity'),
+    ('is_urgent', 'is_urgent'),
+    ('distribution_center', 'distribution_center'),
+    ('branch', 'branch'),
+    ('associated_company', 'associated_company'),
+    ('priority', 'priority'),
+    ('dispatched_at', 'orders__dispatched_at'),
+    ('warehouse', 'orders__warehouse'),
+    ('reference', 'orders__reference'),
+    ('branch_code', 'orders__branch_code'),
+    ('details', 'orders__details'),
+]
+STATUS_NAMES = {status: name.lower() for status, name in Order.STATUS_CHOICES}
+
+
+def export_rows(supplier_id, using=None, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Yield the orders of the supplier items as dicts of EXPORT_COLUMNS, ordered by item and
+    creation date (the order of the order_item_created_idx index, nothing to sort), created
+    between the dates ``date_from`` and ``date_to`` (both included, in the current time zone).
+    Rows are read when iterated, from the ``using`` database (by default the database of the
+    supplier): streamed responses are iterated after the request routing state is gone.
+    '''
+    using = using or supplier_database(supplier_id)
+    # Filtered with a subquery rather than a join on the item supplier: the database then
+    # reads the index of every item in order, instead of sorting all the orders first
+    items = Item.objects.using(using).filter(supplier_id=supplier_id).values('code')
+    orders = Order.objects.using(using).filter(item_id__in=items)
+    if date_from is not None:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    if date_to is not None:
+        orders = orders.filter(created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    names = [name for name, field in EXPORT_COLUMNS]
+    rows = orders.order_by('item_id', 'created_at').values_list(*[field for name, field in EXPORT_COLUMNS])
+    for values in rows.iterator(chunk_size=chunk_size):
+        row = dict(zip(names, values))
+        row['status'] = STATUS_NAMES[row['status']]
+        yield row
+
+
+class _Echo:
+    # File-like object for csv.writer that returns the line written instead of storing it
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, field in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row.values()])
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+# Export formats: (stream function, content type, file extension)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8', 'csv'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson', 'jsonl'),
+}
@@ -3,6 +3,12 @@ from django.db import transaction
 from .models import User, Client, Supplier, Item, Order, ManageOrder
 from django import forms
 from django.contrib.auth import get_user_model
+from .caching import get_supplier_choices
+from .idempotency import IDEMPOTENCY_KEY_MAX_LENGTH
+from .routers import across_databases
+from .search import search_items
+from .bulk_dispatch import DESTINATION_FIELDS, dispatch_orders
+from .repricing import preview_repricing, price_expression, reprice_items
 
 # To get the current active User model. In this app, our custom User model
 User = get_user_model()
@@ -85,6 +91,15 @@ class ItemForm(forms.ModelForm):
             'price': forms.NumberInput(attrs={'step': 0.01, 'max': 1000000000.0, 'min': 0.0})       
         }
 
+    # Codes are unique in every database: the model validation checks the default one,
+    # the shards of the suppliers (see routers.py) are checked here
+    def clean_code(self):
+        code = self.cleaned_data['code']
+        shards = across_databases(Item.objects.filter(code=code))[1:]
+        if code != self.instance.pk and any(items.exists() for items in shards):
+            raise forms.ValidationError('Item with this Code already exists.')
+        return code
+
 # Create order form
 class OrderForm(forms.ModelForm):
     # Metadata from Order model
@@ -99,6 +114,19 @@ class OrderForm(forms.ModelForm):
             'quantity': forms.TextInput()        
         }
 
+    # Orders are changed until the supplier manages them (or they are cancelled)
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk is not None and self.instance.status != Order.PLACED:
+            raise forms.ValidationError('Only placed orders can be changed (this one is %s).'
+                                        % self.instance.get_status_display().lower())
+        return cleaned_data
+
+# Create order form with the idempotency key of the order (a new key every time the form
+# is shown, so resubmitting the same form does not place the order twice)
+class CreateOrderForm(OrderForm):
+    idempotency_key = forms.CharField(max_length=IDEMPOTENCY_KEY_MAX_LENGTH, required=False, widget=forms.HiddenInput())
+
 # Manage order one (order to distribution center) form by supplier
 class ManageOrderOneForm(forms.ModelForm):
     # Metadata from ManagerOrder model
@@ -130,4 +158,190 @@ class ManageOrderThreeForm(forms.ModelForm):
             'reference': forms.TextInput(),
             'branch_code': forms.NumberInput(),
             'details': forms.Textarea() 
-        }
\ No newline at end of file
+        }
+
+# Supplier choices of the catalog filter (cached with the catalog)
+def supplier_choices():
+    suppliers = get_supplier_choices(lambda: list(
+        Supplier.objects.order_by('user__username').values_list('user_id', 'user__username')))
+    return [('', '---------')] + suppliers
+
+# Catalog filter form (client dashboard)
+class CatalogFilterForm(forms.Form):
+    supplier = forms.TypedChoiceField(choices=supplier_choices, coerce=int, required=False, empty_value=None, widget=forms.Select())
+    min_price = forms.FloatField(required=False, min_value=0.0, widget=forms.NumberInput(attrs={'step': 0.01}))
+    max_price = forms.FloatField(required=False, min_value=0.0, widget=forms.NumberInput(attrs={'step': 0.01}))
+
+    # Valid filters as a tuple (used to identify the cached catalog page)
+    def cache_key(self):
+        if not self.is_valid():
+            return (None, None, None)
+        return (self.cleaned_data.get('supplier'), self.cleaned_data.get('min_price'), self.cleaned_data.get('max_price'))
+
+    # Apply the valid filters to an Item queryset
+    def filter_queryset(self, queryset):
+        if not self.is_valid():
+            return queryset
+        if self.cleaned_data.get('supplier') is not None:
+            queryset = queryset.filter(supplier_id=self.cleaned_data['supplier'])
+        if self.cleaned_data.get('min_price') is not None:
+            queryset = queryset.filter(price__gte=self.cleaned_data['min_price'])
+        if self.cleaned_data.get('max_price') is not None:
+            queryset = queryset.filter(price__lte=self.cleaned_data['max_price'])
+        return queryset
+
+# Catalog search form: search words and the catalog filters
+class CatalogSearchForm(CatalogFilterForm):
+    q = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'type': 'search'}))
+
+    # Items matching the words, best matches first (see search.py)
+    def search(self):
+        if not self.is_valid():
+            return []
+        return search_items(self.cleaned_data['q'], supplier=self.cleaned_data.get('supplier'),
+                            min_price=self.cleaned_data.get('min_price'), max_price=self.cleaned_data.get('max_price'))
+
+# Dispatch queue filter form (supplier dashboard)
+class DispatchQueueFilterForm(forms.Form):
+    min_priority = forms.IntegerField(required=False, min_value=0, widget=forms.NumberInput())
+
+    # Apply the valid filters to an Order queryset
+    def filter_queryset(self, queryset):
+        if not self.is_valid():
+            return queryset
+        if self.cleaned_data.get('min_priority') is not None:
+            queryset = queryset.filter(priority__gte=self.cleaned_data['min_priority'])
+        return queryset
+
+# Order numbers of the checked orders (repeated ?orders= values or a JSON list)
+class OrderNumbersField(forms.Field):
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            value = [value]
+        try:
+            return [int(number) for number in value]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Enter a list of order numbers.')
+
+# Bulk dispatch form (supplier dispatch queue): the checked orders, or else the pending
+# orders that match the queue filters, dispatched to one destination
+class BulkDispatchForm(DispatchQueueFilterForm):
+    DESTINATION_CHOICES = [
+        ('distribution_center', 'Centro de distribucion'),
+        ('branch', 'Sucursal'),
+        ('associated_company', 'Empresa asociada'),
+    ]
+    orders = OrderNumbersField(required=False)
+    item = forms.IntegerField(required=False, widget=forms.NumberInput())
+    destination = forms.ChoiceField(choices=DESTINATION_CHOICES, widget=forms.Select())
+    warehouse = forms.CharField(max_length=ManageOrder._meta.get_field('warehouse').max_length, required=False, widget=forms.TextInput())
+    reference = forms.CharField(max_length=ManageOrder._meta.get_field('reference').max_length, required=False, widget=forms.TextInput())
+    branch_code = forms.IntegerField(required=False, widget=forms.NumberInput())
+    details = forms.CharField(max_length=ManageOrder._meta.get_field('details').max_length, required=False, widget=forms.Textarea())
+
+    # Fields of the destination are required
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in DESTINATION_FIELDS.get(cleaned_data.get('destination'), ()):
+            if cleaned_data.get(field) in (None, '') and field not in self.errors:
+                self.add_error(field, forms.ValidationError(self.fields[field].error_messages['required'], code='required'))
+        return cleaned_data
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_valid() and self.cleaned_data.get('item') is not None:
+            queryset = queryset.filter(item_id=self.cleaned_data['item'])
+        return queryset
+
+    # Dispatch the orders of the supplier (see bulk_dispatch.py), returns the result of every order
+    def dispatch(self, supplier_id):
+        return dispatch_orders(supplier_id, self.cleaned_data['destination'], self.cleaned_data,
+                               numbers=self.cleaned_data['orders'] or None, filter_queryset=self.filter_queryset)
+
+# Order export form (supplier dashboard): format of the file and the creation dates of the
+# orders, both included
+class OrderExportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False, widget=forms.Select())
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('format'):
+            cleaned_data['format'] = 'csv'
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            self.add_error('date_to', forms.ValidationError('The end date is before the start date.'))
+        return cleaned_data
+
+# Catalog import form (supplier dashboard): a CSV or JSON lines file of items, the format is
+# taken from the file name when not given (see bulk_items.py)
+class ItemImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('', 'Según el archivo'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False, widget=forms.Select())
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('format') and cleaned_data.get('file'):
+            extension = cleaned_data['file'].name.rsplit('.', 1)[-1].lower()
+            cleaned_data['format'] = 'jsonl' if extension in ('jsonl', 'ndjson') else 'csv'
+        return cleaned_data
+
+# Bulk repricing form (supplier dashboard): a percentage or an amount added to the price of
+# the supplier items, optionally only the items in a range of codes or whose description
+# contains some text (see repricing.py)
+class RepriceForm(forms.Form):
+    CHANGE_CHOICES = [
+        ('percent', 'Porcentaje'),
+        ('amount', 'Monto'),
+    ]
+    change = forms.ChoiceField(choices=CHANGE_CHOICES, widget=forms.Select())
+    value = forms.FloatField(widget=forms.NumberInput(attrs={'step': 0.01}))
+    code_from = forms.IntegerField(required=False, widget=forms.NumberInput())
+    code_to = forms.IntegerField(required=False, widget=forms.NumberInput())
+    description = forms.CharField(max_length=200, required=False, widget=forms.TextInput())
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('change') == 'percent' and cleaned_data.get('value') is not None and cleaned_data['value'] < -100:
+            self.add_error('value', forms.ValidationError('A price cannot go down by more than 100%.'))
+        code_from, code_to = cleaned_data.get('code_from'), cleaned_data.get('code_to')
+        if code_from is not None and code_to is not None and code_from > code_to:
+            self.add_error('code_to', forms.ValidationError('The last code is before the first code.'))
+        return cleaned_data
+
+    # Apply the valid filters to an Item queryset
+    def filter_queryset(self, queryset):
+        if not self.is_valid():
+            return queryset
+        if self.cleaned_data.get('code_from') is not None:
+            queryset = queryset.filter(code__gte=self.cleaned_data['code_from'])
+        if self.cleaned_data.get('code_to') is not None:
+            queryset = queryset.filter(code__lte=self.cleaned_data['code_to'])
+        if self.cleaned_data.get('description'):
+            queryset = queryset.filter(description__icontains=self.cleaned_data['description'])
+        return queryset
+
+    def price_expression(self):
+        return price_expression(**{self.cleaned_data['change']: self.cleaned_data['value']})
+
+    # Number of items repriced and the first ones with their new price
+    def preview(self, supplier_id):
+        return preview_repricing(supplier_id, self.price_expression(), filter_queryset=self.filter_queryset)
+
+    # Reprice the items of the supplier, returns the number of items repriced
+    def reprice(self, supplier_id):
+        return reprice_items(supplier_id, self.price_expression(), filter_queryset=self.filter_queryset)
@@ -0,0 +1,61 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from .models import IdempotencyKey
+from .routers import across_databases
+from .writes import serialized_write
+
+# API requests send the idempotency key in this header, the order form in a hidden field
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def run_once(client, key, action, prepare=None, using=None):
+    '''
+    Run ``action`` once per client and idempotency key.
+    The key is inserted in the same transaction as the writes of ``action``: of
+    concurrent requests with the same key only the first one to commit keeps its writes.
+    ``action`` returns the JSON result stored with the key, retries get that result
+    back without writing again until the key expires. Nothing is stored when ``action``
+    raises (the retry runs it again).
+    ``prepare`` runs before the transaction when the request is not a retry, its result
+    is passed to ``action`` (e.g. an order number from the block of the process).
+    The transaction goes through the serialized write path (see writes.serialized_write),
+    so ``action`` may run again if the database is locked.
+    ``using`` is the database written by ``action`` (the shard of the supplier, see
+    routers.py), the key is stored there too.
+    Returns (result, replayed).
+    '''
+    now = timezone.now()
+    keys = IdempotencyKey.objects.using(using)
+    record = keys.filter(client=client, key=key).first() if key else None
+    if record is not None and record.expires_at > now:
+        return record.response, True
+    args = (prepare(),) if prepare is not None else ()
+    expired_pk = record.pk if record is not None else None
+
+    def write():
+        if expired_pk is not None:
+            keys.filter(pk=expired_pk).delete()
+        response = action(*args)
+        if key:
+            keys.create(client=client, key=key, response=response,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL))
+        return response
+
+    try:
+        return serialized_write(write, using=using), False
+    except IntegrityError:
+        # A concurrent request with the same key committed first: its writes are kept
+        # and ours are rolled back
+        record = keys.filter(client=client, key=key).first() if key else None
+        if record is None:
+            raise
+        return record.response, True
+
+
+def purge_expired_keys():
+    # Delete the expired keys, returns the number of keys deleted
+    now = timezone.now()
+    return sum(keys.filter(expires_at__lte=now).delete()[0] for keys in across_databases(IdempotencyKey.objects.all()))
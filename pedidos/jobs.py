@@ -0,0 +1,238 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, F
+from django.utils import timezone
+from .models import Job
+from .routers import primary_databases
+from .writes import serialized_write
+
+# Background jobs: slow work (see dispatch.py) is stored as Job rows, in the same transaction
+# as the writes that need it, and run by the run_jobs command outside the web workers.
+# A job lives in the database of the rows it works on (the default one or a shard, see
+# routers.py) and workers take jobs from every database.
+# Jobs run at least once: a job whose worker dies runs again after JOB_TIMEOUT, so tasks
+# must be safe to repeat.
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    def __init__(self, name, function, max_attempts, concurrency):
+        self.name = name
+        self.function = function
+        self.max_attempts = max_attempts
+        # Jobs of the task running at once across all the workers (None: no limit),
+        # or a function returning it (e.g. to read it from the settings)
+        self.concurrency = concurrency
+
+    def concurrency_limit(self):
+        return self.concurrency() if callable(self.concurrency) else self.concurrency
+
+
+# Registered tasks by name
+TASKS = {}
+
+
+def task(name, max_attempts=None, concurrency=None):
+    '''
+    Register the decorated function as the task ``name``. Jobs call it with the database
+    of the job (``using``) and the payload as keyword arguments, it fails by raising.
+    '''
+    def register(function):
+        TASKS[name] = Task(name, function, max_attempts, concurrency)
+        return function
+    return register
+
+
+def enqueue(name, payload=None, using=None, delay=0):
+    '''
+    Create a job of the task ``name`` in the ``using`` database. Call it inside the
+    transaction of the writes the job works on: the job is committed (and visible to
+    the workers) with them, or not at all.
+    '''
+    max_attempts = TASKS[name].max_attempts or settings.JOB_MAX_ATTEMPTS
+    return Job.objects.using(using).create(task=name, payload=payload or {}, max_attempts=max_attempts,
+                                           run_after=timezone.now() + timedelta(seconds=delay))
+
+
+def enqueue_many(name, payloads, using=None, batch_size=500):
+    # Jobs of the task ``name``, one per payload, with batched INSERTs (see enqueue())
+    max_attempts = TASKS[name].max_attempts or settings.JOB_MAX_ATTEMPTS
+    now = timezone.now()
+    return Job.objects.using(using).bulk_create(
+        [Job(task=name, payload=payload, max_attempts=max_attempts, run_after=now) for payload in payloads],
+        batch_size=batch_size)
+
+
+def retry_delay(attempts):
+    # Exponential backoff of the retries of a job that failed ``attempts`` times
+    return min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_MAX_RETRY_DELAY)
+
+
+def worker_name():
+    return '%s:%d:%s' % (socket.gethostname(), os.getpid(), threading.current_thread().name)
+
+
+def claim_job(using, worker):
+    '''
+    Mark the oldest due job of the ``using`` database as running for ``worker`` and return
+    it (None when there is nothing to run). Tasks at their concurrency limit are skipped.
+    '''
+    def claim():
+        now = timezone.now()
+        jobs = Job.objects.using(using)
+        running = dict(jobs.filter(status=Job.RUNNING).values_list('task').annotate(Count('pk')))
+        busy = []
+        for name, registered in TASKS.items():
+            limit = registered.concurrency_limit()
+            if limit is not None and running.get(name, 0) >= limit:
+                busy.append(name)
+        pending = jobs.filter(status=Job.PENDING, run_after__lte=now).exclude(task__in=busy)
+        if connections[using].features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        job = pending.order_by('run_after', 'pk').first()
+        if job is None:
+            return None
+        # With deferred SQLite transactions (or without row locks) another worker may have
+        # claimed it since: only the first UPDATE matches
+        claimed = jobs.filter(pk=job.pk, status=Job.PENDING).update(
+            status=Job.RUNNING, attempts=job.attempts + 1, started_at=now, worker=worker)
+        if not claimed:
+            return None
+        job.status, job.attempts, job.started_at, job.worker = Job.RUNNING, job.attempts + 1, now, worker
+        return job
+    return serialized_write(claim, using=using)
+
+
+def run_job(job, using):
+    # Run a claimed job and record its result, returns the new status
+    registered = TASKS.get(job.task)
+    try:
+        if registered is None:
+            raise LookupError('Unknown task %r' % job.task)
+        registered.function(using=using, **job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %d (%s) failed, attempt %d of %d', job.pk, job.task, job.attempts, job.max_attempts)
+        return finish_job(job, using, error=error)
+    return finish_job(job, using)
+
+
+def finish_job(job, using, error=None):
+    now = timezone.now()
+    if error is None:
+        changes = {'status': Job.DONE, 'finished_at': now, 'last_error': ''}
+    elif job.attempts >= job.max_attempts:
+        changes = {'status': Job.FAILED, 'finished_at': now, 'last_error': error}
+    else:
+        changes = {'status': Job.PENDING, 'last_error': error,
+                   'run_after': now + timedelta(seconds=retry_delay(job.attempts))}
+    # The job may have been taken back as lost (see requeue_lost_jobs) in the meantime
+    serialized_write(lambda: Job.objects.using(using).filter(pk=job.pk, status=Job.RUNNING,
+                                                             worker=job.worker).update(**changes), using=using)
+    return changes['status']
+
+
+def requeue_lost_jobs(using):
+    '''
+    Jobs running for longer than JOB_TIMEOUT (their worker died or hung) are retried,
+    or failed when they used all their attempts. Returns the number of jobs taken back.
+    '''
+    now = timezone.now()
+    lost = Job.objects.using(using).filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT))
+
+    def requeue():
+        error = 'Lost: running for more than %d seconds' % settings.JOB_TIMEOUT
+        failed = lost.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, finished_at=now, last_error=error)
+        return failed + lost.update(status=Job.PENDING, run_after=now, last_error=error)
+    return serialized_write(requeue, using=using)
+
+
+def work(stop, once=False, poll_interval=1.0):
+    '''
+    Run due jobs of every database until ``stop`` (a threading.Event) is set, or until
+    no job is due when ``once``. Returns the number of jobs run by status.
+    '''
+    worker = worker_name()
+    results = {}
+    try:
+        while not stop.is_set():
+            ran = False
+            for alias in primary_databases():
+                job = claim_job(alias, worker)
+                if job is not None:
+                    status = run_job(job, alias)
+                    results[status] = results.get(status, 0) + 1
+                    ran = True
+            if not ran:
+                if once:
+                    break
+                stop.wait(poll_interval)
+    finally:
+        # Threads have their own connections
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return results
+
+
+def run_workers(concurrency=1, once=False, poll_interval=1.0, stop=None):
+    '''
+    Run ``concurrency`` workers (threads) taking jobs from every database, see work().
+    Lost jobs are taken back when the workers start and every JOB_TIMEOUT seconds.
+    Returns the number of jobs run by status.
+    '''
+    stop = stop or threading.Event()
+    totals = {}
+    lock = threading.Lock()
+
+    def run():
+        results = work(stop, once=once, poll_interval=poll_interval)
+        with lock:
+            for status, count in results.items():
+                totals[status] = totals.get(status, 0) + count
+
+    def requeue():
+        for alias in primary_databases():
+            requeued = requeue_lost_jobs(alias)
+            if requeued:
+                logger.warning('Took back %d lost jobs of %s', requeued, alias)
+        return time.monotonic()
+
+    last_requeue = requeue()
+    threads = [threading.Thread(target=run, name='worker-%d' % number) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(poll_interval)
+            if not once and time.monotonic() - last_requeue >= settings.JOB_TIMEOUT:
+                last_requeue = requeue()
+    except KeyboardInterrupt:
+        # The running jobs finish before the workers stop
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return totals
+
+
+def job_counts():
+    '''
+    Number of jobs of every database by task and status:
+    {database: {task: {status: count}}}.
+    '''
+    counts = {}
+    for alias in primary_databases():
+        database = counts.setdefault(alias, {})
+        jobs = Job.objects.using(alias)
+        for name, status, count in jobs.values_list('task', 'status').annotate(Count('pk')).order_by('task', 'status'):
+            database.setdefault(name, {})[status] = count
+    return counts
@@ -0,0 +1,57 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from .models import Order, OrderEvent
+
+# Order status changes allowed from each status
+TRANSITIONS = {
+    Order.PLACED: {Order.MANAGED, Order.CANCELLED},
+    Order.MANAGED: {Order.DISPATCHED},
+    Order.DISPATCHED: set(),
+    Order.CANCELLED: set(),
+}
+STATUS_NAMES = dict(Order.STATUS_CHOICES)
+
+
+class InvalidTransition(Exception):
+    def __init__(self, invalid, status):
+        # invalid: {order number: current status (None when the order does not exist)}
+        self.invalid = invalid
+        self.status = status
+        super().__init__('Orders cannot change to %s: %s' % (STATUS_NAMES[status], ', '.join(
+            '%d (%s)' % (number, STATUS_NAMES.get(current, 'missing')) for number, current in sorted(invalid.items()))))
+
+
+def transition(numbers, status, using=None, unchanged=()):
+    '''
+    Change the status of the orders ``numbers`` of the ``using`` database to ``status``
+    and append an event per order, in one transaction with one UPDATE per current status
+    and batched INSERTs. Orders already in a status of ``unchanged`` are left as they are
+    (e.g. saving the dispatch of a managed order again). Raises InvalidTransition, and
+    changes nothing, when some order cannot change to ``status`` (see TRANSITIONS).
+    The changes are made without a savepoint: when another request changed some order
+    after it was read, the error must leave the transaction of the caller.
+    Returns the number of orders changed.
+    '''
+    using = using or DEFAULT_DB_ALIAS
+    numbers = list(numbers)
+    orders = Order.objects.using(using)
+    current = dict(orders.filter(orderNo__in=numbers).values_list('orderNo', 'status'))
+    invalid = {number: current.get(number) for number in numbers
+               if current.get(number) not in unchanged and status not in TRANSITIONS.get(current.get(number), ())}
+    if invalid:
+        raise InvalidTransition(invalid, status)
+    changed = {}
+    for number in numbers:
+        if current[number] not in unchanged:
+            changed.setdefault(current[number], []).append(number)
+    now = timezone.now()
+    with transaction.atomic(using=using, savepoint=False):
+        for from_status, from_numbers in changed.items():
+            # Another request may have changed some of them since they were read
+            updated = orders.filter(orderNo__in=from_numbers, status=from_status).update(status=status, updated_at=now)
+            if updated != len(from_numbers):
+                raise InvalidTransition({number: None for number in from_numbers}, status)
+        OrderEvent.objects.using(using).bulk_create(
+            [OrderEvent(order_no=number, from_status=from_status, to_status=status, created_at=now)
+             for from_status, from_numbers in changed.items() for number in from_numbers])
+    return sum(len(from_numbers) for from_numbers in changed.values())
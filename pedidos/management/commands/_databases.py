@@ -0,0 +1,39 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def throwaway_database(options=None):
+    '''
+    Create a migrated test database for the duration of the block, so commands never
+    touch the configured database. SQLite test databases are created in a temporary
+    file (instead of in memory) so forked worker processes share them.
+    ``options`` replaces the OPTIONS of the database while the block runs.
+    '''
+    settings_dict = connection.settings_dict
+    old_test_name = settings_dict['TEST'].get('NAME')
+    old_options = settings_dict['OPTIONS']
+    database_file = None
+    if connection.vendor == 'sqlite':
+        fd, database_file = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        os.remove(database_file)
+        settings_dict['TEST']['NAME'] = database_file
+    if options is not None:
+        settings_dict['OPTIONS'] = options
+    connection.close()
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        settings_dict['TEST']['NAME'] = old_test_name
+        settings_dict['OPTIONS'] = old_options
+        connection.close()
+        if database_file:
+            for suffix in ('', '-journal', '-wal', '-shm'):
+                if os.path.exists(database_file + suffix):
+                    os.remove(database_file + suffix)
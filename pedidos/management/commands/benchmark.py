@@ -0,0 +1,166 @@
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client as TestClient
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from pedidos.models import User, Order
+from pedidos.seed import seed
+from .benchmark_indexes import percentile
+
+# Requests timed for each view of pedidos/views.py (and the REST API): (name, user, url)
+# ``sample`` is a random order of the seeded data, the user is its client, the supplier
+# of its item or a staff user
+SCENARIOS = [
+    ('client-home', 'client', lambda sample: reverse('client-home')),
+    ('client-home-filtered', 'client', lambda sample: reverse('client-home') + '?min_price=100&max_price=500'),
+    ('supplier-home', 'supplier', lambda sample: reverse('supplier-home')),
+    ('supplier-queue', 'supplier', lambda sample: reverse('supplier-queue')),
+    ('create-order', 'client', lambda sample: reverse('create-order', args=[sample.item_id])),
+    ('edit-order', 'client', lambda sample: reverse('edit-order', args=[sample.item_id, sample.orderNo])),
+    ('client-order-detail', 'client', lambda sample: reverse('client-order-detail', args=[sample.item_id])),
+    ('supplier-item-detail', 'supplier', lambda sample: reverse('supplier-item-detail', args=[sample.item_id])),
+    ('edit-item', 'supplier', lambda sample: reverse('edit-item', args=[sample.item_id])),
+    ('manage-order', 'supplier', lambda sample: reverse('manage-order', args=[sample.item_id, sample.orderNo])),
+    ('change-feed', 'staff', lambda sample: reverse('change-feed') + '?limit=1000'),
+    ('api-item-list', 'client', lambda sample: reverse('api-item-list')),
+    ('api-order-list', 'supplier', lambda sample: reverse('api-order-list')),
+    ('api-order-detail', 'client', lambda sample: reverse('api-order-detail', args=[sample.orderNo])),
+]
+
+
+class QueryTimer:
+    # Database execute wrapper counting and timing the queries of a request
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database at several data sizes and time the requests (and their '
+            'queries) behind each view, writing the results as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated numbers of orders, items and clients scale with them')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests to each view at each size')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the cache between requests (by default every request starts with an empty cache)')
+        parser.add_argument('--output', default='-', help='JSON results file (- writes them to stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes must be a comma separated list of numbers of orders')
+        # The JSON goes to stdout when there is no output file, progress goes to stderr
+        log = self.stderr if options['output'] == '-' else self.stdout
+
+        setup_test_environment()
+        # The benchmark never touches the configured database
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+        results = []
+        try:
+            for size in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                counts = data_size(size)
+                log.write('Seeding %(suppliers)d suppliers, %(items)d items, %(clients)d clients, %(orders)d orders...' % counts)
+                seed(random_seed=options['seed'], **counts)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                for name, timings in self.measure(options).items():
+                    results.append({'size': counts, 'view': name, **timings})
+                    log.write('  %-22s %3d queries  sql p50 %8.3f ms  request p50 %8.3f ms  p95 %8.3f ms' % (
+                        name, timings['queries'], timings['sql_ms']['p50'],
+                        timings['request_ms']['p50'], timings['request_ms']['p95']))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+            },
+            'options': {'sizes': sizes, 'repeat': options['repeat'], 'seed': options['seed'],
+                        'warm_cache': options['warm_cache']},
+            'results': results,
+        }
+        if options['output'] == '-':
+            json.dump(report, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+        else:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            log.write('Results written to %s' % options['output'])
+
+    def measure(self, options):
+        rng = random.Random(options['seed'])
+        staff = User.objects.create(username='benchmark-staff', is_staff=True)
+        order_numbers = list(Order.objects.values_list('orderNo', flat=True))
+        client = TestClient()
+        timings = {name: {'queries': [], 'sql': [], 'request': []} for name, _, _ in SCENARIOS}
+        for _ in range(options['repeat']):
+            sample = Order.objects.select_related('item').get(orderNo=rng.choice(order_numbers))
+            users = {'client': sample.client_id, 'supplier': sample.item.supplier_id, 'staff': staff.pk}
+            for name, user, url in SCENARIOS:
+                client.force_login(User.objects.get(pk=users[user]))
+                if not options['warm_cache']:
+                    cache.clear()
+                path = url(sample)
+                timer = QueryTimer()
+                with connection.execute_wrapper(timer):
+                    start = time.perf_counter()
+                    response = client.get(path)
+                    if response.streaming:
+                        # Streaming responses run their queries while the content is read
+                        b''.join(response.streaming_content)
+                    elapsed = time.perf_counter() - start
+                if response.status_code >= 400:
+                    raise CommandError('%s returned %d' % (path, response.status_code))
+                timings[name]['queries'].append(timer.count)
+                timings[name]['sql'].append(timer.seconds * 1000)
+                timings[name]['request'].append(elapsed * 1000)
+        return {name: {
+            'queries': max(values['queries']),
+            'sql_ms': summary(values['sql']),
+            'request_ms': summary(values['request']),
+        } for name, values in timings.items()}
+
+
+def data_size(orders):
+    # Items and clients grow with the orders, every client orders each item at most once
+    items = max(10, orders // 10)
+    clients = max(10, orders // 20)
+    return {'suppliers': max(2, items // 400), 'items': items, 'clients': clients, 'orders': orders}
+
+
+def summary(values):
+    return {
+        'mean': round(statistics.mean(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'max': round(max(values), 3),
+    }
@@ -0,0 +1,132 @@
+import random
+import statistics
+import time
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import setup_databases, teardown_databases
+from pedidos.seed import seed
+
+# Last migration without the composite/partial indexes and the client/item constraint
+BASELINE_MIGRATION = '0001_initial'
+
+# Hot lookups of pedidos/views.py, in plain SQL so they run on both schemas (the ones
+# on columns the baseline schema does not have are only measured after)
+QUERIES = [
+    ('Order(item, client) - create_order, client_order_detail',
+     'SELECT "orderNo" FROM "pedidos_order" WHERE "item_id" = %s AND "client_id" = %s',
+     lambda sample: (sample.item(), sample.client())),
+    ('Order(item) by created_at - supplier_item_detail',
+     'SELECT "orderNo", "created_at" FROM "pedidos_order" WHERE "item_id" = %s ORDER BY "created_at"',
+     lambda sample: (sample.item(),)),
+    ('Urgent distribution center orders of an item',
+     'SELECT "orderNo" FROM "pedidos_order" WHERE "distribution_center" AND "is_urgent" AND "item_id" = %s '
+     'ORDER BY "created_at"',
+     lambda sample: (sample.item(),)),
+    ('Item(supplier) by code - supplier_home',
+     'SELECT "code" FROM "pedidos_item" WHERE "supplier_id" = %s ORDER BY "code"',
+     lambda sample: (sample.supplier(),)),
+    ('Placed orders of the supplier items by priority - supplier_queue',
+     'SELECT "pedidos_order"."orderNo" FROM "pedidos_order" '
+     'INNER JOIN "pedidos_item" ON "pedidos_order"."item_id" = "pedidos_item"."code" '
+     'WHERE "pedidos_item"."supplier_id" = %s AND "pedidos_order"."status" = %s '
+     'ORDER BY "pedidos_order"."priority" DESC, "pedidos_order"."created_at" LIMIT 50',
+     lambda sample: (sample.supplier(), 'P')),
+]
+
+
+class Sample:
+    # Random existing keys used as query parameters
+    def __init__(self, rng):
+        self.rng = rng
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT "code" FROM "pedidos_item"')
+            self.items = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT "user_id" FROM "pedidos_client"')
+            self.clients = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT "user_id" FROM "pedidos_supplier"')
+            self.suppliers = [row[0] for row in cursor.fetchall()]
+
+    def item(self):
+        return self.rng.choice(self.items)
+
+    def client(self):
+        return self.rng.choice(self.clients)
+
+    def supplier(self):
+        return self.rng.choice(self.suppliers)
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and compare the query plans and latency of the hot '
+            'Order/Item lookups with the current indexes and with the ones of the baseline migration')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--items', type=int, default=20000)
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=200, help='Executions of each query')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+        parser.add_argument('--placed', type=int, default=10,
+                            help='Percentage of orders still placed, the rest are marked as dispatched')
+        parser.add_argument('--baseline', default=BASELINE_MIGRATION, help='Migration the indexes are compared with')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('Query plans are only reported for SQLite')
+        # The benchmark never touches the configured database
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+        try:
+            self.stdout.write('Seeding %(suppliers)d suppliers, %(items)d items, %(clients)d clients, %(orders)d orders...' % options)
+            seed(options['suppliers'], options['items'], options['clients'], options['orders'], random_seed=options['seed'])
+            # Seeded orders are all placed, most orders of a real database left the queue
+            with connection.cursor() as cursor:
+                cursor.execute('UPDATE "pedidos_order" SET "status" = %s WHERE "orderNo" %% 100 >= %s',
+                               ['D', options['placed']])
+            after = self.measure(options)
+            call_command('migrate', 'pedidos', options['baseline'], verbosity=0)
+            before = self.measure(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        for name, _, _ in QUERIES:
+            self.stdout.write('\n' + self.style.MIGRATE_HEADING(name))
+            for label, results in (('before', before), ('after', after)):
+                plan, timings = results[name]
+                if timings is None:
+                    self.stdout.write('  %-6s not available on this schema' % label)
+                    continue
+                self.stdout.write('  %-6s mean %8.3f ms  p95 %8.3f ms' % (
+                    label, statistics.mean(timings), percentile(timings, 95)))
+                for line in plan:
+                    self.stdout.write('           %s' % line)
+
+    def measure(self, options):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        sample = Sample(random.Random(options['seed']))
+        results = {}
+        for name, sql, make_params in QUERIES:
+            with connection.cursor() as cursor:
+                try:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, make_params(sample))
+                except OperationalError:
+                    # Column added after the baseline migration
+                    results[name] = (None, None)
+                    continue
+                plan = [row[-1] for row in cursor.fetchall()]
+                timings = []
+                for _ in range(options['repeat']):
+                    params = make_params(sample)
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (plan, timings)
+        return results
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
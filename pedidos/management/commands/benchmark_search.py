@@ -0,0 +1,64 @@
+import random
+import statistics
+import time
+from unittest import mock
+from django.core.management.base import BaseCommand
+from django.db import connection
+from pedidos.search import search_items
+from pedidos.seed import seed, ITEM_PRODUCTS, ITEM_MATERIALS, ITEM_DETAILS
+from ._databases import throwaway_database
+from .benchmark_indexes import percentile
+
+
+def make_searches(rng, items):
+    # Searches of the seeded descriptions: whole words, prefixes, several words, item
+    # model numbers (seeded item codes start at 1) and filters
+    return [
+        ('one word', lambda: {'text': rng.choice(ITEM_PRODUCTS)}),
+        ('prefix', lambda: {'text': rng.choice(ITEM_PRODUCTS)[:3]}),
+        ('three words', lambda: {'text': ' '.join((rng.choice(ITEM_PRODUCTS), rng.choice(ITEM_MATERIALS),
+                                                   rng.choice(ITEM_DETAILS)))}),
+        ('rare word (model number)', lambda: {'text': str(rng.randrange(1, items + 1))}),
+        ('word and price range', lambda: {'text': rng.choice(ITEM_DETAILS), 'min_price': 100, 'max_price': 500}),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and compare the latency of the catalog search with '
+            'the full-text index and with a description scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=100)
+        parser.add_argument('--items', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=50, help='Executions of each search')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('The full-text index is only available on SQLite')
+        with throwaway_database():
+            self.stdout.write('Seeding %(suppliers)d suppliers, %(items)d items...' % options)
+            seed(options['suppliers'], options['items'], 0, 0, random_seed=options['seed'])
+            indexed = self.measure(options)
+            # The search falls back to the scan on databases without the index
+            with mock.patch('pedidos.search._unindexed', {'default'}):
+                scanned = self.measure(options)
+
+        for name, _ in make_searches(None, 0):
+            self.stdout.write('\n' + self.style.MIGRATE_HEADING(name))
+            for label, results in (('index', indexed), ('scan', scanned)):
+                timings = results[name]
+                self.stdout.write('  %-6s mean %8.3f ms  p95 %8.3f ms' % (
+                    label, statistics.mean(timings), percentile(timings, 95)))
+
+    def measure(self, options):
+        results = {}
+        for name, make_search in make_searches(random.Random(options['seed']), options['items']):
+            timings = []
+            for _ in range(options['repeat']):
+                search = make_search()
+                start = time.perf_counter()
+                search_items(search.pop('text'), **search)
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = timings
+        return results
@@ -0,0 +1,160 @@
+import json
+import multiprocessing
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, connections, transaction
+from django.test.utils import override_settings
+from pedidos.idempotency import run_once
+from pedidos.models import Client, Item, ManageOrder, Order
+from pedidos.seed import seed
+from pedidos.sequences import order_numbers
+from pedidos.writes import serialized_write
+from ._databases import throwaway_database
+from .benchmark_indexes import percentile
+
+# Items of the benchmark database, every client orders each item once
+ITEMS = 100
+
+# Database profiles compared: (database OPTIONS, persistent connections, serialized writes)
+PROFILES = {
+    'development': ({}, False, False),
+    'production': (settings.SQLITE_PRODUCTION_OPTIONS, True, True),
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare the write throughput of the development and production database profiles: '
+            'many processes and threads create, edit and dispatch orders at once on a throwaway database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='Orders created (each one is also edited and dispatched)')
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=8, help='Threads of each process')
+        parser.add_argument('--profiles', default='development,production')
+        parser.add_argument('--output', help='JSON results file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The database profiles only apply to SQLite')
+        profiles = options['profiles'].split(',')
+        if set(profiles) - set(PROFILES):
+            raise CommandError('Unknown profiles, choose from %s' % ', '.join(PROFILES))
+
+        results = {}
+        for profile in profiles:
+            database_options, persistent, serialized = PROFILES[profile]
+            # The first write of a profile resets the order number blocks of the previous database
+            order_numbers._reset()
+            with throwaway_database(database_options), override_settings(SERIALIZE_WRITES=serialized):
+                results[profile] = self.measure(options, persistent)
+            summary = results[profile]
+            self.stdout.write(self.style.MIGRATE_HEADING(profile))
+            self.stdout.write('  %(writes)d writes in %(elapsed_s).2f s: %(throughput_wps).1f writes/s, %(errors)d errors' % summary)
+            for operation, timings in summary['operations'].items():
+                self.stdout.write('  %-8s p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms  errors %d' % (
+                    operation, timings['p50_ms'], timings['p95_ms'], timings['p99_ms'], timings['errors']))
+            for error, count in summary['error_types'].items():
+                self.stdout.write('  %d x %s' % (count, error))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'options': {name: options[name] for name in ('orders', 'processes', 'threads')},
+                           'profiles': results}, output, indent=2)
+            self.stdout.write('Results written to %s' % options['output'])
+
+    def measure(self, options, persistent):
+        clients = -(-options['orders'] // ITEMS)
+        seed(1, ITEMS, clients, 0, random_seed=0)
+        client_ids = list(Client.objects.order_by('pk').values_list('pk', flat=True))
+        item_codes = list(Item.objects.order_by('code').values_list('code', flat=True))
+        pairs = [(client_ids[n // ITEMS], item_codes[n % ITEMS]) for n in range(options['orders'])]
+
+        # Forked processes must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        start = time.perf_counter()
+        with context.Pool(options['processes']) as pool:
+            results = pool.starmap(write_orders, [
+                (pairs[process::options['processes']], options['threads'], persistent)
+                for process in range(options['processes'])
+            ])
+        elapsed = time.perf_counter() - start
+
+        latencies = defaultdict(list)
+        errors = defaultdict(Counter)
+        for process_latencies, process_errors in results:
+            for operation, values in process_latencies.items():
+                latencies[operation].extend(values)
+            for operation, counts in process_errors.items():
+                errors[operation].update(counts)
+        writes = sum(len(values) for values in latencies.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'writes': writes,
+            'errors': sum(sum(counts.values()) for counts in errors.values()),
+            'throughput_wps': round(writes / elapsed, 2),
+            'error_types': dict(sum(errors.values(), Counter())),
+            'operations': {operation: {
+                'writes': len(values),
+                'errors': sum(errors[operation].values()),
+                'mean_ms': round(statistics.mean(values), 3),
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+                'p99_ms': round(percentile(values, 99), 3),
+            } for operation, values in latencies.items()},
+        }
+
+
+def write_orders(pairs, threads, persistent):
+    # Create, edit and dispatch an order per (client, item) pair from ``threads`` threads,
+    # through the same write path as the create_order, edit_order and manage_order_create views
+    latencies = defaultdict(list)
+    errors = defaultdict(Counter)
+    lock = threading.Lock()
+
+    def timed(operation, write):
+        start = time.perf_counter()
+        try:
+            write()
+        except Exception as error:
+            with lock:
+                errors[operation][type(error).__name__ + ': ' + str(error)] += 1
+            return False
+        finally:
+            with lock:
+                latencies[operation].append((time.perf_counter() - start) * 1000)
+            # Without persistent connections every request opens its own connection
+            if not persistent:
+                connection.close()
+        return True
+
+    def work(chunk):
+        for client_id, item_code in chunk:
+            order = Order(client=Client(user_id=client_id, client_type=Client.NORMAL), item_id=item_code, quantity=1)
+
+            def place(number):
+                order.orderNo = number
+                try:
+                    with transaction.atomic():
+                        order.save()
+                except IntegrityError:
+                    return None
+                return order.orderNo
+
+            if not timed('create', lambda: run_once(order.client, None, place, prepare=lambda: order_numbers.allocate()[0])):
+                continue
+            order.quantity = 2
+            timed('edit', lambda: serialized_write(order.save))
+            timed('dispatch', lambda: serialized_write(ManageOrder(orderNo=order, warehouse='almacen').save))
+        connection.close()
+
+    workers = [threading.Thread(target=work, args=(pairs[thread::threads],)) for thread in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return dict(latencies), dict(errors)
@@ -0,0 +1,37 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from pedidos.bulk_items import IMPORT_FORMATS, ITEM_IMPORT_BATCH_SIZE, import_items, read_item_rows
+from pedidos.models import Supplier
+
+
+class Command(BaseCommand):
+    help = ('Create or update the items of a supplier from a CSV (code, description, price columns) or '
+            'JSON lines file, a batch at a time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import (- reads the standard input)')
+        parser.add_argument('--supplier', required=True, help='User name of the supplier')
+        parser.add_argument('--format', choices=IMPORT_FORMATS,
+                            help='Format of the file (default: jsonl for .jsonl and .ndjson files, else csv)')
+        parser.add_argument('--batch-size', type=int, default=ITEM_IMPORT_BATCH_SIZE, help='Rows validated and written together')
+
+    def handle(self, *args, **options):
+        try:
+            supplier = Supplier.objects.get(user__username=options['supplier'])
+        except Supplier.DoesNotExist:
+            raise CommandError('Supplier "%s" does not exist.' % options['supplier'])
+        path = options['path']
+        format = options['format'] or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+        file = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            result = import_items(supplier.pk, read_item_rows(file, format), batch_size=options['batch_size'])
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        for error in result['errors']:
+            self.stdout.write('Line %s (code %s): %s' % (error['line'], error['code'], '; '.join(
+                '%s: %s' % (field, ' '.join(str(message) for message in messages)) for field, messages in error['errors'].items())))
+        if result['failed'] > len(result['errors']):
+            self.stdout.write('... %d more rows with errors' % (result['failed'] - len(result['errors'])))
+        message = '%(created)d created, %(updated)d updated, %(unchanged)d unchanged, %(failed)d failed' % result
+        self.stdout.write(self.style.WARNING(message) if result['failed'] else self.style.SUCCESS(message))
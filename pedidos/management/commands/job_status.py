@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from pedidos.jobs import job_counts
+from pedidos.models import Job
+from pedidos.routers import primary_databases
+
+
+class Command(BaseCommand):
+    help = 'Number of background jobs of every database by task and status, and the last failed jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', type=int, default=10, help='Failed jobs listed per database')
+
+    def handle(self, *args, **options):
+        statuses = dict(Job.STATUS_CHOICES)
+        for database, tasks in job_counts().items():
+            self.stdout.write(self.style.MIGRATE_HEADING(database))
+            for name, counts in tasks.items():
+                self.stdout.write('  %-20s %s' % (name, ', '.join(
+                    '%s %d' % (statuses[status], count) for status, count in counts.items())))
+        for database in primary_databases():
+            failed = Job.objects.using(database).filter(status=Job.FAILED).order_by('-finished_at')[:options['failed']]
+            for job in failed:
+                error = job.last_error.strip().splitlines()
+                self.stdout.write('Failed job %d (%s, %s) %s: %s' % (
+                    job.pk, job.task, database, job.payload, error[-1] if error else ''))
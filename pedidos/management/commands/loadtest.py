@@ -0,0 +1,253 @@
+import io
+import json
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import requests
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from .benchmark_indexes import percentile
+
+# Links parsed from the pages of the flow
+EDIT_ORDER_LINK = re.compile(r'/item/(\d+)/order/edit/(\d+)/"')
+MANAGE_ORDER_LINK = re.compile(r'/supplier/item/(\d+)/order/edit/(\d+)/"')
+IDEMPOTENCY_KEY_INPUT = re.compile(r'name="idempotency_key" value="([^"]*)"')
+
+
+class Account:
+    # Signed up user of the load test, its session cookies are shared by the worker threads
+    def __init__(self, username, cookies):
+        self.username = username
+        self.cookies = cookies
+        self.items = []
+
+
+class LoadTest:
+    '''
+    HTTP driver of the order workflow. Every worker thread has its own requests
+    session per account (cookies copied from the signup session), so the connection
+    pool of a session is never shared between threads.
+    '''
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(list)
+
+    def session(self, account):
+        sessions = self.local.__dict__.setdefault('sessions', {})
+        if account.username not in sessions:
+            session = requests.Session()
+            session.cookies.update(account.cookies)
+            sessions[account.username] = session
+        return sessions[account.username]
+
+    def request(self, session, route, method, path, expected, **kwargs):
+        if method == 'POST':
+            # Django accepts the CSRF cookie value as the form token
+            kwargs['data'] = {'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''), **kwargs.get('data', {})}
+            kwargs['headers'] = {'Referer': urljoin(self.base_url, path)}
+        start = time.perf_counter()
+        try:
+            response = session.request(method, urljoin(self.base_url, path), allow_redirects=False,
+                                       timeout=self.timeout, **kwargs)
+        except requests.RequestException as error:
+            self.record(route, method, time.perf_counter() - start, type(error).__name__)
+            return None
+        error = None if response.status_code == expected else 'HTTP %d' % response.status_code
+        self.record(route, method, time.perf_counter() - start, error)
+        return response if error is None else None
+
+    def record(self, route, method, seconds, error):
+        name = '%s %s' % (method, route)
+        with self.lock:
+            self.latencies[name].append(seconds * 1000)
+            if error:
+                self.errors[name].append(error)
+
+    def signup(self, kind, username, password, data, files=None):
+        # Sign up over HTTP, the signup view logs the new user in
+        session = requests.Session()
+        route = '%s-signup' % kind
+        path = reverse(route)
+        self.request(session, route, 'GET', path, 200)
+        response = self.request(session, route, 'POST', path, 302, files=files, data={
+            'username': username, 'password1': password, 'password2': password, **data})
+        if response is None:
+            raise CommandError('Could not sign up %s %s (is the server running at %s?)' % (kind, username, self.base_url))
+        return Account(username, session.cookies.copy())
+
+    def create_items(self, account, codes):
+        session = self.session(account)
+        self.request(session, 'create-item', 'GET', reverse('create-item'), 200)
+        for code in codes:
+            response = self.request(session, 'create-item', 'POST', reverse('create-item'), 302, data={
+                'code': code, 'description': 'Articulo de carga %d' % code, 'price': random.randint(1, 5000)})
+            if response is not None:
+                account.items.append(code)
+
+    def client_flow(self, client, items, rng):
+        '''
+        client_home -> client_order_detail -> create_order (or edit_order when the item
+        was already ordered) -> supplier_item_detail -> manage_order_create
+        '''
+        session = self.session(client)
+        self.request(session, 'client-home', 'GET', reverse('client-home'), 200)
+        supplier, code = rng.choice(items)
+        response = self.request(session, 'client-order-detail', 'GET', reverse('client-order-detail', args=[code]), 200)
+        if response is None:
+            return
+        link = EDIT_ORDER_LINK.search(response.text)
+        data = {'quantity': rng.randint(1, 100)}
+        if rng.random() < 0.2:
+            data['is_urgent'] = 'on'
+        if rng.random() < 0.4:
+            data['distribution_center'] = 'on'
+        if link:
+            path = reverse('edit-order', args=[code, link.group(2)])
+            self.request(session, 'edit-order', 'GET', path, 200)
+            self.request(session, 'edit-order', 'POST', path, 302, data=data)
+        else:
+            path = reverse('create-order', args=[code])
+            response = self.request(session, 'create-order', 'GET', path, 200)
+            key = IDEMPOTENCY_KEY_INPUT.search(response.text) if response is not None else None
+            if key:
+                data['idempotency_key'] = key.group(1)
+            self.request(session, 'create-order', 'POST', path, 302, data=data)
+
+        # The supplier of the item dispatches one of its orders
+        session = self.session(supplier)
+        response = self.request(session, 'supplier-item-detail', 'GET', reverse('supplier-item-detail', args=[code]), 200)
+        links = MANAGE_ORDER_LINK.findall(response.text) if response is not None else []
+        if not links:
+            return
+        path = reverse('manage-order', args=rng.choice(links))
+        self.request(session, 'manage-order', 'GET', path, 200)
+        self.request(session, 'manage-order', 'POST', path, 302, data={'warehouse': 'Almacen %d' % rng.randint(1, 10)})
+
+    def report(self, elapsed):
+        routes = {}
+        for name, values in sorted(self.latencies.items()):
+            routes[name] = {
+                'requests': len(values),
+                'errors': len(self.errors[name]),
+                'error_types': dict(sorted((error, self.errors[name].count(error)) for error in set(self.errors[name]))),
+                'throughput_rps': round(len(values) / elapsed, 2),
+                'mean_ms': round(statistics.mean(values), 3),
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+                'p99_ms': round(percentile(values, 99), 3),
+                'max_ms': round(max(values), 3),
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'requests': total,
+            'errors': sum(route['errors'] for route in routes.values()),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+            'routes': routes,
+        }
+
+
+class Command(BaseCommand):
+    help = ('Sign up clients and suppliers on a running server and drive the order workflow over HTTP '
+            'at the given concurrency, reporting throughput and p50/p95/p99 latency per route. '
+            'It writes to the database of the server: run it against a test deployment.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--start-server', action='store_true',
+                            help='Start "manage.py runserver" at --base-url for the duration of the test')
+        parser.add_argument('--clients', type=int, default=20, help='Client accounts')
+        parser.add_argument('--suppliers', type=int, default=5, help='Supplier accounts')
+        parser.add_argument('--items', type=int, default=10, help='Items of each supplier')
+        parser.add_argument('--flows', type=int, default=10, help='Workflows run by each client')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent workflows')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for a response')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed of the workflows')
+        parser.add_argument('--output', help='JSON results file')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/') + '/'
+        server = self.start_server(base_url) if options['start_server'] else None
+        try:
+            report = self.run(LoadTest(base_url, options['timeout']), options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        self.stdout.write('%(requests)d requests in %(elapsed_s).2f s: %(throughput_rps).1f requests/s, %(errors)d errors' % report)
+        self.stdout.write('  %-30s %8s %7s %8s %9s %9s %9s' % ('route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, route in report['routes'].items():
+            self.stdout.write('  %-30s %8d %7d %8.1f %9.2f %9.2f %9.2f' % (
+                name, route['requests'], route['errors'], route['throughput_rps'],
+                route['p50_ms'], route['p95_ms'], route['p99_ms']))
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'options': {name: options[name] for name in (
+                    'base_url', 'clients', 'suppliers', 'items', 'flows', 'concurrency', 'seed')}, **report},
+                    output, indent=2)
+            self.stdout.write('Results written to %s' % options['output'])
+
+    def run(self, test, options):
+        rng = random.Random(options['seed'])
+        tag = uuid.uuid4().hex[:8]
+        password = 'Carga-%s-%s' % (tag, uuid.uuid4().hex)
+        photo = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(photo, 'PNG')
+
+        self.stdout.write('Signing up %(suppliers)d suppliers and %(clients)d clients...' % options)
+        client_types = [rng.choice(['1', '2', '3', '4']) for _ in range(options['clients'])]
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            suppliers = list(pool.map(lambda n: test.signup('supplier', 'load-%s-s%d' % (tag, n), password, {
+                'address': 'Calle %d' % n, 'items_supplied': 'Articulos de carga'}), range(options['suppliers'])))
+            clients = list(pool.map(lambda n: test.signup('client', 'load-%s-c%d' % (tag, n), password, {
+                'code': 'C%d' % n, 'address': 'Calle %d' % n, 'client_type': client_types[n]},
+                files={'photo': ('photo.png', photo.getvalue(), 'image/png')}), range(options['clients'])))
+            # Item codes continue from a random base so repeated runs do not collide
+            first_code = rng.randrange(10 ** 6, 2 ** 31 - 10 ** 6, 10 ** 5)
+            list(pool.map(lambda n: test.create_items(suppliers[n], range(
+                first_code + n * options['items'], first_code + (n + 1) * options['items'])), range(len(suppliers))))
+        items = [(supplier, code) for supplier in suppliers for code in supplier.items]
+        if not items:
+            raise CommandError('No items could be created')
+
+        # Only the workflows are measured
+        test.latencies.clear()
+        test.errors.clear()
+        self.stdout.write('Running %d workflows with %d concurrent workers...' % (
+            options['clients'] * options['flows'], options['concurrency']))
+        flows = [(client, random.Random(rng.random())) for client in clients for _ in range(options['flows'])]
+        # Workflows of the same client are spread over the run instead of running at once
+        rng.shuffle(flows)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for result in [pool.submit(test.client_flow, client, items, flow_rng) for client, flow_rng in flows]:
+                result.result()
+        return test.report(time.perf_counter() - start)
+
+    def start_server(self, base_url):
+        address = base_url.split('://', 1)[-1].strip('/')
+        server = subprocess.Popen([sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', address, '--noreload'],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(100):
+            try:
+                requests.get(urljoin(base_url, reverse('login')), timeout=1)
+                return server
+            except requests.RequestException:
+                time.sleep(0.1)
+        server.terminate()
+        raise CommandError('The server did not start at %s' % base_url)
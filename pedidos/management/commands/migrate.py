@@ -0,0 +1,14 @@
+from django.core.management.commands import migrate
+from pedidos.routers import migrating_database
+
+
+class Command(migrate.Command):
+    # Django migrate, with the queries of the data migrations sent to the database being
+    # migrated (a shard too, see routers.py) until the command ends, even when it fails
+
+    def handle(self, *args, **options):
+        token = migrating_database.set(options['database'])
+        try:
+            return super().handle(*args, **options)
+        finally:
+            migrating_database.reset(token)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from pedidos.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete the expired idempotency keys of order creation requests (run it periodically, e.g. from cron)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write('Deleted %d expired idempotency keys' % deleted)
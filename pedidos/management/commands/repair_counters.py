@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from pedidos.counters import COUNTERS, repair_counters
+from pedidos.routers import primary_databases
+
+
+class Command(BaseCommand):
+    help = ('Recompute the order counters of the items and suppliers from the orders of every database '
+            'and fix the ones that drifted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the drift without fixing it')
+        parser.add_argument('--database', action='append', help='Database to repair (default: every database)')
+
+    def handle(self, *args, **options):
+        total = 0
+        for database in options['database'] or primary_databases():
+            drift = repair_counters(database, dry_run=options['dry_run'])
+            total += len(drift)
+            for model, key, stored, actual in drift:
+                self.stdout.write('%s %s %s: %s' % (database, model, key, ', '.join(
+                    '%s %s -> %s' % (name, stored[name], actual[name]) for name in COUNTERS if stored[name] != actual[name])))
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Counters in sync'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING('%d counters drifted' % total))
+        else:
+            self.stdout.write(self.style.SUCCESS('Fixed %d drifted counters' % total))
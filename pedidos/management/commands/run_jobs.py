@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from pedidos.jobs import run_workers
+from pedidos.models import Job
+
+
+class Command(BaseCommand):
+    help = ('Run the background jobs (dispatch processing) of every database, run it next to the web '
+            'server (e.g. as a service). Stop it with Ctrl+C, the running jobs finish first')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs run at once by this worker (threads)')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between checks for due jobs')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due')
+
+    def handle(self, *args, **options):
+        results = run_workers(concurrency=options['concurrency'], once=options['once'],
+                              poll_interval=options['poll_interval'])
+        statuses = dict(Job.STATUS_CHOICES)
+        self.stdout.write('Jobs run: %s' % (', '.join('%s %d' % (statuses[status], count)
+                                                      for status, count in sorted(results.items())) or 'none'))
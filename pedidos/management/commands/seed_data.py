@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from pedidos.seed import BATCH_SIZE, seed
+
+
+class Command(BaseCommand):
+    help = ('Bulk-insert synthetic suppliers, items, clients and orders into the configured database '
+            '(client types and order flags follow the distributions of pedidos/seed.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=10)
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed (repeatable data)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows inserted per INSERT statement')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            created = seed(options['suppliers'], options['items'], options['clients'], options['orders'],
+                           random_seed=options['seed'], batch_size=options['batch_size'])
+        except ValueError as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Created %(suppliers)d suppliers, %(items)d items, %(clients)d clients and %(orders)d orders' % created
+            + ' in %.2f s' % elapsed))
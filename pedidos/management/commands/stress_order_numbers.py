@@ -0,0 +1,99 @@
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from pedidos.models import Client, Item, Order, Sequence
+from pedidos.seed import seed
+from pedidos.sequences import order_numbers
+from ._databases import throwaway_database
+
+# Items of the stress database, every client orders each item once
+ITEMS = 100
+
+
+class Command(BaseCommand):
+    help = ('Create orders from many processes and threads at once on a throwaway test database and '
+            'check that every order got a unique number and no insert was lost')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--threads', type=int, default=4, help='Threads of each process')
+        parser.add_argument('--block-size', type=int, default=order_numbers.block_size,
+                            help='Order numbers reserved at once by each process')
+
+    def handle(self, *args, **options):
+        workers = options['processes'] * options['threads']
+        if options['orders'] < workers:
+            raise CommandError('At least one order per thread is needed')
+        order_numbers.block_size = options['block_size']
+
+        with throwaway_database():
+            clients = -(-options['orders'] // ITEMS)
+            seed(1, ITEMS, clients, 0, random_seed=0)
+            if connection.vendor == 'sqlite':
+                # Readers do not block the writers (the mode is stored in the database file)
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode=WAL')
+            first_number = Sequence.objects.get(name='order').next_value
+            client_ids = list(Client.objects.order_by('pk').values_list('pk', flat=True))
+            item_codes = list(Item.objects.order_by('code').values_list('code', flat=True))
+            pairs = [(client_ids[n // ITEMS], item_codes[n % ITEMS]) for n in range(options['orders'])]
+
+            # Forked processes must open their own database connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            start = time.perf_counter()
+            with context.Pool(options['processes']) as pool:
+                results = pool.starmap(create_orders, [
+                    (pairs[process::options['processes']], options['threads'])
+                    for process in range(options['processes'])
+                ])
+            elapsed = time.perf_counter() - start
+
+            numbers = [number for created, _ in results for number in created]
+            errors = sum((failed for _, failed in results), Counter())
+            stored = set(Order.objects.values_list('orderNo', flat=True))
+            sequence = Sequence.objects.get(name='order').next_value
+
+        duplicates = len(numbers) - len(set(numbers))
+        lost = len(set(numbers) - stored)
+        self.stdout.write('%d orders from %d processes x %d threads in %.2f s (%.0f orders/s)' % (
+            len(numbers), options['processes'], options['threads'], elapsed, len(numbers) / elapsed))
+        self.stdout.write('Numbers used %d of %d reserved (block size %d)' % (
+            len(numbers), sequence - first_number, options['block_size']))
+        for error, count in errors.items():
+            self.stdout.write('  %d x %s' % (count, error))
+        if duplicates or lost or errors or len(stored) != options['orders']:
+            raise CommandError('%d duplicate numbers, %d lost inserts, %d errors, %d of %d orders stored' % (
+                duplicates, lost, sum(errors.values()), len(stored), options['orders']))
+        self.stdout.write(self.style.SUCCESS('No duplicate numbers and no lost inserts'))
+
+
+def create_orders(pairs, threads):
+    # Save an order per (client, item) pair from ``threads`` threads of a worker process
+    created = []
+    failed = Counter()
+    lock = threading.Lock()
+
+    def work(chunk):
+        for client_id, item_code in chunk:
+            order = Order(client_id=client_id, item_id=item_code, quantity=1)
+            try:
+                order.save()
+            except Exception as error:
+                with lock:
+                    failed[type(error).__name__ + ': ' + str(error)] += 1
+            else:
+                with lock:
+                    created.append(order.orderNo)
+        connection.close()
+
+    workers = [threading.Thread(target=work, args=(pairs[thread::threads],)) for thread in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return created, failed
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from pedidos.shards import SHARD_BATCH_SIZE, sync_shards
+
+
+class Command(BaseCommand):
+    help = ('Copy the accounts to every supplier shard and move the items, orders and dispatches of every '
+            'supplier to its database (run it after changing PEDIDOS_SUPPLIER_SHARDS)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SHARD_BATCH_SIZE, help='Rows copied per INSERT statement')
+
+    def handle(self, *args, **options):
+        moved = sync_shards(batch_size=options['batch_size'])
+        for database, rows in moved.items():
+            self.stdout.write('Moved %d rows to %s' % (rows, database))
+        self.stdout.write(self.style.SUCCESS('Shards in sync'))
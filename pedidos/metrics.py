@@ -0,0 +1,182 @@
+import contextvars
+import logging
+import threading
+import time
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+from .caching import CACHE_STATS
+
+# Request metrics of this process (see middleware.PerformanceMiddleware): every request
+# records its route, SQL queries and time, template render time and total time. They are
+# sent back in the Server-Timing header, added to per-route histograms (exposed in the
+# Prometheus text format by the metrics view) and slow requests are logged with their SQL.
+# Like CACHE_STATS, metrics are kept by each process: every worker reports its own.
+
+# Upper bounds of the histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# SQL statements kept by a request for the slow request log
+SLOW_REQUEST_MAX_QUERIES = 50
+
+slow_log = logging.getLogger('pedidos.slow_requests')
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        # Templates being rendered (the ones rendered by another template are not timed twice)
+        self.rendering = 0
+        # (seconds, sql) of the first SLOW_REQUEST_MAX_QUERIES statements
+        self.statements = []
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        # Connection.execute_wrapper() hook: time every statement of the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            if len(self.statements) < SLOW_REQUEST_MAX_QUERIES:
+                self.statements.append((elapsed, sql))
+
+    def server_timing(self, total):
+        # Server-Timing header value (milliseconds)
+        return 'sql;desc="%d queries";dur=%.2f, template;dur=%.2f, total;dur=%.2f' % (
+            self.queries, self.sql_time * 1000, self.template_time * 1000, total * 1000)
+
+
+# Metrics of the request being handled (None outside requests)
+request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.slow = 0
+
+
+# Metrics of every route name since the process started
+ROUTE_METRICS = {}
+_lock = threading.Lock()
+
+
+def record_request(route, metrics, total):
+    '''
+    Add a finished request of ``route`` to the route metrics. Returns True when the
+    request was slower than SLOW_REQUEST_THRESHOLD.
+    '''
+    slow = total * 1000 >= settings.SLOW_REQUEST_THRESHOLD
+    with _lock:
+        route_metrics = ROUTE_METRICS.get(route)
+        if route_metrics is None:
+            route_metrics = ROUTE_METRICS[route] = RouteMetrics()
+        route_metrics.duration.observe(total)
+        route_metrics.queries.observe(metrics.queries)
+        route_metrics.sql_time += metrics.sql_time
+        route_metrics.template_time += metrics.template_time
+        route_metrics.slow += slow
+    return slow
+
+
+def log_slow_request(request, route, status_code, metrics, total):
+    lines = ['%.2f ms %s' % (seconds * 1000, sql) for seconds, sql in metrics.statements]
+    if metrics.queries > len(metrics.statements):
+        lines.append('... %d more queries' % (metrics.queries - len(metrics.statements)))
+    slow_log.warning('Slow request %s %s (%s) %d: %s\n%s', request.method, request.path, route, status_code,
+                     metrics.server_timing(total), '\n'.join(lines))
+
+
+def _labels(route, **extra):
+    labels = [('route', route)] + list(extra.items())
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in labels)
+
+
+def _histogram(lines, name, help, histograms):
+    lines.append('# HELP %s %s' % (name, help))
+    lines.append('# TYPE %s histogram' % name)
+    for route, histogram in histograms:
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (name, _labels(route, le=bound), cumulative))
+        lines.append('%s_bucket%s %d' % (name, _labels(route, le='+Inf'), histogram.count))
+        lines.append('%s_sum%s %s' % (name, _labels(route), histogram.sum))
+        lines.append('%s_count%s %d' % (name, _labels(route), histogram.count))
+
+
+def _counter(lines, name, help, values):
+    lines.append('# HELP %s %s' % (name, help))
+    lines.append('# TYPE %s counter' % name)
+    for labels, value in values:
+        lines.append('%s%s %s' % (name, labels, value))
+
+
+def render_metrics():
+    # Metrics of this process in the Prometheus text exposition format
+    with _lock:
+        routes = sorted(ROUTE_METRICS.items())
+        lines = []
+        _histogram(lines, 'pedidos_request_duration_seconds', 'Request duration by route.',
+                   [(route, metrics.duration) for route, metrics in routes])
+        _histogram(lines, 'pedidos_request_queries', 'SQL queries of a request by route.',
+                   [(route, metrics.queries) for route, metrics in routes])
+        _counter(lines, 'pedidos_request_sql_seconds_total', 'Time spent in SQL queries by route.',
+                 [(_labels(route), metrics.sql_time) for route, metrics in routes])
+        _counter(lines, 'pedidos_request_template_seconds_total', 'Time spent rendering templates by route.',
+                 [(_labels(route), metrics.template_time) for route, metrics in routes])
+        _counter(lines, 'pedidos_slow_requests_total', 'Requests slower than the slow request threshold by route.',
+                 [(_labels(route), metrics.slow) for route, metrics in routes])
+    _counter(lines, 'pedidos_cache_hits_total', 'Catalog cache hits.', [('', CACHE_STATS['hits'])])
+    _counter(lines, 'pedidos_cache_misses_total', 'Catalog cache misses.', [('', CACHE_STATS['misses'])])
+    return '\n'.join(lines) + '\n'
+
+
+# Template backend that adds the render time of the templates to the request metrics
+# (settings.TEMPLATES), including the queries run by the template. Included templates are
+# rendered within their parent.
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = request_metrics.get()
+        if metrics is None or metrics.rendering:
+            return super().render(context, request)
+        metrics.rendering += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+            metrics.rendering -= 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,63 @@
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from .metrics import RequestMetrics, log_slow_request, record_request, request_metrics
+from .routers import RoutingState, routing_state
+
+# Cookie of the clients that wrote in the last REPLICA_MAX_LAG seconds (they read from the default database)
+PINNED_COOKIE = 'pedidos_primary'
+
+
+class DatabaseRoutingMiddleware:
+    '''
+    Routing state of every request (see routers.py): views marked with
+    decorators.replica_reads read from a replica, unless the client wrote recently.
+    '''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState(pinned=PINNED_COOKIE in request.COOKIES)
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        # The replicas may not have the writes of this request yet
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(PINNED_COOKIE, '1', max_age=settings.REPLICA_MAX_LAG, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'replica_reads', False) and request.method in ('GET', 'HEAD'):
+            routing_state.get().replica = True
+
+
+class PerformanceMiddleware:
+    '''
+    Metrics of every request (see metrics.py): SQL queries and time of every database,
+    template render time and total time, sent back in the Server-Timing header and added
+    to the metrics of the route. Slow requests are logged with their SQL. Streamed
+    responses are measured until their first byte.
+    '''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = request_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            request_metrics.reset(token)
+        total = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match is not None else 'unmatched'
+        response['Server-Timing'] = metrics.server_timing(total)
+        if record_request(route, metrics, total):
+            log_slow_request(request, route, response.status_code, metrics, total)
+        return response
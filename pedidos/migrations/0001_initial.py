@@ -0,0 +1,108 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:41
+
+from django.conf import settings
+import django.contrib.auth.models
+import django.contrib.auth.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('email', models.EmailField(blank=True, max_length=254, verbose_name='email address')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('is_client', models.BooleanField(default=False)),
+                ('is_supplier', models.BooleanField(default=False)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Item',
+            fields=[
+                ('code', models.IntegerField(primary_key=True, serialize=False)),
+                ('description', models.TextField()),
+                ('price', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('orderNo', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_urgent', models.BooleanField(default=False)),
+                ('distribution_center', models.BooleanField(default=False)),
+                ('branch', models.BooleanField(default=False)),
+                ('associated_company', models.BooleanField(default=False)),
+                ('quantity', models.IntegerField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='pedidos.item')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='client', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('code', models.CharField(max_length=100)),
+                ('photo', models.ImageField(blank=True, null=True, upload_to='')),
+                ('address', models.CharField(max_length=100)),
+                ('client_type', models.CharField(choices=[('1', 'Normal'), ('2', 'Plata'), ('3', 'Oro'), ('4', 'Platino')], default='1', max_length=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ManageOrder',
+            fields=[
+                ('orderNo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='orders', serialize=False, to='pedidos.order')),
+                ('dispatched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('warehouse', models.CharField(max_length=50)),
+                ('reference', models.CharField(max_length=50)),
+                ('branch_code', models.IntegerField(null=True)),
+                ('details', models.CharField(max_length=200)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='supplier', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('address', models.CharField(max_length=100)),
+                ('items_supplied', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='pedidos.client'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='pedidos.supplier'),
+        ),
+    ]
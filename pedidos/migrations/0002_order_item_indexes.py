@@ -0,0 +1,35 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='supplier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='pedidos.supplier'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['supplier', 'code'], name='item_supplier_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['item', 'created_at'], name='order_item_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('distribution_center', True), ('is_urgent', True)), fields=['item', 'created_at'], name='order_urgent_dc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(fields=('client', 'item'), name='order_client_item_uniq'),
+        ),
+    ]
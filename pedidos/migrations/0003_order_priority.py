@@ -0,0 +1,31 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:43
+
+from django.db import migrations, models
+from pedidos.models import PRIORITY_CLIENT_TYPE, priority_expression
+
+
+# Compute the priority of the existing orders, one UPDATE per client type
+def compute_priorities(apps, schema_editor):
+    Order = apps.get_model('pedidos', 'Order')
+    for client_type in PRIORITY_CLIENT_TYPE:
+        Order.objects.filter(client__client_type=client_type).update(priority=priority_expression(client_type))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0002_order_item_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='priority',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-priority', 'created_at'], name='order_priority_idx'),
+        ),
+        migrations.RunPython(compute_priorities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Logged tables: (model name, table, primary key column)
+LOGGED_TABLES = [
+    ('item', 'pedidos_item', 'code'),
+    ('order', 'pedidos_order', 'orderNo'),
+    ('manageorder', 'pedidos_manageorder', 'orderNo_id'),
+]
+ACTIONS = [
+    ('insert', 'INSERT', 'I', 'NEW'),
+    ('update', 'UPDATE', 'U', 'NEW'),
+    ('delete', 'DELETE', 'D', 'OLD'),
+]
+
+
+# SQLite triggers that append an entry to the change log for every row change
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for model, table, pk in LOGGED_TABLES:
+        for name, event, action, row in ACTIONS:
+            schema_editor.execute(
+                'CREATE TRIGGER "%(table)s_changelog_%(name)s" AFTER %(event)s ON "%(table)s" '
+                'BEGIN '
+                'INSERT INTO "pedidos_changelogentry" ("model", "object_pk", "action", "created_at") '
+                "VALUES ('%(model)s', %(row)s.\"%(pk)s\", '%(action)s', strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now')); "
+                'END' % {'table': table, 'name': name, 'event': event, 'model': model, 'row': row, 'pk': pk, 'action': action}
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for model, table, pk in LOGGED_TABLES:
+        for name, event, action, row in ACTIONS:
+            schema_editor.execute('DROP TRIGGER IF EXISTS "%s_changelog_%s"' % (table, name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0003_order_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=20)),
+                ('object_pk', models.BigIntegerField()),
+                ('action', models.CharField(choices=[('I', 'Insert'), ('U', 'Update'), ('D', 'Delete')], max_length=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
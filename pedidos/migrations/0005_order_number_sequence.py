@@ -0,0 +1,30 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:53
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+# The order sequence continues after the highest existing order number
+def create_order_sequence(apps, schema_editor):
+    Order = apps.get_model('pedidos', 'Order')
+    Sequence = apps.get_model('pedidos', 'Sequence')
+    last_number = Order.objects.aggregate(number=Max('orderNo'))['number'] or 0
+    Sequence.objects.create(name='order', next_value=last_number + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0004_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_order_sequence, migrations.RunPython.noop),
+    ]
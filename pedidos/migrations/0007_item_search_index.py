@@ -0,0 +1,57 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:05
+
+from django.db import migrations
+
+# FTS5 index of the item descriptions. External content table: the text stays in
+# pedidos_item (rowid = item code), the index only stores the terms and prefixes of
+# 2 and 3 characters. Accents are ignored (articulo matches artículo).
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE \"pedidos_item_fts\" USING fts5(description, content='pedidos_item', "
+    "content_rowid='code', tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+# Triggers that keep the index in sync with the items (price changes do not touch it)
+INDEX_ROW = 'INSERT INTO "pedidos_item_fts" ("rowid", "description") VALUES (NEW."code", NEW."description");'
+UNINDEX_ROW = ('INSERT INTO "pedidos_item_fts" ("pedidos_item_fts", "rowid", "description") '
+               "VALUES ('delete', OLD.\"code\", OLD.\"description\");")
+TRIGGERS = [
+    ('insert', 'AFTER INSERT', INDEX_ROW),
+    ('delete', 'AFTER DELETE', UNINDEX_ROW),
+    ('update', 'AFTER UPDATE OF "code", "description"', UNINDEX_ROW + ' ' + INDEX_ROW),
+]
+
+
+def fts5_available(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return 'ENABLE_FTS5' in {row[0] for row in cursor.fetchall()}
+
+
+# Without FTS5 (other databases or SQLite builds) search falls back to a scan (see pedidos/search.py)
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite' or not fts5_available(schema_editor.connection):
+        return
+    schema_editor.execute(CREATE_INDEX)
+    for name, event, action in TRIGGERS:
+        schema_editor.execute('CREATE TRIGGER "pedidos_item_fts_%s" %s ON "pedidos_item" BEGIN %s END'
+                              % (name, event, action))
+    # Index the existing items
+    schema_editor.execute('INSERT INTO "pedidos_item_fts" ("pedidos_item_fts") VALUES (\'rebuild\')')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, event, action in TRIGGERS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_item_fts_%s"' % name)
+    schema_editor.execute('DROP TABLE IF EXISTS "pedidos_item_fts"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0006_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
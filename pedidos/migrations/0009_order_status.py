@@ -0,0 +1,86 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:32
+
+from importlib import import_module
+from django.db import migrations, models
+import django.utils.timezone
+
+change_log = import_module('pedidos.migrations.0004_change_log')
+
+
+# SQLite adds the status column by rebuilding pedidos_order, which drops its change log
+# triggers (see 0004_change_log): they are created again
+def restore_order_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, event, action, row in change_log.ACTIONS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_order_changelog_%s"' % name)
+        schema_editor.execute(
+            'CREATE TRIGGER "pedidos_order_changelog_%(name)s" AFTER %(event)s ON "pedidos_order" '
+            'BEGIN '
+            'INSERT INTO "pedidos_changelogentry" ("model", "object_pk", "action", "created_at") '
+            "VALUES ('order', %(row)s.\"orderNo\", '%(action)s', strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now')); "
+            'END' % {'name': name, 'event': event, 'row': row, 'action': action}
+        )
+
+
+# Status of the existing orders: orders with a dispatch are managed while the job that
+# processes the dispatch has not finished (see pedidos/dispatch.py), dispatched after it
+# (or when the dispatch predates the job queue). Their history starts with the placement
+# and the changes are dated when the dispatch was saved.
+def set_order_status(apps, schema_editor):
+    Order = apps.get_model('pedidos', 'Order')
+    ManageOrder = apps.get_model('pedidos', 'ManageOrder')
+    Job = apps.get_model('pedidos', 'Job')
+    database = schema_editor.connection.alias
+    processing = {payload.get('order') for payload in Job.objects.using(database).filter(
+        task='process-dispatch').exclude(status='D').values_list('payload', flat=True)}
+    dispatched = ManageOrder.objects.using(database).values('orderNo')
+    Order.objects.using(database).filter(orderNo__in=dispatched).update(status='D')
+    Order.objects.using(database).filter(orderNo__in=processing).update(status='M')
+    schema_editor.execute(
+        'INSERT INTO "pedidos_orderevent" ("order_no", "from_status", "to_status", "created_at") '
+        'SELECT "orderNo", NULL, \'P\', "created_at" FROM "pedidos_order"')
+    schema_editor.execute(
+        'INSERT INTO "pedidos_orderevent" ("order_no", "from_status", "to_status", "created_at") '
+        'SELECT "orderNo_id", \'P\', \'M\', "dispatched_at" FROM "pedidos_manageorder"')
+    schema_editor.execute(
+        'INSERT INTO "pedidos_orderevent" ("order_no", "from_status", "to_status", "created_at") '
+        'SELECT "pedidos_manageorder"."orderNo_id", \'M\', \'D\', "pedidos_manageorder"."dispatched_at" '
+        'FROM "pedidos_manageorder" INNER JOIN "pedidos_order" '
+        'ON "pedidos_order"."orderNo" = "pedidos_manageorder"."orderNo_id" '
+        'WHERE "pedidos_order"."status" = \'D\'')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_no', models.IntegerField(db_index=True)),
+                ('from_status', models.CharField(choices=[('P', 'Placed'), ('M', 'Managed'), ('D', 'Dispatched'), ('C', 'Cancelled')], max_length=1, null=True)),
+                ('to_status', models.CharField(choices=[('P', 'Placed'), ('M', 'Managed'), ('D', 'Dispatched'), ('C', 'Cancelled')], max_length=1)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_priority_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('P', 'Placed'), ('M', 'Managed'), ('D', 'Dispatched'), ('C', 'Cancelled')], default='P', editable=False, max_length=1),
+        ),
+        migrations.RunPython(restore_order_triggers, restore_order_triggers),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'P')), fields=['-priority', 'created_at'], name='order_placed_priority_idx'),
+        ),
+        migrations.RunPython(set_order_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Order counters of the items and suppliers (see pedidos/counters.py), kept up to date by
+# SQLite triggers on pedidos_order and pedidos_item
+COUNTERS = ('orders', 'quantity', 'revenue', 'urgent_orders', 'pending_orders')
+# Counted tables: (table, key column, key of the item row)
+COUNTER_TABLES = [
+    ('pedidos_itemstats', 'item_id', '"pedidos_item"."code"'),
+    ('pedidos_supplierstats', 'supplier_id', '"pedidos_item"."supplier_id"'),
+]
+
+
+def counter_values(row, sign=''):
+    # Counters of an order row (cancelled orders count for nothing), with the price of its item
+    active = '(%s."status" <> \'C\')' % row
+    return [
+        '%s%s' % (sign, active),
+        '%s%s * %s."quantity"' % (sign, active, row),
+        '%s%s * %s."quantity" * "pedidos_item"."price"' % (sign, active, row),
+        '%s%s * %s."is_urgent"' % (sign, active, row),
+        '%s(%s."status" = \'P\')' % (sign, row),
+    ]
+
+
+def add_counters(row, sign=''):
+    # Add (or subtract, sign '-') the counters of an order row to its item and supplier
+    statements = []
+    for table, key, item_key in COUNTER_TABLES:
+        statements.append(
+            'INSERT INTO "%s" ("%s", %s) SELECT %s, %s FROM "pedidos_item" WHERE "pedidos_item"."code" = %s."item_id" '
+            'ON CONFLICT ("%s") DO UPDATE SET %s;' % (
+                table, key, ', '.join('"%s"' % name for name in COUNTERS), item_key,
+                ', '.join(counter_values(row, sign)), row, key,
+                ', '.join('"%s" = "%s" + excluded."%s"' % (name, name, name) for name in COUNTERS)))
+    return ' '.join(statements)
+
+
+TRIGGERS = [
+    ('pedidos_order', 'insert', 'AFTER INSERT', add_counters('NEW')),
+    ('pedidos_order', 'delete', 'AFTER DELETE', add_counters('OLD', '-')),
+    ('pedidos_order', 'update', 'AFTER UPDATE OF "item_id", "quantity", "is_urgent", "status"',
+     add_counters('OLD', '-') + ' ' + add_counters('NEW')),
+    # Revenue follows the price of the item (the supplier of an item does not change)
+    ('pedidos_item', 'price', 'AFTER UPDATE OF "price"',
+     'UPDATE "pedidos_supplierstats" SET "revenue" = "revenue" + (NEW."price" - OLD."price") * '
+     '(SELECT "quantity" FROM "pedidos_itemstats" WHERE "item_id" = NEW."code") '
+     'WHERE "supplier_id" = NEW."supplier_id" AND EXISTS (SELECT 1 FROM "pedidos_itemstats" WHERE "item_id" = NEW."code"); '
+     'UPDATE "pedidos_itemstats" SET "revenue" = "revenue" + (NEW."price" - OLD."price") * "quantity" '
+     'WHERE "item_id" = NEW."code";'),
+    # Items are deleted after their orders
+    ('pedidos_item', 'delete', 'AFTER DELETE', 'DELETE FROM "pedidos_itemstats" WHERE "item_id" = OLD."code";'),
+]
+
+
+def create_counter_triggers(schema_editor, table=None):
+    # Triggers of every table, or of ``table`` only (e.g. after SQLite rebuilt it)
+    for trigger_table, name, event, action in TRIGGERS:
+        if table in (None, trigger_table):
+            schema_editor.execute('DROP TRIGGER IF EXISTS "%s_counters_%s"' % (trigger_table, name))
+            schema_editor.execute('CREATE TRIGGER "%s_counters_%s" %s ON "%s" BEGIN %s END'
+                                  % (trigger_table, name, event, trigger_table, action))
+
+
+# Other databases have no triggers: the counters are computed by the repair_counters command
+def create_counters(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    create_counter_triggers(schema_editor)
+    # Counters of the existing orders
+    for table, key, item_key in COUNTER_TABLES:
+        schema_editor.execute(
+            'INSERT INTO "%s" ("%s", %s) SELECT %s, %s FROM "pedidos_order" INNER JOIN "pedidos_item" '
+            'ON "pedidos_item"."code" = "pedidos_order"."item_id" GROUP BY %s' % (
+                table, key, ', '.join('"%s"' % name for name in COUNTERS), item_key,
+                ', '.join('SUM(%s)' % value for value in counter_values('"pedidos_order"')), item_key))
+
+
+def drop_counters(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, name, event, action in TRIGGERS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS "%s_counters_%s"' % (table, name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0009_order_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemStats',
+            fields=[
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('urgent_orders', models.IntegerField(default=0)),
+                ('pending_orders', models.IntegerField(default=0)),
+                ('item', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='pedidos.item')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SupplierStats',
+            fields=[
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('urgent_orders', models.IntegerField(default=0)),
+                ('pending_orders', models.IntegerField(default=0)),
+                ('supplier', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='stats', serialize=False, to='pedidos.supplier')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(create_counters, drop_counters),
+    ]
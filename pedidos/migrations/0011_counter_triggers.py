@@ -0,0 +1,74 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:05
+
+from django.db import migrations
+
+# Order counters triggers of migration 0010 created again: removed orders are only subtracted
+# from existing counters, so orders deleted after their counters (e.g. when the tables are
+# flushed) do not leave negative counters behind
+COUNTERS = ('orders', 'quantity', 'revenue', 'urgent_orders', 'pending_orders')
+# Counted tables: (table, key column, key of the item row)
+COUNTER_TABLES = [
+    ('pedidos_itemstats', 'item_id', '"pedidos_item"."code"'),
+    ('pedidos_supplierstats', 'supplier_id', '"pedidos_item"."supplier_id"'),
+]
+
+
+def counter_values(row, sign=''):
+    # Counters of an order row (cancelled orders count for nothing), with the price of its item
+    active = '(%s."status" <> \'C\')' % row
+    return [
+        '%s%s' % (sign, active),
+        '%s%s * %s."quantity"' % (sign, active, row),
+        '%s%s * %s."quantity" * "pedidos_item"."price"' % (sign, active, row),
+        '%s%s * %s."is_urgent"' % (sign, active, row),
+        '%s(%s."status" = \'P\')' % (sign, row),
+    ]
+
+
+def add_counters(row):
+    # Add the counters of an order row to its item and supplier
+    return ' '.join(
+        'INSERT INTO "%s" ("%s", %s) SELECT %s, %s FROM "pedidos_item" WHERE "pedidos_item"."code" = %s."item_id" '
+        'ON CONFLICT ("%s") DO UPDATE SET %s;' % (
+            table, key, ', '.join('"%s"' % name for name in COUNTERS), item_key,
+            ', '.join(counter_values(row)), row, key,
+            ', '.join('"%s" = "%s" + excluded."%s"' % (name, name, name) for name in COUNTERS))
+        for table, key, item_key in COUNTER_TABLES)
+
+
+def subtract_counters(row):
+    # Subtract the counters of an order row from the existing counters of its item and supplier
+    return ' '.join(
+        'UPDATE "%s" SET %s FROM "pedidos_item" WHERE "pedidos_item"."code" = %s."item_id" AND "%s"."%s" = %s;' % (
+            table, ', '.join('"%s" = "%s"."%s" - %s' % (name, table, name, value)
+                             for name, value in zip(COUNTERS, counter_values(row))),
+            row, table, key, item_key)
+        for table, key, item_key in COUNTER_TABLES)
+
+
+TRIGGERS = [
+    ('insert', 'AFTER INSERT', add_counters('NEW')),
+    ('delete', 'AFTER DELETE', subtract_counters('OLD')),
+    ('update', 'AFTER UPDATE OF "item_id", "quantity", "is_urgent", "status"',
+     subtract_counters('OLD') + ' ' + add_counters('NEW')),
+]
+
+
+def create_counter_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, event, action in TRIGGERS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_order_counters_%s"' % name)
+        schema_editor.execute('CREATE TRIGGER "pedidos_order_counters_%s" %s ON "pedidos_order" BEGIN %s END'
+                              % (name, event, action))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0010_order_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_counter_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,179 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:51
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Order counters (see migration 0010) with the revenue of the order price: item price changes
+# no longer change the counters (the price trigger of 0010 is dropped), the item counters are
+# still deleted with the item. Removed orders are only subtracted from existing counters (see 0011)
+COUNTERS = ('orders', 'quantity', 'revenue', 'urgent_orders', 'pending_orders')
+# Counted tables: (table, key column, key of the item row)
+COUNTER_TABLES = [
+    ('pedidos_itemstats', 'item_id', '"pedidos_item"."code"'),
+    ('pedidos_supplierstats', 'supplier_id', '"pedidos_item"."supplier_id"'),
+]
+
+
+def counter_values(row, price):
+    # Counters of an order row (cancelled orders count for nothing) at ``price``
+    active = '(%s."status" <> \'C\')' % row
+    return [
+        '%s' % active,
+        '%s * %s."quantity"' % (active, row),
+        '%s * %s."quantity" * %s' % (active, row, price),
+        '%s * %s."is_urgent"' % (active, row),
+        '(%s."status" = \'P\')' % row,
+    ]
+
+
+def add_counters(row, price):
+    # Add the counters of an order row to its item and supplier
+    return ' '.join(
+        'INSERT INTO "%s" ("%s", %s) SELECT %s, %s FROM "pedidos_item" WHERE "pedidos_item"."code" = %s."item_id" '
+        'ON CONFLICT ("%s") DO UPDATE SET %s;' % (
+            table, key, ', '.join('"%s"' % name for name in COUNTERS), item_key,
+            ', '.join(counter_values(row, price)), row, key,
+            ', '.join('"%s" = "%s" + excluded."%s"' % (name, name, name) for name in COUNTERS))
+        for table, key, item_key in COUNTER_TABLES)
+
+
+def subtract_counters(row, price):
+    # Subtract the counters of an order row from the existing counters of its item and supplier
+    return ' '.join(
+        'UPDATE "%s" SET %s FROM "pedidos_item" WHERE "pedidos_item"."code" = %s."item_id" AND "%s"."%s" = %s;' % (
+            table, ', '.join('"%s" = "%s"."%s" - %s' % (name, table, name, value)
+                             for name, value in zip(COUNTERS, counter_values(row, price))),
+            row, table, key, item_key)
+        for table, key, item_key in COUNTER_TABLES)
+
+
+ITEM_DELETE_TRIGGER = ('pedidos_item', 'delete', 'AFTER DELETE', 'DELETE FROM "pedidos_itemstats" WHERE "item_id" = OLD."code";')
+TRIGGERS = [
+    ('pedidos_order', 'insert', 'AFTER INSERT', add_counters('NEW', 'NEW."unit_price"')),
+    ('pedidos_order', 'delete', 'AFTER DELETE', subtract_counters('OLD', 'OLD."unit_price"')),
+    ('pedidos_order', 'update', 'AFTER UPDATE OF "item_id", "quantity", "unit_price", "is_urgent", "status"',
+     subtract_counters('OLD', 'OLD."unit_price"') + ' ' + add_counters('NEW', 'NEW."unit_price"')),
+    ITEM_DELETE_TRIGGER,
+]
+# Counters triggers before this migration (0010 and 0011), with the price of the item
+ITEM_PRICE = '"pedidos_item"."price"'
+PREVIOUS_TRIGGERS = [
+    ('pedidos_order', 'insert', 'AFTER INSERT', add_counters('NEW', ITEM_PRICE)),
+    ('pedidos_order', 'delete', 'AFTER DELETE', subtract_counters('OLD', ITEM_PRICE)),
+    ('pedidos_order', 'update', 'AFTER UPDATE OF "item_id", "quantity", "is_urgent", "status"',
+     subtract_counters('OLD', ITEM_PRICE) + ' ' + add_counters('NEW', ITEM_PRICE)),
+    ('pedidos_item', 'price', 'AFTER UPDATE OF "price"',
+     'UPDATE "pedidos_supplierstats" SET "revenue" = "revenue" + (NEW."price" - OLD."price") * '
+     '(SELECT "quantity" FROM "pedidos_itemstats" WHERE "item_id" = NEW."code") '
+     'WHERE "supplier_id" = NEW."supplier_id" AND EXISTS (SELECT 1 FROM "pedidos_itemstats" WHERE "item_id" = NEW."code"); '
+     'UPDATE "pedidos_itemstats" SET "revenue" = "revenue" + (NEW."price" - OLD."price") * "quantity" '
+     'WHERE "item_id" = NEW."code";'),
+    ITEM_DELETE_TRIGGER,
+]
+# Change log triggers of pedidos_order (see migrations 0004 and 0009)
+CHANGE_LOG_ACTIONS = [
+    ('insert', 'INSERT', 'I', 'NEW'),
+    ('update', 'UPDATE', 'U', 'NEW'),
+    ('delete', 'DELETE', 'D', 'OLD'),
+]
+# Price history of the items (see models.ItemPriceChange)
+PRICE_HISTORY_TRIGGER = (
+    'CREATE TRIGGER "pedidos_item_price_history" AFTER UPDATE OF "price" ON "pedidos_item" '
+    'WHEN OLD."price" IS NOT NEW."price" '
+    'BEGIN '
+    'INSERT INTO "pedidos_itempricechange" ("item_code", "old_price", "new_price", "changed_at") '
+    "VALUES (NEW.\"code\", OLD.\"price\", NEW.\"price\", strftime('%Y-%m-%d %H:%M:%f', 'now')); "
+    'END'
+)
+
+
+def create_counter_triggers(schema_editor, table=None, triggers=TRIGGERS):
+    # Triggers of every table, or of ``table`` only (e.g. after SQLite rebuilt it)
+    for trigger_table, name, event, action in triggers:
+        if table in (None, trigger_table):
+            schema_editor.execute('DROP TRIGGER IF EXISTS "%s_counters_%s"' % (trigger_table, name))
+            schema_editor.execute('CREATE TRIGGER "%s_counters_%s" %s ON "%s" BEGIN %s END'
+                                  % (trigger_table, name, event, trigger_table, action))
+
+
+# Existing orders were placed at the current price of their item: the counters do not change
+def set_unit_price(apps, schema_editor):
+    Order = apps.get_model('pedidos', 'Order')
+    Item = apps.get_model('pedidos', 'Item')
+    database = schema_editor.connection.alias
+    Order.objects.using(database).update(
+        unit_price=models.Subquery(Item.objects.using(database).filter(code=models.OuterRef('item_id')).values('price')[:1]))
+
+
+# SQLite rebuilds pedidos_order to add or remove a column, which drops its change log triggers
+def restore_order_triggers(schema_editor):
+    for name, event, action, row in CHANGE_LOG_ACTIONS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_order_changelog_%s"' % name)
+        schema_editor.execute(
+            'CREATE TRIGGER "pedidos_order_changelog_%(name)s" AFTER %(event)s ON "pedidos_order" '
+            'BEGIN '
+            'INSERT INTO "pedidos_changelogentry" ("model", "object_pk", "action", "created_at") '
+            "VALUES ('order', %(row)s.\"orderNo\", '%(action)s', strftime('%%Y-%%m-%%d %%H:%%M:%%f', 'now')); "
+            'END' % {'name': name, 'event': event, 'row': row, 'action': action}
+        )
+
+
+# SQLite adds the unit price column by rebuilding pedidos_order, which drops its change log
+# and counters triggers: they are created again (the counters ones with the order price)
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    restore_order_triggers(schema_editor)
+    schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_item_counters_price"')
+    create_counter_triggers(schema_editor)
+    schema_editor.execute(PRICE_HISTORY_TRIGGER)
+
+
+# The triggers that use the unit price column go before it
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_item_price_history"')
+    for table, name, event, action in TRIGGERS:
+        schema_editor.execute('DROP TRIGGER IF EXISTS "%s_counters_%s"' % (table, name))
+
+
+# Reverse of the migration: the triggers of 0009 and 0010 once pedidos_order has no unit
+# price (run repair_counters if item prices changed meanwhile)
+def restore_previous_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    restore_order_triggers(schema_editor)
+    create_counter_triggers(schema_editor, triggers=PREVIOUS_TRIGGERS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0011_counter_triggers'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_previous_triggers),
+        migrations.AddField(
+            model_name='order',
+            name='unit_price',
+            field=models.FloatField(default=0.0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='ItemPriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_code', models.IntegerField()),
+                ('old_price', models.FloatField()),
+                ('new_price', models.FloatField()),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_code', 'changed_at'], name='price_change_item_idx')],
+            },
+        ),
+        migrations.RunPython(set_unit_price, migrations.RunPython.noop),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
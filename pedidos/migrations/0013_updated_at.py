@@ -0,0 +1,59 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:20
+
+from importlib import import_module
+from django.db import migrations, models
+import django.utils.timezone
+
+change_log = import_module('pedidos.migrations.0004_change_log')
+search_index = import_module('pedidos.migrations.0007_item_search_index')
+order_unit_price = import_module('pedidos.migrations.0012_order_unit_price')
+
+
+# SQLite adds the updated_at columns by rebuilding pedidos_item, pedidos_order and
+# pedidos_manageorder, which drops their triggers: change log (0004), search index (0007),
+# counters and price history (0012). They are created again. The counters triggers of
+# pedidos_order read pedidos_item, they are dropped before it is rebuilt (also when the
+# migration is reversed: removing the indexed column rebuilds pedidos_item).
+def restore_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    change_log.drop_triggers(apps, schema_editor)
+    change_log.create_triggers(apps, schema_editor)
+    if search_index.fts5_available(schema_editor.connection):
+        for name, event, action in search_index.TRIGGERS:
+            schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_item_fts_%s"' % name)
+            schema_editor.execute('CREATE TRIGGER "pedidos_item_fts_%s" %s ON "pedidos_item" BEGIN %s END'
+                                  % (name, event, action))
+    order_unit_price.create_counter_triggers(schema_editor)
+    schema_editor.execute('DROP TRIGGER IF EXISTS "pedidos_item_price_history"')
+    schema_editor.execute(order_unit_price.PRICE_HISTORY_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0012_order_unit_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(order_unit_price.drop_triggers, restore_triggers),
+        migrations.AddField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='manageorder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_triggers, order_unit_price.drop_triggers),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import Case, ExpressionWrapper, Value, When
+
+# Dispatch priority of an order when this migration was written (see models.dispatch_priority),
+# kept here so the migration does not change with the model code (0003 computed it with
+# the code of pedidos.models)
+PRIORITY_CRITICAL = 1000
+PRIORITY_URGENT = 100
+PRIORITY_DISTRIBUTION_CENTER = 10
+# Client types: NORMAL, PLATA, ORO and PLATINO
+PRIORITY_CLIENT_TYPE = {'1': 0, '2': 1, '3': 2, '4': 3}
+PLATINO = '4'
+
+
+def priority_expression(client_type):
+    expression = (
+        Value(PRIORITY_CLIENT_TYPE[client_type])
+        + Case(When(is_urgent=True, then=Value(PRIORITY_URGENT)), default=Value(0))
+        + Case(When(distribution_center=True, then=Value(PRIORITY_DISTRIBUTION_CENTER)), default=Value(0))
+    )
+    if client_type == PLATINO:
+        expression += Case(When(is_urgent=True, distribution_center=True, then=Value(PRIORITY_CRITICAL)), default=Value(0))
+    return ExpressionWrapper(expression, output_field=models.IntegerField())
+
+
+# Compute the priority of the existing orders again, one UPDATE per client type
+def compute_priorities(apps, schema_editor):
+    Order = apps.get_model('pedidos', 'Order')
+    for client_type in PRIORITY_CLIENT_TYPE:
+        Order.objects.filter(client__client_type=client_type).update(priority=priority_expression(client_type))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(compute_priorities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.3 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0014_recompute_order_priority'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_placed_priority_idx',
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'P')), fields=['item', '-priority', 'created_at'], name='order_item_placed_priority_idx'),
+        ),
+    ]
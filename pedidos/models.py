@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, Value, When
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from .routers import across_databases
 
 # Define user roles (client, supplier) inheriting from the generic Django User model
 class User(AbstractUser):
@@ -30,6 +33,17 @@ class Client(models.Model):
         default=NORMAL,
     )
 
+    # The dispatch priority of the client orders depends on the client type,
+    # recompute it (in a single UPDATE) when the type changes
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous_type = Client.objects.filter(pk=self.pk).values_list('client_type', flat=True).first()
+            super().save(*args, **kwargs)
+            if previous_type is not None and previous_type != self.client_type:
+                # (in every database, see routers.py)
+                for orders in across_databases(Order.objects.filter(client_id=self.pk)):
+                    orders.update(priority=priority_expression(self.client_type), updated_at=timezone.now())
+
 class Supplier(models.Model):
     # user field defined as a primary key of Supplier model as an extension of the generic User model
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='supplier')
@@ -45,11 +59,84 @@ class Item(models.Model):
     price = models.FloatField()
     # supplier field define a many-to-one relationship
     # This means that a supplier can be associated with many Item objects
-    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='items')
+    # (indexed together with code, see Meta.indexes)
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='items', db_index=False)
+    # Last change of the item, validator of the pages that show it (see conditional.py)
+    # Set-based writes (QuerySet.update(), upserts) set it themselves. Indexed for the
+    # last change of the whole catalog.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Supplier dashboard lists the supplier items ordered by code
+            models.Index(fields=['supplier', 'code'], name='item_supplier_code_idx'),
+        ]
+
+# Append-only history of the item prices, recorded by a database trigger on every price
+# change (see migration 0012): orders keep the price of their placement (Order.unit_price)
+# Changes keep the item code, not a foreign key, so the history outlives deleted items
+class ItemPriceChange(models.Model):
+    item_code = models.IntegerField()
+    old_price = models.FloatField()
+    new_price = models.FloatField()
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item_code', 'changed_at'], name='price_change_item_idx'),
+        ]
+
+# Dispatch priority of an order: the higher the score, the sooner the supplier should attend it
+# An urgent order to a distribution center made by a PLATINO client is always on top
+PRIORITY_CRITICAL = 1000
+PRIORITY_URGENT = 100
+PRIORITY_DISTRIBUTION_CENTER = 10
+PRIORITY_CLIENT_TYPE = {
+    Client.NORMAL: 0,
+    Client.PLATA: 1,
+    Client.ORO: 2,
+    Client.PLATINO: 3,
+}
+
+def dispatch_priority(is_urgent, distribution_center, client_type):
+    priority = PRIORITY_CLIENT_TYPE.get(client_type, 0)
+    if is_urgent:
+        priority += PRIORITY_URGENT
+    if distribution_center:
+        priority += PRIORITY_DISTRIBUTION_CENTER
+    if is_urgent and distribution_center and client_type == Client.PLATINO:
+        priority += PRIORITY_CRITICAL
+    return priority
+
+# Same score as dispatch_priority() as a database expression, for set-based updates
+# of the orders of clients of the given type
+def priority_expression(client_type):
+    expression = (
+        Value(PRIORITY_CLIENT_TYPE.get(client_type, 0))
+        + Case(When(is_urgent=True, then=Value(PRIORITY_URGENT)), default=Value(0))
+        + Case(When(distribution_center=True, then=Value(PRIORITY_DISTRIBUTION_CENTER)), default=Value(0))
+    )
+    if client_type == Client.PLATINO:
+        expression += Case(When(is_urgent=True, distribution_center=True, then=Value(PRIORITY_CRITICAL)), default=Value(0))
+    return ExpressionWrapper(expression, output_field=models.IntegerField())
 
 # Model for orders
 class Order(models.Model):
-    # orderNo field is the primary key
+    # Lifecycle of an order (see lifecycle.TRANSITIONS): placed by the client, managed by the
+    # supplier (a dispatch was saved), dispatched (the dispatch was processed, see dispatch.py)
+    # or cancelled by the client before the supplier managed it
+    PLACED = 'P'
+    MANAGED = 'M'
+    DISPATCHED = 'D'
+    CANCELLED = 'C'
+    STATUS_CHOICES = [
+        (PLACED, "Placed"),
+        (MANAGED, "Managed"),
+        (DISPATCHED, "Dispatched"),
+        (CANCELLED, "Cancelled"),
+    ]
+    # orderNo field is the primary key, numbered by the order number sequence when
+    # the order is saved without one (see sequences.order_numbers)
     orderNo = models.IntegerField(primary_key=True)
     # client field define a many-to-one relationship
     # This means that a client can be associated with many Order objects
@@ -63,6 +150,73 @@ class Order(models.Model):
     # This means that an item can be associated with many Order objects
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='orders')
     quantity = models.IntegerField()
+    # Price of the item when the order was placed (set when the order is saved), later item
+    # price changes do not change it
+    unit_price = models.FloatField(editable=False)
+    # Dispatch priority computed from the order and client fields when the order is saved
+    # (see dispatch_priority)
+    priority = models.IntegerField(default=0, editable=False)
+    # Changed by lifecycle.transition() only
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PLACED, editable=False)
+    # Last change of the order (see Item.updated_at)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # A client can only have one order per item (also serves the item/client lookups)
+            models.UniqueConstraint(fields=['client', 'item'], name='order_client_item_uniq'),
+        ]
+        indexes = [
+            # Supplier item detail lists the orders of an item by creation date
+            models.Index(fields=['item', 'created_at'], name='order_item_created_idx'),
+            # Urgent orders to a distribution center (the ones supplier must attend first)
+            models.Index(fields=['item', 'created_at'], name='order_urgent_dc_idx',
+                         condition=models.Q(is_urgent=True, distribution_center=True)),
+            # Supplier dispatch queue: pending orders of the supplier items, highest priority
+            # and oldest orders first (led by the item, the queue only reads the supplier orders)
+            models.Index(fields=['item', '-priority', 'created_at'], name='order_item_placed_priority_idx',
+                         condition=models.Q(status='P')),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.orderNo is None:
+            # New orders are numbered by the order number sequence (a fresh number is never
+            # an existing row, insert it without trying an UPDATE first)
+            from .sequences import order_numbers
+            self.orderNo = order_numbers.allocate()[0]
+            kwargs['force_insert'] = True
+        self.priority = dispatch_priority(self.is_urgent, self.distribution_center, self.client.client_type)
+        if self.unit_price is None:
+            self.unit_price = self.item.price
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # The status is changed by lifecycle.transition() only, an edit does not write back
+            # the status it read
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.name != 'status']
+            kwargs['update_fields'] = update_fields
+        if update_fields is not None:
+            kwargs['update_fields'] = list(update_fields) + [
+                name for name in ('priority', 'updated_at') if name not in update_fields]
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # First event of the order history (in the database of the order)
+            OrderEvent.objects.using(self._state.db).create(order_no=self.orderNo, to_status=self.status)
+
+    # Urgent order to a distribution center made by a PLATINO client
+    @property
+    def is_critical(self):
+        return self.priority >= PRIORITY_CRITICAL
+
+# Append-only history of the order status changes (see lifecycle.transition)
+# Events keep the order number, not a foreign key, so the history outlives deleted orders
+class OrderEvent(models.Model):
+    order_no = models.IntegerField(db_index=True)
+    # None for the placement of the order
+    from_status = models.CharField(max_length=1, choices=Order.STATUS_CHOICES, null=True)
+    to_status = models.CharField(max_length=1, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
 
 # Managing order by supplier
 class ManageOrder(models.Model):
@@ -74,7 +228,114 @@ class ManageOrder(models.Model):
     reference = models.CharField(max_length=50)
     branch_code = models.IntegerField(null=True)
     details = models.CharField(max_length=200)
+    # Last change of the dispatch (see Item.updated_at)
+    updated_at = models.DateTimeField(auto_now=True)
     
 
 
 
+
+# Append-only log of the changes of Item, Order and ManageOrder rows, read by the change feed
+# Entries are written by database triggers (see migration 0004), so every insert, update
+# and delete is logged in the same transaction, including bulk operations and cascades
+class ChangeLogEntry(models.Model):
+    INSERT = 'I'
+    UPDATE = 'U'
+    DELETE = 'D'
+    ACTION_CHOICES = [
+        (INSERT, "Insert"),
+        (UPDATE, "Update"),
+        (DELETE, "Delete"),
+    ]
+    # Monotonic sequence number, used as cursor by the change feed
+    seq = models.BigAutoField(primary_key=True)
+    # Model name ('item', 'order' or 'manageorder') and primary key of the changed row
+    model = models.CharField(max_length=20)
+    object_pk = models.BigIntegerField()
+    action = models.CharField(max_length=1, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+# Counters of the orders of an item or a supplier for the supplier dashboard, kept up to date
+# by database triggers (see migrations 0010 and 0012, counters.py) in the transaction of every order
+# change. Cancelled orders are not counted, revenue is the unit price times the quantity.
+class OrderCounters(models.Model):
+    orders = models.IntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    urgent_orders = models.IntegerField(default=0)
+    # Placed orders, not managed yet
+    pending_orders = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+# Counters of the orders of an item (in the database of the item), without a foreign key
+# constraint: the row is deleted by trigger after the orders of a deleted item
+class ItemStats(OrderCounters):
+    item = models.OneToOneField(Item, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True,
+                                related_name='stats')
+
+# Counters of the orders of all the items of a supplier (in the database of its items)
+class SupplierStats(OrderCounters):
+    supplier = models.OneToOneField(Supplier, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True,
+                                    related_name='stats')
+
+
+# Named counters of the database (see sequences.SequenceAllocator)
+# The 'order' sequence numbers new orders
+class Sequence(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    # Next number the sequence hands out
+    next_value = models.BigIntegerField(default=1)
+
+
+# Idempotency key of an order creation request (see idempotency.run_once)
+# A retry with the same key returns the stored result instead of placing the order again
+class IdempotencyKey(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    # Result of the original request, returned to the retries
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Expired keys are ignored and deleted by the purge_idempotency_keys command
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'key'], name='idempotency_client_key_uniq'),
+        ]
+
+
+# Background job, run by the run_jobs command (see jobs.py)
+class Job(models.Model):
+    PENDING = 'P'
+    RUNNING = 'R'
+    DONE = 'D'
+    FAILED = 'F'
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+    # Name of the task (see jobs.task) and its keyword arguments
+    task = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField()
+    # Pending jobs do not run before this time (retries wait for their backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Worker running (or that last ran) the job and error of the last failed attempt
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers take the pending jobs that are due, oldest first
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
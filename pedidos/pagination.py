@@ -0,0 +1,109 @@
+from rest_framework import pagination as drf_pagination
+
+
+class KeysetPage:
+    '''
+    One page of a keyset (seek) paginated queryset.
+    The cursors are the key values of the first and last rows of the page,
+    so moving to another page never needs OFFSET or COUNT(*).
+    '''
+    def __init__(self, object_list, key, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = getattr(object_list[-1], key) if has_next and object_list else None
+        self.previous_cursor = getattr(object_list[0], key) if has_previous and object_list else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def parse_cursor(value):
+    # Cursors come from the query string, anything that is not an integer is ignored
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _first_rows(querysets, key, count, descending=False):
+    # First ``count`` rows of the querysets (one per database, see routers.across_databases)
+    # in ``key`` order: every database returns its first rows and they are merged
+    order = '-' + key if descending else key
+    rows = []
+    for queryset in querysets:
+        rows.extend(queryset.order_by(order)[:count])
+    if len(querysets) > 1:
+        rows.sort(key=lambda row: getattr(row, key), reverse=descending)
+    return rows[:count]
+
+
+def keyset_paginate(queryset, key, after=None, before=None, per_page=50):
+    '''
+    Return the page of ``queryset`` that follows ``after`` (or precedes ``before``)
+    when ordered by the unique column ``key``.
+    One extra row is fetched to know if there is another page in that direction.
+    ``queryset`` may also be a list of querysets of several databases, their rows are
+    paginated together.
+    '''
+    querysets = queryset if isinstance(queryset, list) else [queryset]
+    if before is not None:
+        rows = _first_rows([queryset.filter(**{key + '__lt': before}) for queryset in querysets],
+                           key, per_page + 1, descending=True)
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        # An empty page has no row to continue from
+        return KeysetPage(rows, key, has_next=bool(rows), has_previous=has_previous)
+
+    if after is not None:
+        querysets = [queryset.filter(**{key + '__gt': after}) for queryset in querysets]
+    rows = _first_rows(querysets, key, per_page + 1)
+    has_next = len(rows) > per_page
+    return KeysetPage(rows[:per_page], key, has_next=has_next, has_previous=after is not None)
+
+
+class MergedQuerySet:
+    '''
+    Querysets of several databases (see routers.across_databases) paginated together by
+    CursorPagination: ordering and filters apply to every database, a slice reads the
+    first rows of each database and merges them.
+    '''
+    def __init__(self, querysets, ordering=('pk',)):
+        self.querysets = querysets
+        self.ordering = ordering
+
+    def order_by(self, *ordering):
+        return MergedQuerySet([queryset.order_by(*ordering) for queryset in self.querysets], ordering)
+
+    def filter(self, *args, **kwargs):
+        return MergedQuerySet([queryset.filter(*args, **kwargs) for queryset in self.querysets], self.ordering)
+
+    def __getitem__(self, index):
+        # Only the slices taken by CursorPagination (from the start of the ordering)
+        rows = []
+        for queryset in self.querysets:
+            rows.extend(queryset[:index.stop])
+        key = self.ordering[0]
+        rows.sort(key=lambda row: getattr(row, key.lstrip('-')), reverse=key.startswith('-'))
+        return rows[index]
+
+
+class CursorPagination(drf_pagination.CursorPagination):
+    '''
+    Cursor pagination of the REST API, ordered by primary key.
+    Next and previous links carry an opaque cursor, so pages never use OFFSET or COUNT(*).
+    A list of querysets of several databases is paginated as one (see MergedQuerySet).
+    '''
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'pk'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if isinstance(queryset, list):
+            queryset = MergedQuerySet(queryset)
+        return super().paginate_queryset(queryset, request, view)
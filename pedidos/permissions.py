@@ -0,0 +1,41 @@
+from rest_framework.permissions import BasePermission, SAFE_METHODS
+
+
+# REST API counterparts of the client_required and supplier_required decorators
+
+class IsClient(BasePermission):
+    '''
+    Allows access only to active client users.
+    '''
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.is_active and user.is_client)
+
+
+class IsSupplier(BasePermission):
+    '''
+    Allows access only to active supplier users.
+    '''
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.is_active and user.is_supplier)
+
+
+class IsSupplierOrReadOnlyClient(BasePermission):
+    '''
+    Suppliers have full access, clients can only read.
+    '''
+    def has_permission(self, request, view):
+        if IsSupplier().has_permission(request, view):
+            return True
+        return request.method in SAFE_METHODS and IsClient().has_permission(request, view)
+
+
+class IsClientOrReadOnlySupplier(BasePermission):
+    '''
+    Clients have full access, suppliers can only read.
+    '''
+    def has_permission(self, request, view):
+        if IsClient().has_permission(request, view):
+            return True
+        return request.method in SAFE_METHODS and IsSupplier().has_permission(request, view)
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+
+# Maximum number of SQL queries allowed for one request to each named route of pedidos/urls.py
+# Budgets include the session and user lookups done by the authentication middleware.
+# Every route must have a budget: a new route without one makes the harness fail.
+QUERY_BUDGETS = {
+    'client-home': 4,
+    'catalog-search': 4,
+    'supplier-home': 4,
+    'supplier-queue': 3,
+    'bulk-dispatch': 2,
+    'export-orders': 2,
+    'login': 0,
+    'client-signup': 0,
+    'supplier-signup': 0,
+    'logout': 0,
+    'create-item': 2,
+    'import-items': 2,
+    'reprice-items': 2,
+    'create-order': 4,
+    'edit-order': 4,
+    'delete-order': 7,
+    'client-order-detail': 4,
+    'supplier-item-detail': 4,
+    'edit-item': 3,
+    'delete-item': 6,
+    'manage-order': 4,
+    'change-feed': 2,
+    'metrics': 2,
+    'api-item-list': 3,
+    'api-item-detail': 3,
+    'api-item-search': 3,
+    'api-order-list': 3,
+    'api-order-detail': 3,
+    'api-manage-order-list': 3,
+    'api-manage-order-detail': 3,
+    'api-order-bulk': 11,
+    'api-order-cancel': 8,
+    'api-manage-order-bulk': 9,
+}
+
+
+def route_names(patterns=None):
+    '''
+    Names of all the routes declared in pedidos/urls.py (including nested includes).
+    '''
+    if patterns is None:
+        from . import urls
+        patterns = urls.urlpatterns
+    names = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names.extend(route_names(pattern.url_patterns))
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.append(pattern.name)
+    return names
+
+
+class QueryBudgetMixin:
+    '''
+    TestCase mixin to check that a request stays within the query budget of its route.
+    Use it as a context manager around the request:
+
+        with self.assertWithinQueryBudget('client-home'):
+            self.client.get(reverse('client-home'))
+    '''
+    query_budgets = QUERY_BUDGETS
+
+    @contextmanager
+    def assertWithinQueryBudget(self, route_name):
+        self.assertIn(route_name, self.query_budgets, 'Route "%s" has no query budget' % route_name)
+        budget = self.query_budgets[route_name]
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        executed = len(queries.captured_queries)
+        if executed > budget:
+            statements = '\n'.join('%d. %s' % (i, query['sql']) for i, query in enumerate(queries.captured_queries, start=1))
+            self.fail('Route "%s" executed %d queries, over its budget of %d:\n%s' % (route_name, executed, budget, statements))
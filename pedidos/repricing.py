@@ -0,0 +1,56 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+from .caching import bump_catalog_version
+from .models import Item
+from .routers import supplier_database
+from .writes import serialized_write
+
+# Bulk repricing of the items of a supplier: one UPDATE computes every new price in the
+# database. The old prices are kept by the price history trigger (see ItemPriceChange) and
+# the orders keep the price they were placed at (Order.unit_price).
+
+# Items listed by the preview of a repricing
+REPRICE_PREVIEW_ITEMS = 20
+
+
+def price_expression(percent=None, amount=None):
+    '''
+    New item price as a database expression: the price changed by ``percent`` or by
+    ``amount``, rounded to cents and never below zero.
+    '''
+    if percent is not None:
+        price = F('price') * Value(1 + percent / 100)
+    else:
+        price = F('price') + Value(float(amount))
+    return Greatest(Round(price, 2), Value(0.0))
+
+
+def supplier_items(supplier_id, filter_queryset=None):
+    # Items of the supplier (in its database) returned by ``filter_queryset``
+    items = Item.objects.using(supplier_database(supplier_id) or DEFAULT_DB_ALIAS).filter(supplier_id=supplier_id)
+    return filter_queryset(items) if filter_queryset is not None else items
+
+
+def preview_repricing(supplier_id, expression, filter_queryset=None, limit=REPRICE_PREVIEW_ITEMS):
+    '''
+    Number of items of the supplier that ``filter_queryset`` (a function that filters an
+    Item queryset) selects and the first ``limit`` of them by code, with their ``new_price``.
+    '''
+    items = supplier_items(supplier_id, filter_queryset)
+    return items.count(), list(items.annotate(new_price=expression).order_by('code')[:limit])
+
+
+def reprice_items(supplier_id, expression, filter_queryset=None):
+    '''
+    Set the price of the items of the supplier that ``filter_queryset`` selects to
+    ``expression`` with a single UPDATE and invalidate the cached catalog once.
+    Returns the number of items repriced.
+    '''
+    items = supplier_items(supplier_id, filter_queryset)
+    repriced = serialized_write(lambda: items.update(price=expression, updated_at=timezone.now()), using=items.db)
+    # QuerySet.update() does not send the signals that invalidate the catalog (see signals.py)
+    if repriced:
+        bump_catalog_version(supplier_id)
+    return repriced
@@ -0,0 +1,163 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Database routing of the pedidos models.
+#
+# Replicas (settings.DATABASE_REPLICAS): copies of the default database kept up to date
+# by the deployment. Views marked with decorators.replica_reads read from a replica,
+# everything else (and every write) goes to the default database. A client that wrote
+# reads from the default database for the rest of the request and, through the cookie
+# set by middleware.DatabaseRoutingMiddleware, for REPLICA_MAX_LAG seconds afterwards,
+# so it always sees its own writes.
+#
+# Shards (settings.SUPPLIER_SHARDS): databases with the items, orders and dispatches of
+# some suppliers, so the writes of a large supplier do not wait for the write lock of
+# everyone else. Rows follow their parent (an order goes to the database of its item,
+# a dispatch to the database of its order) when they are saved with Model.save(), queries
+# without an instance (and Manager.create()) go to the default database: use
+# supplier_database() and across_databases() to reach the shards.
+# Django has no relations across databases, so the accounts (User, Client, Supplier)
+# are copied to every shard (see signals.mirror_account).
+
+SHARDED_MODELS = {'item', 'order', 'manageorder'}
+ACCOUNT_MODELS = {'user', 'client', 'supplier'}
+# Parent of each sharded model: the field whose database the rows follow
+SHARD_PARENTS = {'order': 'item', 'manageorder': 'orderNo'}
+
+
+class RoutingState:
+    # Routing decisions of the current request
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = False
+        self.wrote = False
+
+
+routing_state = ContextVar('pedidos_routing_state', default=None)
+
+# Database being migrated by the migrate command (see management/commands/migrate.py): the
+# queries of the data migrations go to it, so they need no alias of their own
+migrating_database = ContextVar('pedidos_migrating_database', default=None)
+
+
+def reading_from_replica():
+    # True when the reads of the current request go to a replica
+    state = routing_state.get()
+    return bool(settings.DATABASE_REPLICAS and state is not None
+                and state.replica and not state.pinned and not state.wrote)
+
+
+def supplier_database(supplier_id):
+    '''
+    Shard of the supplier items, orders and dispatches, None for the default database
+    (so ``queryset.using(supplier_database(pk))`` still lets the router pick a replica).
+    '''
+    for alias, suppliers in settings.SUPPLIER_SHARDS.items():
+        if supplier_id in suppliers:
+            return alias
+    return None
+
+
+def primary_databases():
+    '''
+    Aliases of the databases that hold rows of their own: the default one and every
+    shard (never a replica).
+    '''
+    return [DEFAULT_DB_ALIAS] + list(settings.SUPPLIER_SHARDS)
+
+
+def across_databases(queryset):
+    '''
+    ``queryset`` on the default database (through the router) and on every shard.
+    '''
+    return [queryset] + [queryset.using(alias) for alias in settings.SUPPLIER_SHARDS]
+
+
+def get_across_databases(queryset):
+    '''
+    The single object of ``queryset`` in whichever database holds it (the default
+    database first), raises DoesNotExist like QuerySet.get().
+    '''
+    model = queryset.model
+    for database_queryset in across_databases(queryset):
+        try:
+            return database_queryset.get()
+        except model.DoesNotExist:
+            pass
+    raise model.DoesNotExist('%s matching query does not exist.' % model._meta.object_name)
+
+
+def copy_rows(model, rows, alias):
+    '''
+    Insert (or update) copies of ``rows`` of ``model`` in the ``alias`` database.
+    '''
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    copies = [model(**{field.attname: getattr(row, field.attname) for field in model._meta.concrete_fields})
+              for row in rows]
+    model._base_manager.using(alias).bulk_create(
+        copies, update_conflicts=True, unique_fields=[model._meta.pk.name],
+        update_fields=[field.name for field in fields])
+
+
+def primary(alias):
+    # Replicas stand for the default database
+    return DEFAULT_DB_ALIAS if alias in settings.DATABASE_REPLICAS else alias
+
+
+class DatabaseRouter:
+
+    def database(self, model, instance):
+        # Database where the rows of ``model`` related to ``instance`` are written
+        if model._meta.model_name not in SHARDED_MODELS or instance is None:
+            return DEFAULT_DB_ALIAS
+        name = instance._meta.model_name
+        if name not in SHARDED_MODELS:
+            # Accounts live in the default database (and are copied to the shards)
+            return DEFAULT_DB_ALIAS
+        if not instance._state.adding:
+            return primary(instance._state.db or DEFAULT_DB_ALIAS)
+        # New rows: items go to the shard of their supplier, the other ones follow their parent
+        if name == 'item':
+            return supplier_database(instance.supplier_id) or DEFAULT_DB_ALIAS
+        field = instance._meta.get_field(SHARD_PARENTS[name])
+        parent = field.get_cached_value(instance, None)
+        return self.database(model, parent)
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != 'pedidos':
+            return None
+        if migrating_database.get() is not None:
+            return migrating_database.get()
+        database = self.database(model, hints.get('instance'))
+        if database == DEFAULT_DB_ALIAS and reading_from_replica():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return database
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != 'pedidos':
+            return None
+        if migrating_database.get() is not None:
+            return migrating_database.get()
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return self.database(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._meta.app_label != 'pedidos' or obj2._meta.app_label != 'pedidos':
+            return None
+        # Accounts are in every database, new rows are written where their parent is
+        if {obj1._meta.model_name, obj2._meta.model_name} & ACCOUNT_MODELS:
+            return True
+        if obj1._state.adding or obj2._state.adding:
+            return True
+        return primary(obj1._state.db) == primary(obj2._state.db)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the default database, shards have the whole schema
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
@@ -0,0 +1,103 @@
+import re
+from django.db import OperationalError, connections
+from .models import Item
+from .routers import across_databases
+
+# Full-text search of the catalog: the FTS5 index of the item descriptions (migration 0007)
+# is kept in sync with pedidos_item by triggers. Databases without the index (not SQLite,
+# or SQLite without FTS5) are scanned instead, with the same filters and no ranking.
+
+# Results of one search (best ranked first)
+SEARCH_MAX_RESULTS = 50
+# Words of a search taken into account
+SEARCH_MAX_TERMS = 8
+
+# Matches ranked by a search: broad searches (words of many items) rank the newest
+# SEARCH_RANK_WINDOW matches only, so the cost of a search does not grow with the catalog
+SEARCH_RANK_WINDOW = 2000
+
+# The matches from the newest window (items that pass the filters, lower bound of their
+# codes in the subquery) ranked by BM25
+SEARCH_SQL = (
+    'SELECT "pedidos_item"."code", "pedidos_item"."description", "pedidos_item"."price", '
+    '"pedidos_item"."supplier_id", bm25("pedidos_item_fts") AS "rank" '
+    'FROM "pedidos_item_fts" INNER JOIN "pedidos_item" ON "pedidos_item"."code" = "pedidos_item_fts"."rowid" '
+    'WHERE "pedidos_item_fts" MATCH %s AND "pedidos_item_fts"."rowid" >= ('
+    'SELECT MIN("window"."rowid") FROM (SELECT "pedidos_item_fts"."rowid" FROM "pedidos_item_fts"{join} '
+    'WHERE "pedidos_item_fts" MATCH %s{filters} ORDER BY "pedidos_item_fts"."rowid" DESC LIMIT %s) AS "window")'
+    '{filters} ORDER BY "rank" LIMIT %s'
+)
+SEARCH_JOIN = ' INNER JOIN "pedidos_item" ON "pedidos_item"."code" = "pedidos_item_fts"."rowid"'
+
+
+def search_terms(text):
+    # Words of the search text (letters and digits, in lower case)
+    return re.findall(r'\w+', text.lower())[:SEARCH_MAX_TERMS]
+
+
+def match_expression(terms):
+    # FTS5 query of the items whose description has a word starting with each term
+    # (quoted, so words like AND or NEAR are not operators)
+    return ' '.join('"%s"*' % term for term in terms)
+
+
+# Databases found without the index (SQLite built without FTS5: migration 0007 skipped it)
+_unindexed = set()
+
+
+def search_items(text, supplier=None, min_price=None, max_price=None, limit=SEARCH_MAX_RESULTS):
+    '''
+    Items whose description contains every word of ``text`` as a word or a word prefix
+    ("cab" finds "cable"), best matches first (BM25 rank, lower is better), at most ``limit``.
+    Searches matching more than SEARCH_RANK_WINDOW items rank the newest ones.
+    Results may be filtered by supplier and price range. Every item has a ``rank``
+    attribute (None when the database has no search index).
+    '''
+    terms = search_terms(text)
+    if not terms:
+        return []
+    results = []
+    for items in across_databases(Item.objects.all()):
+        alias = items.db
+        if connections[alias].vendor == 'sqlite' and alias not in _unindexed:
+            try:
+                results.extend(_ranked_search(alias, terms, supplier, min_price, max_price, limit))
+                continue
+            except OperationalError:
+                # No such table (SQLite does not abort the transaction, the scan can run)
+                _unindexed.add(alias)
+        results.extend(_scan(items, terms, supplier, min_price, max_price, limit))
+    # Ranks of different databases (shards) are merged as they are
+    results.sort(key=lambda item: (item.rank is None, item.rank, item.code))
+    return results[:limit]
+
+
+def _ranked_search(alias, terms, supplier, min_price, max_price, limit):
+    filters = []
+    filter_params = []
+    for condition, value in (('"pedidos_item"."supplier_id" = %s', supplier),
+                             ('"pedidos_item"."price" >= %s', min_price),
+                             ('"pedidos_item"."price" <= %s', max_price)):
+        if value is not None:
+            filters.append(' AND ' + condition)
+            filter_params.append(value)
+    sql = SEARCH_SQL.format(join=SEARCH_JOIN if filters else '', filters=''.join(filters))
+    expression = match_expression(terms)
+    params = [expression, expression] + filter_params + [SEARCH_RANK_WINDOW] + filter_params + [limit]
+    return list(Item.objects.db_manager(alias).raw(sql, params))
+
+
+def _scan(items, terms, supplier, min_price, max_price, limit):
+    # Fallback without ranking: LIKE '%term%' on every description
+    for term in terms:
+        items = items.filter(description__icontains=term)
+    if supplier is not None:
+        items = items.filter(supplier_id=supplier)
+    if min_price is not None:
+        items = items.filter(price__gte=min_price)
+    if max_price is not None:
+        items = items.filter(price__lte=max_price)
+    results = list(items.order_by('code')[:limit])
+    for item in results:
+        item.rank = None
+    return results
@@ -0,0 +1,138 @@
+import random
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import User, Client, Supplier, Item, Order, OrderEvent, dispatch_priority
+from .sequences import order_numbers
+
+# Share of clients of each type (Normal, Plata, Oro, Platino)
+CLIENT_TYPE_WEIGHTS = {
+    Client.NORMAL: 60,
+    Client.PLATA: 25,
+    Client.ORO: 10,
+    Client.PLATINO: 5,
+}
+# Probability of an order being urgent and of each destination
+URGENT_RATE = 0.15
+DISTRIBUTION_CENTER_RATE = 0.4
+BRANCH_RATE = 0.4
+ASSOCIATED_COMPANY_RATE = 0.1
+# Orders are spread over this period of time
+ORDER_HISTORY_DAYS = 365
+# Words of the item descriptions (product, material, detail), so searches match some items
+ITEM_PRODUCTS = ['cable', 'tornillo', 'tuerca', 'martillo', 'taladro', 'bombilla', 'tubo', 'llave',
+                 'cinta', 'pintura', 'escalera', 'manguera', 'candado', 'bisagra', 'sierra', 'brocha']
+ITEM_MATERIALS = ['acero', 'cobre', 'aluminio', 'plástico', 'madera', 'latón', 'hierro', 'nailon']
+ITEM_DETAILS = ['eléctrico', 'reforzado', 'galvanizado', 'industrial', 'flexible', 'compacto',
+                'inoxidable', 'ligero', 'económico', 'profesional', 'resistente', 'ajustable']
+# Rows inserted per INSERT statement
+BATCH_SIZE = 1000
+
+
+def seed(suppliers, items, clients, orders, random_seed=None, batch_size=BATCH_SIZE):
+    '''
+    Bulk-insert synthetic suppliers, items, clients and orders.
+    New rows never collide with existing ones: usernames get a random tag and
+    item codes continue after the current maximum and orders are numbered by the
+    order number sequence.
+    Every client orders each item at most once (as enforced by the database).
+    Returns a dict with the number of rows created per model.
+    '''
+    if orders > clients * items:
+        raise ValueError('Cannot create %d orders: %d clients can order %d items at most once each'
+                         % (orders, clients, items))
+    if (items and not suppliers) or (orders and not clients):
+        raise ValueError('Items need suppliers and orders need clients')
+    rng = random.Random(random_seed)
+    # The tag does not come from the random seed, seeding twice with the same seed adds new users
+    tag = uuid.uuid4().hex[:8]
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Users and profiles (passwords are unusable, seeded users cannot log in)
+        supplier_users = User.objects.bulk_create(
+            [User(username='seed-%s-s%d' % (tag, n), password='!', is_supplier=True) for n in range(suppliers)],
+            batch_size=batch_size)
+        client_users = User.objects.bulk_create(
+            [User(username='seed-%s-c%d' % (tag, n), password='!', is_client=True) for n in range(clients)],
+            batch_size=batch_size)
+        # Some backends do not return the ids of bulk inserted rows
+        user_ids = dict(User.objects.filter(username__startswith='seed-%s-' % tag).values_list('username', 'id'))
+        supplier_ids = [user_ids[user.username] for user in supplier_users]
+        client_ids = [user_ids[user.username] for user in client_users]
+        Supplier.objects.bulk_create(
+            [Supplier(user_id=user_id, address='seed', items_supplied='seed') for user_id in supplier_ids],
+            batch_size=batch_size)
+        types, weights = zip(*CLIENT_TYPE_WEIGHTS.items())
+        client_types = rng.choices(types, weights, k=clients)
+        Client.objects.bulk_create(
+            [Client(user_id=user_id, code='seed', address='seed', client_type=client_type)
+             for user_id, client_type in zip(client_ids, client_types)],
+            batch_size=batch_size)
+
+        # Items, spread over suppliers
+        first_code = (Item.objects.aggregate(code=Max('code'))['code'] or 0) + 1
+        item_codes = list(range(first_code, first_code + items))
+        # Prices are kept for the orders (Order.unit_price)
+        item_prices = []
+
+        def make_items():
+            for code in item_codes:
+                description = item_description(rng, code)
+                item_prices.append(round(rng.uniform(1, 5000), 2))
+                yield Item(code=code, description=description, price=item_prices[-1], supplier_id=rng.choice(supplier_ids))
+        bulk_create_iter(Item, make_items(), batch_size)
+
+        # Orders: client n % clients orders a different item on each round,
+        # starting on a random offset so items do not get orders in the same order
+        numbers = iter(order_numbers.allocate(orders))
+        offsets = [rng.randrange(items) for _ in client_ids] if orders else []
+
+        def make_orders():
+            for n in range(orders):
+                client_index = n % clients
+                item_index = (n // clients + offsets[client_index]) % items
+                is_urgent = rng.random() < URGENT_RATE
+                distribution_center = rng.random() < DISTRIBUTION_CENTER_RATE
+                yield Order(
+                    orderNo=next(numbers),
+                    client_id=client_ids[client_index],
+                    item_id=item_codes[item_index],
+                    created_at=now - timedelta(seconds=rng.randrange(ORDER_HISTORY_DAYS * 86400)),
+                    is_urgent=is_urgent,
+                    distribution_center=distribution_center,
+                    branch=not distribution_center and rng.random() < BRANCH_RATE,
+                    associated_company=rng.random() < ASSOCIATED_COMPANY_RATE,
+                    quantity=rng.randint(1, 100),
+                    unit_price=item_prices[item_index],
+                    # bulk_create() does not call Order.save()
+                    priority=dispatch_priority(is_urgent, distribution_center, client_types[client_index]),
+                )
+        bulk_create_iter(Order, make_orders(), batch_size)
+        # Placement events of the orders (see Order.save)
+        bulk_create_iter(OrderEvent, (
+            OrderEvent(order_no=number, to_status=Order.PLACED, created_at=created_at)
+            for number, created_at in Order.objects.filter(client__user__username__startswith='seed-%s-' % tag).values_list(
+                'orderNo', 'created_at').iterator()
+        ), batch_size)
+
+    return {'suppliers': suppliers, 'clients': clients, 'items': items, 'orders': orders}
+
+
+def bulk_create_iter(model, objs, batch_size):
+    # bulk_create() materializes its input, insert a batch at a time to keep memory bounded
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def item_description(rng, code):
+    return '%s de %s %s, modelo %d' % (rng.choice(ITEM_PRODUCTS).capitalize(), rng.choice(ITEM_MATERIALS),
+                                        ' '.join(rng.sample(ITEM_DETAILS, 2)), code)
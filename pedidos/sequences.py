@@ -0,0 +1,91 @@
+import os
+import threading
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Order, Sequence
+
+
+class SequenceAllocator:
+    '''
+    Hands out unique numbers of a database sequence (a row of models.Sequence).
+    Each process reserves ``block_size`` numbers at a time with one UPDATE and hands
+    them out from memory, so concurrent writers only contend on the sequence row once
+    per block. Numbers are unique but not gapless: the unused numbers of a block are
+    lost when the process exits.
+    ``floor`` is an optional expression (or a function returning one, evaluated on every
+    reservation) with the lowest number the sequence may hand out, so rows numbered by
+    hand are skipped.
+    '''
+    def __init__(self, name, block_size, floor=None, using=DEFAULT_DB_ALIAS):
+        self.name = name
+        self.block_size = block_size
+        self.floor = floor
+        self.using = using
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._next = self._end = 0
+
+    def allocate(self, count=1):
+        # Return a list of ``count`` unique numbers
+        with self._lock:
+            # A forked process must not hand out the numbers of the parent block
+            if self._pid != os.getpid():
+                self._reset()
+            taken = min(count, self._end - self._next)
+            numbers = list(range(self._next, self._next + taken))
+            self._next += taken
+            missing = count - taken
+            if not missing:
+                return numbers
+            if transaction.get_connection(self.using).in_atomic_block:
+                # A block reserved inside the caller transaction returns to the sequence if the
+                # transaction is rolled back, keeping its numbers would hand them out twice
+                first = self.reserve(missing)
+                return numbers + list(range(first, first + missing))
+            size = max(missing, self.block_size)
+            first = self.reserve(size)
+            self._next, self._end = first + missing, first + size
+            return numbers + list(range(first, first + missing))
+
+    def reserve(self, size):
+        # Move the sequence forward by ``size`` and return the first number reserved
+        sequences = Sequence.objects.using(self.using).filter(name=self.name)
+        floor = self.floor() if callable(self.floor) else self.floor
+        start = F('next_value') if floor is None else Greatest(F('next_value'), floor)
+        # Inside a transaction of the caller there is no need for a savepoint: the whole
+        # transaction rolls back if the reservation fails
+        with transaction.atomic(using=self.using, savepoint=False):
+            # The UPDATE locks the sequence row until the transaction ends
+            if not sequences.update(next_value=start + size):
+                # The sequence row is created on first use (e.g. after the database is flushed)
+                try:
+                    with transaction.atomic(using=self.using):
+                        Sequence.objects.using(self.using).create(name=self.name)
+                except IntegrityError:
+                    # Created by a concurrent process
+                    pass
+                sequences.update(next_value=start + size)
+            return sequences.values_list('next_value', flat=True).get() - size
+
+
+def order_number_floor():
+    # New order numbers continue after the highest existing one. The subquery reads the
+    # default database (where the sequence is), the orders of the shards (see
+    # routers.SUPPLIER_SHARDS) are read beforehand
+    highest = Coalesce(
+        Subquery(Order.objects.using(DEFAULT_DB_ALIAS).order_by('-orderNo').values('orderNo')[:1]),
+        Value(0),
+    )
+    shards = [Order.objects.using(alias).aggregate(highest=Max('orderNo'))['highest'] or 0
+              for alias in settings.SUPPLIER_SHARDS]
+    if shards:
+        highest = Greatest(highest, Value(max(shards)))
+    return highest + 1
+
+
+order_numbers = SequenceAllocator('order', settings.ORDER_NUMBER_BLOCK_SIZE, floor=order_number_floor)
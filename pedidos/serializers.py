@@ -0,0 +1,151 @@
+from rest_framework import serializers
+from .models import Item, Order, ManageOrder
+from .routers import across_databases, get_across_databases, supplier_database
+
+# Maximum number of lines of one bulk order
+BULK_ORDER_MAX_LINES = 1000
+
+
+# Sparse fieldsets: ?fields=code,price returns only those fields
+# (unknown field names are ignored, no fields parameter returns every field)
+class SparseFieldsMixin:
+    fields_query_param = 'fields'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        requested = request.query_params.get(self.fields_query_param)
+        if not requested:
+            return
+        requested = {name.strip() for name in requested.split(',')}
+        for name in set(self.fields) - requested:
+            self.fields.pop(name)
+
+
+# Item serializer (supplier is the user id of the supplier that publishes the item)
+class ItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Item
+        fields = ('code', 'description', 'price', 'supplier')
+        read_only_fields = ('supplier',)
+
+    # Code is the primary key, it cannot change once the item is created
+    # (the model validation checks the default database, the shards are checked here)
+    def validate_code(self, value):
+        if self.instance is not None and value != self.instance.code:
+            raise serializers.ValidationError('Item code cannot be changed.')
+        if self.instance is None and any(items.exists() for items in across_databases(Item.objects.filter(code=value))[1:]):
+            raise serializers.ValidationError('item with this code already exists.')
+        return value
+
+
+# Primary key of a row in whichever database holds it (see routers.across_databases)
+class AcrossDatabasesRelatedField(serializers.PrimaryKeyRelatedField):
+
+    def to_internal_value(self, data):
+        queryset = self.get_queryset()
+        try:
+            return get_across_databases(queryset.filter(pk=data))
+        except queryset.model.DoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+# Order serializer (client and priority are set by the server)
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    client_username = serializers.CharField(source='client.user.username', read_only=True)
+    # Items of every database can be ordered
+    item = AcrossDatabasesRelatedField(queryset=Item.objects.all())
+
+    class Meta:
+        model = Order
+        fields = ('orderNo', 'client', 'client_username', 'item', 'created_at', 'is_urgent', 'distribution_center',
+                  'branch', 'associated_company', 'quantity', 'unit_price', 'priority', 'status')
+        read_only_fields = ('orderNo', 'client', 'created_at', 'unit_price', 'priority', 'status')
+
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Quantity must be greater than zero.')
+        return value
+
+    # Saved with Model.save(), in the database of the item (Manager.create() writes to the
+    # default database, see routers.py)
+    def create(self, validated_data):
+        order = Order(**validated_data)
+        order.save()
+        return order
+
+    # The item of an order cannot change (edit the order quantity or flags instead)
+    def validate_item(self, value):
+        if self.instance is not None and value.pk != self.instance.item_id:
+            raise serializers.ValidationError('Order item cannot be changed.')
+        return value
+
+    # Orders are changed until the supplier manages them (or they are cancelled)
+    def validate(self, attrs):
+        if self.instance is not None and self.instance.status != Order.PLACED:
+            raise serializers.ValidationError('Only placed orders can be changed (this one is %s).'
+                                              % self.instance.get_status_display().lower())
+        return attrs
+
+
+# Manage order serializer: an order is sent to a distribution center (warehouse)
+# or to a branch / associated company (reference, branch code and details)
+class ManageOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ManageOrder
+        fields = ('orderNo', 'dispatched_at', 'warehouse', 'reference', 'branch_code', 'details')
+        read_only_fields = ('dispatched_at',)
+        extra_kwargs = {
+            'warehouse': {'required': False, 'allow_blank': True},
+            'reference': {'required': False, 'allow_blank': True},
+            'details': {'required': False, 'allow_blank': True},
+        }
+
+    # Orders are looked up in the database of the supplier (see routers.py)
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is not None and 'orderNo' in fields:
+            fields['orderNo'].queryset = Order.objects.using(supplier_database(request.user.pk))
+        return fields
+
+    def validate_orderNo(self, value):
+        request = self.context['request']
+        if value.item.supplier_id != request.user.pk:
+            raise serializers.ValidationError('Order does not belong to an item of this supplier.')
+        # The dispatch of a managed order is edited, dispatched and cancelled orders are closed
+        if value.status not in (Order.PLACED, Order.MANAGED):
+            raise serializers.ValidationError('This order is not pending (%s).' % value.get_status_display().lower())
+        return value
+
+    def validate(self, attrs):
+        if not attrs.get('warehouse') and not attrs.get('reference'):
+            raise serializers.ValidationError('Either a warehouse or a reference is required.')
+        return attrs
+
+
+# One line of a bulk order (items are validated for all the lines at once, see bulk_orders.place_orders)
+class BulkOrderLineSerializer(serializers.Serializer):
+    item = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    is_urgent = serializers.BooleanField(default=False)
+    distribution_center = serializers.BooleanField(default=False)
+    branch = serializers.BooleanField(default=False)
+    associated_company = serializers.BooleanField(default=False)
+
+
+# Bulk order request: {"lines": [{"item": 1, "quantity": 3}, ...]}
+class BulkOrderSerializer(serializers.Serializer):
+    lines = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=BULK_ORDER_MAX_LINES)
+
+
+# Item line of a catalog import (see bulk_items.py), the supplier is the importing one
+class BulkItemLineSerializer(serializers.Serializer):
+    # Range of the database integers
+    code = serializers.IntegerField(min_value=-2 ** 63, max_value=2 ** 63 - 1)
+    description = serializers.CharField()
+    price = serializers.FloatField(min_value=0.0, max_value=1000000000.0)
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from .models import User, Client, Supplier, Item, Order, ManageOrder, OrderEvent
+from .routers import copy_rows, supplier_database
+
+# Rows copied or moved at once
+SHARD_BATCH_SIZE = 1000
+
+# Rows of a supplier kept in its shard, parents first: (model, lookup of the supplier)
+SUPPLIER_ROWS = [
+    (Item, 'supplier_id__in'),
+    (Order, 'item__supplier_id__in'),
+    (ManageOrder, 'orderNo__item__supplier_id__in'),
+]
+
+
+def _copy_all(model, queryset, alias, batch_size):
+    # Copy the rows of ``queryset`` to ``alias`` a batch at a time (memory stays bounded)
+    copied = 0
+    batch = []
+    for row in queryset.order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            copy_rows(model, batch, alias)
+            copied += len(batch)
+            batch = []
+    if batch:
+        copy_rows(model, batch, alias)
+        copied += len(batch)
+    return copied
+
+
+def move_supplier_rows(supplier_ids, source, target, batch_size=SHARD_BATCH_SIZE):
+    '''
+    Move the items, orders and dispatches of the suppliers, and the history of the orders,
+    from ``source`` to ``target``.
+    The copies are committed before the rows are deleted from ``source``: when the
+    deletion fails, running it again finishes the move (the order events are copied
+    again).
+    Returns the number of items, orders and dispatches moved.
+    '''
+    moved = 0
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        for model, lookup in SUPPLIER_ROWS:
+            rows = model._base_manager.using(source).filter(**{lookup: supplier_ids})
+            moved += _copy_all(model, rows, target, batch_size)
+        # Events are numbered by each database: they are added to the target (with new ids),
+        # and they are not deleted with the orders
+        events = OrderEvent.objects.using(source).filter(order_no__in=Order._base_manager.using(source).filter(
+            item__supplier_id__in=supplier_ids).values('orderNo'))
+        batch = []
+        for event in events.order_by('pk').iterator(chunk_size=batch_size):
+            event.pk = None
+            batch.append(event)
+            if len(batch) >= batch_size:
+                OrderEvent.objects.using(target).bulk_create(batch)
+                batch = []
+        OrderEvent.objects.using(target).bulk_create(batch)
+        events.delete()
+        # Orders and dispatches are deleted with their items
+        Item._base_manager.using(source).filter(supplier_id__in=supplier_ids).delete()
+    return moved
+
+
+def sync_shards(batch_size=SHARD_BATCH_SIZE):
+    '''
+    Bring the shards in line with settings.SUPPLIER_SHARDS: copy every account to every
+    shard and move the rows of every supplier to its database (a shard, or the default
+    database for the suppliers no longer assigned to one).
+    Returns {database: rows moved into it}.
+    '''
+    moved = {}
+    for alias in settings.SUPPLIER_SHARDS:
+        for model in (User, Client, Supplier):
+            _copy_all(model, model._base_manager.using(DEFAULT_DB_ALIAS), alias, batch_size)
+    for source in [DEFAULT_DB_ALIAS, *settings.SUPPLIER_SHARDS]:
+        supplier_ids = Item._base_manager.using(source).values_list('supplier_id', flat=True).distinct()
+        targets = {}
+        for supplier_id in supplier_ids:
+            target = supplier_database(supplier_id) or DEFAULT_DB_ALIAS
+            if target != source:
+                targets.setdefault(target, []).append(supplier_id)
+        for target, suppliers in targets.items():
+            moved[target] = moved.get(target, 0) + move_supplier_rows(suppliers, source, target, batch_size)
+    return moved
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .backends import invalidate_cached_user
+from .caching import bump_catalog_version, forget_item
+from .models import User, Client, Supplier, Item
+from .routers import copy_rows
+
+
+# Any change to an item invalidates the cached catalog and the supplier cached items
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_item_cache(sender, instance, **kwargs):
+    bump_catalog_version(instance.supplier_id)
+    if kwargs['signal'] is post_delete:
+        forget_item(instance.code)
+
+
+# Supplier list of the catalog filter is cached with the catalog
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def invalidate_supplier_cache(sender, instance, **kwargs):
+    bump_catalog_version(instance.pk)
+
+
+# Cached authenticated users carry their profile, drop them when any of them changes
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Supplier)
+@receiver(post_delete, sender=Supplier)
+def invalidate_profile_user_cache(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+
+# Accounts are copied to every shard, so the orders and items kept there can refer to them
+# (see routers.py): one INSERT ... ON CONFLICT DO UPDATE per shard
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Supplier)
+def mirror_account(sender, instance, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS:
+        return
+    for alias in settings.SUPPLIER_SHARDS:
+        copy_rows(sender, [instance], alias)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Supplier)
+def delete_mirrored_account(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for alias in settings.SUPPLIER_SHARDS:
+        sender._base_manager.using(alias).filter(pk=instance.pk).delete()
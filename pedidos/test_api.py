@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from .models import User, Client, Supplier, Item, Order, ManageOrder
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # API urls
+        self.items_url = reverse('api-item-list')
+        self.orders_url = reverse('api-order-list')
+        self.manage_orders_url = reverse('api-manage-order-list')
+
+        # Two suppliers with items
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        other_user = User.objects.create(username='otro', is_supplier=True)
+        other_supplier = Supplier.objects.create(user=other_user, address='calle2', items_supplied='items_y')
+        Item.objects.bulk_create([
+            Item(code=code, description='articulo %d' % code, price=float(code),
+                 supplier=supplier if code <= 5 else other_supplier)
+            for code in range(1, 11)
+        ])
+
+        # Client user
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=self.client_user, code='c1', address='calle3')
+        return super().setUp()
+
+class ItemApiTest(BaseTest):
+    # Anonymous users cannot use the API
+    def test_anonymous_forbidden(self):
+        response = self.client.get(self.items_url)
+        self.assertEqual(response.status_code, 403)
+
+    # Clients read every item with cursor pagination
+    def test_client_lists_items_with_cursor(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(self.items_url, {'page_size': 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['code'] for item in response.data['results']], [1, 2, 3, 4])
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['code'] for item in response.data['results']], [5, 6, 7, 8])
+
+    # fields= limits the serialized fields
+    def test_sparse_fields(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(self.items_url, {'fields': 'code,price'})
+        self.assertEqual(set(response.data['results'][0]), {'code', 'price'})
+
+    # Clients cannot create items, suppliers create items of their own
+    def test_create_item_permissions(self):
+        self.client.force_login(self.client_user)
+        response = self.client.post(self.items_url, {'code': 20, 'description': 'nuevo', 'price': 1.0})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.supplier_user)
+        response = self.client.post(self.items_url, {'code': 20, 'description': 'nuevo', 'price': 1.0})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Item.objects.get(code=20).supplier_id, self.supplier_user.pk)
+
+    # Suppliers only see and change their own items
+    def test_supplier_only_own_items(self):
+        self.client.force_login(self.supplier_user)
+        response = self.client.get(self.items_url)
+        self.assertEqual([item['code'] for item in response.data['results']], [1, 2, 3, 4, 5])
+        response = self.client.delete(reverse('api-item-detail', args=[6]))
+        self.assertEqual(response.status_code, 404)
+
+class OrderApiTest(BaseTest):
+    # Clients place orders, a second order of the same item is rejected
+    def test_client_creates_order(self):
+        self.client.force_login(self.client_user)
+        response = self.client.post(self.orders_url, {'item': 1, 'quantity': 3, 'is_urgent': True})
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(client=self.client_profile, item_id=1)
+        self.assertEqual(order.quantity, 3)
+        response = self.client.post(self.orders_url, {'item': 1, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+
+    # Suppliers read the orders of their items but cannot place orders
+    def test_supplier_reads_orders(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=1)
+        Order.objects.create(orderNo=2, client=self.client_profile, item_id=6, quantity=1)
+        self.client.force_login(self.supplier_user)
+        response = self.client.get(self.orders_url)
+        self.assertEqual([order['orderNo'] for order in response.data['results']], [1])
+        self.assertEqual(response.data['results'][0]['client_username'], 'cliente')
+        response = self.client.post(self.orders_url, {'item': 1, 'quantity': 1})
+        self.assertEqual(response.status_code, 403)
+
+class ManageOrderApiTest(BaseTest):
+    # Suppliers dispatch the orders of their items only
+    def test_supplier_manages_order(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=1)
+        Order.objects.create(orderNo=2, client=self.client_profile, item_id=6, quantity=1)
+        self.client.force_login(self.supplier_user)
+        response = self.client.post(self.manage_orders_url, {'orderNo': 1, 'warehouse': 'almacen'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(ManageOrder.objects.filter(orderNo=1).exists())
+        response = self.client.post(self.manage_orders_url, {'orderNo': 2, 'warehouse': 'almacen'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.manage_orders_url, {'orderNo': 1})
+        self.assertEqual(response.status_code, 400)
+
+    # Clients cannot use the dispatch endpoints
+    def test_client_forbidden(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(self.manage_orders_url)
+        self.assertEqual(response.status_code, 403)
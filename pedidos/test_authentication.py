@@ -1,6 +1,10 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from .models import Supplier
+from .backends import CachedModelBackend
+from .models import User, Client, Supplier
 
 
 class BaseTest(TestCase):
@@ -95,4 +99,42 @@ class LogoutTest(BaseTest):
     def test_logout_page_correct(self):
         response = self.client.get(self.logout_url)
         self.assertEqual(response.status_code,200)
-        self.assertTemplateUsed(response, 'pedidos/logout.html')
\ No newline at end of file
+        self.assertTemplateUsed(response, 'pedidos/logout.html')
+
+class CachedUserTest(BaseTest):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='cliente', is_client=True)
+        self.profile = Client.objects.create(user=self.user, code='c1', address='calle1')
+        return super().setUp()
+
+    # Once cached, an authenticated page needs no session, user or profile query
+    def test_authenticated_request_without_auth_queries(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('client-home'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('client-home'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    # The profile is loaded with the user
+    def test_profile_loaded_with_user(self):
+        user = CachedModelBackend().get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.client.code, 'c1')
+            self.assertFalse(hasattr(user, 'supplier'))
+
+    # Saving the profile invalidates the cached user
+    def test_profile_save_invalidates_cache(self):
+        CachedModelBackend().get_user(self.user.pk)
+        self.profile.client_type = Client.PLATINO
+        self.profile.save()
+        user = CachedModelBackend().get_user(self.user.pk)
+        self.assertEqual(user.client.client_type, Client.PLATINO)
+
+    # Inactive users are not authenticated even if cached
+    def test_inactive_user(self):
+        CachedModelBackend().get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(CachedModelBackend().get_user(self.user.pk))
@@ -0,0 +1,97 @@
+from django.test import TestCase
+from django.urls import reverse
+from .dispatch import save_dispatch
+from .models import User, Client, Supplier, Item, Order, ManageOrder, Job
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        # Bulk dispatch urls
+        self.bulk_url = reverse('api-manage-order-bulk')
+        self.view_url = reverse('bulk-dispatch')
+
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        other_user = User.objects.create(username='otro', is_supplier=True)
+        other = Supplier.objects.create(user=other_user, address='calle3', items_supplied='items_y')
+        Item.objects.bulk_create([
+            Item(code=1, description='articulo', price=1.0, supplier=supplier),
+            Item(code=2, description='articulo', price=2.0, supplier=supplier),
+            Item(code=3, description='articulo', price=3.0, supplier=other),
+        ])
+        clients = []
+        for number in range(100):
+            user = User.objects.create(username='cliente%d' % number, is_client=True)
+            clients.append(Client.objects.create(user=user, code='c', address='calle2'))
+        # Orders 1-100 of item 1 (urgent every 10), 101-200 of item 2, 201 of the other supplier
+        for number, client in enumerate(clients, 1):
+            Order.objects.create(orderNo=number, client=client, item_id=1, quantity=1, is_urgent=number % 10 == 0)
+            Order.objects.create(orderNo=100 + number, client=client, item_id=2, quantity=1)
+        Order.objects.create(orderNo=201, client=clients[0], item_id=3, quantity=1)
+        save_dispatch(ManageOrder(orderNo_id=5, warehouse='almacen'))
+        self.client.force_login(self.supplier_user)
+        return super().setUp()
+
+    def post(self, data):
+        return self.client.post(self.bulk_url, data, content_type='application/json')
+
+
+class BulkDispatchTest(BaseTest):
+    # The pending orders matching the filters are dispatched with batched INSERTs
+    # and their status changes with one UPDATE (SQLite allows about 90 jobs per INSERT)
+    def test_dispatch_filtered_orders(self):
+        with self.assertNumQueries(10):
+            response = self.post({'destination': 'distribution_center', 'warehouse': 'norte', 'item': 1})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['dispatched'], response.data['failed']), (99, 0))
+        # Highest priority first
+        self.assertEqual([result['order'] for result in response.data['results'][:10]], list(range(10, 101, 10)))
+        self.assertEqual(ManageOrder.objects.filter(warehouse='norte').count(), 99)
+        self.assertEqual(ManageOrder.objects.get(orderNo=5).warehouse, 'almacen')
+        self.assertFalse(ManageOrder.objects.filter(orderNo__gt=100).exists())
+        # And the job of order 5
+        self.assertEqual(Job.objects.filter(task='process-dispatch').count(), 100)
+        self.assertEqual(Order.objects.filter(item_id=1, status=Order.MANAGED).count(), 100)
+
+        # Nothing left to dispatch
+        response = self.post({'destination': 'distribution_center', 'warehouse': 'norte', 'item': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'], [])
+
+    def test_min_priority(self):
+        response = self.post({'destination': 'branch', 'reference': 'r1', 'branch_code': 7, 'min_priority': 100})
+        self.assertEqual(response.data['dispatched'], 10)
+        dispatch = ManageOrder.objects.get(orderNo=10)
+        self.assertEqual((dispatch.reference, dispatch.branch_code, dispatch.warehouse, dispatch.details), ('r1', 7, '', ''))
+
+    # Orders that cannot be dispatched are reported, the other ones are dispatched
+    def test_partial_failure(self):
+        response = self.post({'destination': 'associated_company', 'reference': 'r1', 'branch_code': 7,
+                              'details': 'empresa', 'orders': [1, 5, 201, 999, 2, 1]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(result['order'], result['status']) for result in response.data['results']],
+                         [(1, 'dispatched'), (5, 'error'), (201, 'error'), (999, 'error'), (2, 'dispatched'), (1, 'error')])
+        self.assertIn('not pending (managed)', response.data['results'][1]['errors']['order'][0])
+        self.assertIn('repeated', response.data['results'][5]['errors']['order'][0])
+        self.assertEqual(set(ManageOrder.objects.filter(details='empresa').values_list('orderNo', flat=True)), {1, 2})
+        self.assertFalse(ManageOrder.objects.filter(orderNo=201).exists())
+
+    # The fields of the destination are required
+    def test_invalid(self):
+        response = self.post({'destination': 'branch', 'reference': 'r1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('branch_code', response.data)
+        response = self.post({'destination': 'avion', 'warehouse': 'norte'})
+        self.assertIn('destination', response.data)
+        self.assertFalse(ManageOrder.objects.exclude(orderNo=5).exists())
+
+    # The checked orders of the dispatch queue
+    def test_view(self):
+        response = self.client.get(reverse('supplier-queue'))
+        self.assertContains(response, 'name="orders" value="10"')
+        response = self.client.post(self.view_url, {'destination': 'distribution_center', 'warehouse': 'norte',
+                                                    'orders': ['10', '5']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['dispatched'], 1)
+        self.assertEqual([result['status'] for result in response.context['results']], ['dispatched', 'error'])
+        self.assertEqual(ManageOrder.objects.get(orderNo=10).warehouse, 'norte')
@@ -0,0 +1,86 @@
+import io
+import os
+import tempfile
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from .bulk_items import import_items, read_item_rows
+from .caching import catalog_version
+from .models import User, Supplier, Item
+from .search import search_items
+
+
+class ItemImportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        other_user = User.objects.create(username='otro', is_supplier=True)
+        other = Supplier.objects.create(user=other_user, address='calle3', items_supplied='items_y')
+        Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+        Item.objects.create(code=2, description='sin cambios', price=5.0, supplier=self.supplier)
+        Item.objects.create(code=9, description='de otro proveedor', price=1.0, supplier=other)
+
+    def rows(self, text, format='csv'):
+        return read_item_rows(io.StringIO(text), format)
+
+    # Rows are created or updated, invalid ones are reported with their line
+    def test_import(self):
+        text = ('code,description,price\n'
+                '1,articulo nuevo,12.5\n'
+                '2,sin cambios,5\n'
+                '3,"cable, 2 m",7\n'
+                '4,,7\n'
+                '5,otro,-1\n'
+                '3,repetido,8\n'
+                '9,ajeno,1\n')
+        result = import_items(self.supplier.pk, self.rows(text))
+        self.assertEqual((result['created'], result['updated'], result['unchanged'], result['failed']), (1, 1, 1, 4))
+        self.assertEqual([(error['line'], error['code'], list(error['errors'])) for error in result['errors']],
+                         [(5, '4', ['description']), (6, '5', ['price']), (7, 3, ['code']), (8, 9, ['code'])])
+        self.assertEqual(Item.objects.get(code=1).price, 12.5)
+        self.assertEqual(Item.objects.get(code=3).supplier, self.supplier)
+        self.assertEqual(Item.objects.get(code=9).description, 'de otro proveedor')
+        # Imported rows go through the database triggers (search index)
+        self.assertEqual([item.code for item in search_items('cable')], [3])
+        self.assertEqual([item.code for item in search_items('nuevo')], [1])
+
+    def test_jsonl(self):
+        text = '{"code": 6, "description": "nuevo", "price": 3}\n\nno es json\n[1, 2]\n'
+        result = import_items(self.supplier.pk, self.rows(text, 'jsonl'))
+        self.assertEqual((result['created'], result['failed']), (1, 2))
+        self.assertEqual([error['line'] for error in result['errors']], [3, 4])
+
+    # Each batch is validated and written together, with one cache bump
+    def test_batches(self):
+        text = 'code,description,price\n' + ''.join('%d,articulo,1\n' % code for code in range(100, 125))
+        with mock.patch('pedidos.bulk_items.bump_catalog_version') as bump:
+            result = import_items(self.supplier.pk, self.rows(text), batch_size=10)
+        self.assertEqual(result['created'], 25)
+        self.assertEqual(bump.call_count, 3)
+        # A batch without changes does not invalidate the cache
+        version = catalog_version(self.supplier.pk)
+        import_items(self.supplier.pk, self.rows(text), batch_size=10)
+        self.assertEqual(catalog_version(self.supplier.pk), version)
+
+    def test_upload(self):
+        self.client.force_login(self.supplier_user)
+        upload = SimpleUploadedFile('articulos.jsonl', b'{"code": 7, "description": "subido", "price": 2}\n{"code": 8}\n')
+        response = self.client.post(reverse('import-items'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result']['created'], 1)
+        self.assertEqual(response.context['result']['errors'][0]['line'], 2)
+        self.assertTrue(Item.objects.filter(code=7, supplier=self.supplier).exists())
+
+    def test_command(self):
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'articulos.csv')
+            with open(path, 'w') as file:
+                file.write('code,description,price\n10,articulo,1\n11,articulo,x\n')
+            call_command('import_items', path, '--supplier', 'proveedor', stdout=output)
+        self.assertIn('Line 3 (code 11): price: A valid number is required.', output.getvalue())
+        self.assertIn('1 created, 0 updated, 0 unchanged, 1 failed', output.getvalue())
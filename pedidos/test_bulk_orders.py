@@ -0,0 +1,75 @@
+from django.test import TestCase
+from django.urls import reverse
+from .bulk_orders import place_orders
+from .models import User, Client, Supplier, Item, Order, dispatch_priority
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        # Bulk order url
+        self.bulk_url = reverse('api-order-bulk')
+
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.bulk_create([
+            Item(code=code, description='articulo %d' % code, price=float(code), supplier=supplier)
+            for code in range(1, 201)
+        ])
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=self.client_user, code='c1', address='calle2', client_type=Client.PLATINO)
+        self.client.force_login(self.client_user)
+        return super().setUp()
+
+    def post(self, lines):
+        return self.client.post(self.bulk_url, {'lines': lines}, content_type='application/json')
+
+class BulkOrderTest(BaseTest):
+    # All the lines are placed with a fixed number of queries
+    def test_place_many_orders(self):
+        lines = [{'item': code, 'quantity': code, 'is_urgent': True, 'distribution_center': True} for code in range(1, 201)]
+        with self.assertNumQueries(13):
+            response = self.post(lines)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 200)
+        self.assertEqual(Order.objects.filter(client=self.client_profile).count(), 200)
+        order = Order.objects.get(client=self.client_profile, item_id=10)
+        self.assertEqual(order.quantity, 10)
+        self.assertEqual(order.priority, dispatch_priority(True, True, Client.PLATINO))
+        self.assertEqual(response.data['results'][9]['orderNo'], order.orderNo)
+
+    # Invalid lines are reported, the valid ones are placed
+    def test_partial_failure(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=3, quantity=1)
+        response = self.post([
+            {'item': 1, 'quantity': 1},
+            {'item': 999, 'quantity': 1},
+            {'item': 2, 'quantity': 0},
+            {'item': 3, 'quantity': 1},
+            {'item': 1, 'quantity': 2},
+            {'item': 4, 'quantity': 5},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'error', 'error', 'error', 'error', 'created'])
+        self.assertIn('quantity', response.data['results'][2]['errors'])
+        self.assertEqual(set(Order.objects.values_list('item_id', flat=True)), {1, 3, 4})
+
+    # Orders take the numbers allocated by the caller, in line order
+    def test_given_numbers(self):
+        results = place_orders(self.client_profile, [{'item': 999, 'quantity': 1}, {'item': 1, 'quantity': 1},
+                                                     {'item': 2, 'quantity': 1}], numbers=[900, 901, 902])
+        self.assertEqual([result.get('orderNo') for result in results], [None, 900, 901])
+        self.assertEqual(Order.objects.get(item_id=2).orderNo, 901)
+
+    # Nothing placed: the request fails
+    def test_all_lines_invalid(self):
+        response = self.post([{'item': 999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+
+    # Suppliers cannot place bulk orders
+    def test_supplier_forbidden(self):
+        self.client.force_login(User.objects.get(username='proveedor'))
+        response = self.post([{'item': 1, 'quantity': 1}])
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,87 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .caching import get_item
+from .models import User, Client, Supplier, Item
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Supplier with one item
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        self.item = Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+
+        # Client user
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        Client.objects.create(user=self.client_user, code='c1', address='calle2')
+        return super().setUp()
+
+    # SQL executed by a request, other than the session and user lookups (and the order
+    # counters, that are not cached)
+    def catalog_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries.captured_queries
+                if ('pedidos_item' in query['sql'] or 'pedidos_supplier' in query['sql']) and 'stats"' not in query['sql']]
+
+class CatalogCacheTest(BaseTest):
+    # Second read of a catalog page does not query items
+    def test_catalog_page_cached(self):
+        self.client.force_login(self.client_user)
+        self.assertTrue(self.catalog_queries(reverse('client-home')))
+        self.assertFalse(self.catalog_queries(reverse('client-home')))
+        self.assertTrue(self.catalog_queries(reverse('client-order-detail', args=[self.item.code])))
+        self.assertFalse(self.catalog_queries(reverse('client-order-detail', args=[self.item.code])))
+
+    # Creating, editing or deleting an item invalidates the cached pages
+    def test_item_changes_invalidate_catalog(self):
+        self.client.force_login(self.client_user)
+        self.client.get(reverse('client-home'))
+        Item.objects.create(code=2, description='otro', price=5.0, supplier=self.supplier)
+        response = self.client.get(reverse('client-home'))
+        self.assertEqual([item.code for item in response.context['items']], [1, 2])
+
+        self.item.price = 99.0
+        self.item.save()
+        self.assertEqual(get_item(1).price, 99.0)
+
+        self.item.delete()
+        response = self.client.get(reverse('client-home'))
+        self.assertEqual([item.code for item in response.context['items']], [2])
+        with self.assertRaises(Item.DoesNotExist):
+            get_item(1)
+
+    # Cached items are only invalidated by the changes of their supplier
+    def test_item_cached_per_supplier(self):
+        other_user = User.objects.create(username='proveedor2', is_supplier=True)
+        other = Supplier.objects.create(user=other_user, address='calle3', items_supplied='items_y')
+        other_item = Item.objects.create(code=2, description='otro', price=5.0, supplier=other)
+        get_item(1)
+        get_item(2)
+        other_item.price = 6.0
+        other_item.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_item(1).price, 10.0)
+        self.assertEqual(get_item(2).price, 6.0)
+
+        # A deleted code used again by another supplier
+        self.item.delete()
+        Item.objects.create(code=1, description='nuevo', price=3.0, supplier=other)
+        self.assertEqual(get_item(1).supplier_id, other.pk)
+        Item.objects.filter(code=1).update(price=4.0)
+        other_item.save()
+        self.assertEqual(get_item(1).price, 4.0)
+
+    # Supplier items are cached per supplier
+    def test_supplier_items_cached(self):
+        self.client.force_login(self.supplier_user)
+        self.assertTrue(self.catalog_queries(reverse('supplier-home')))
+        self.assertFalse(self.catalog_queries(reverse('supplier-home')))
+        self.client.post(reverse('create-item'), {'code': 3, 'description': 'nuevo', 'price': 1.0})
+        response = self.client.get(reverse('supplier-home'))
+        self.assertEqual([item.code for item in response.context['items']], [1, 3])
@@ -0,0 +1,93 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import User, Client, Supplier, Item
+from .views import CATALOG_PAGE_SIZE
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Client - home url (paginated catalog)
+        self.client_items_url = reverse('client-home')
+
+        # Two suppliers publishing items with increasing prices
+        supplier_user = User.objects.create(username='proveedor1', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        other_supplier_user = User.objects.create(username='proveedor2', is_supplier=True)
+        self.other_supplier = Supplier.objects.create(user=other_supplier_user, address='calle2', items_supplied='items_y')
+        Item.objects.bulk_create([
+            Item(code=code, description='articulo %d' % code, price=float(code),
+                 supplier=self.supplier if code % 2 else self.other_supplier)
+            for code in range(1, 121)
+        ])
+
+        # Logged in client user
+        client_user = User.objects.create(username='cliente', is_client=True)
+        Client.objects.create(user=client_user, code='c1', address='calle3')
+        self.client.force_login(client_user)
+
+        return super().setUp()
+
+    def codes(self, response):
+        return [item.code for item in response.context['items']]
+
+class CatalogPaginationTest(BaseTest):
+    # First page lists the lowest codes and links to the next page
+    def test_first_page(self):
+        response = self.client.get(self.client_items_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.codes(response), list(range(1, CATALOG_PAGE_SIZE + 1)))
+        self.assertTrue(response.context['page'].has_next)
+        self.assertFalse(response.context['page'].has_previous)
+        self.assertEqual(response.context['page'].next_cursor, CATALOG_PAGE_SIZE)
+
+    # Following the "after" cursor continues right after the last listed code
+    def test_next_and_previous_page(self):
+        response = self.client.get(self.client_items_url, {'after': 100})
+        self.assertEqual(self.codes(response), list(range(101, 121)))
+        self.assertFalse(response.context['page'].has_next)
+        self.assertTrue(response.context['page'].has_previous)
+
+        response = self.client.get(self.client_items_url, {'before': 101})
+        self.assertEqual(self.codes(response), list(range(101 - CATALOG_PAGE_SIZE, 101)))
+        self.assertTrue(response.context['page'].has_next)
+
+    # A "before" cursor with nothing before it links to no next page
+    def test_empty_previous_page(self):
+        response = self.client.get(self.client_items_url, {'before': 1})
+        self.assertEqual(self.codes(response), [])
+        self.assertFalse(response.context['page'].has_next)
+        self.assertNotContains(response, 'after=None')
+
+    # Invalid cursors are ignored
+    def test_invalid_cursor(self):
+        response = self.client.get(self.client_items_url, {'after': 'abc'})
+        self.assertEqual(self.codes(response)[0], 1)
+
+    # The "has next page" check does not count the whole table
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.client_items_url, {'after': 10})
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries.captured_queries))
+
+class CatalogFilterTest(BaseTest):
+    # Only items from the selected supplier are listed
+    def test_filter_by_supplier(self):
+        response = self.client.get(self.client_items_url, {'supplier': self.supplier.pk})
+        codes = self.codes(response)
+        self.assertTrue(codes)
+        self.assertTrue(all(code % 2 for code in codes))
+
+    # Price range filters are kept in the pagination links
+    def test_filter_by_price_range(self):
+        response = self.client.get(self.client_items_url, {'min_price': 10, 'max_price': 20})
+        self.assertEqual(self.codes(response), list(range(10, 21)))
+        self.assertFalse(response.context['page'].has_next)
+
+        response = self.client.get(self.client_items_url, {'min_price': 10, 'after': 59})
+        self.assertIn('min_price=10', response.context['filter_query'])
+        self.assertNotIn('after', response.context['filter_query'])
+        self.assertEqual(self.codes(response)[0], 60)
@@ -0,0 +1,67 @@
+import json
+from django.test import TestCase
+from django.urls import reverse
+from .models import User, Client, Supplier, Item, Order, ManageOrder, ChangeLogEntry
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        # Change feed url
+        self.changes_url = reverse('change-feed')
+
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=client_user, code='c1', address='calle2')
+        self.staff_user = User.objects.create(username='almacen', is_staff=True)
+        return super().setUp()
+
+    def feed(self, **params):
+        response = self.client.get(self.changes_url, params)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+class ChangeLogTest(BaseTest):
+    # Inserts, updates and deletes are logged with increasing sequence numbers
+    def test_changes_logged(self):
+        item = Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+        order = Order.objects.create(orderNo=7, client=self.client_profile, item=item, quantity=1)
+        ManageOrder.objects.create(orderNo=order, warehouse='almacen')
+        Item.objects.filter(code=1).update(price=20.0)
+        item.delete()
+        entries = list(ChangeLogEntry.objects.order_by('seq').values_list('model', 'object_pk', 'action'))
+        self.assertEqual(entries, [
+            ('item', 1, 'I'), ('order', 7, 'I'), ('manageorder', 7, 'I'), ('item', 1, 'U'),
+            ('manageorder', 7, 'D'), ('order', 7, 'D'), ('item', 1, 'D'),
+        ])
+
+class ChangeFeedTest(BaseTest):
+    # Only staff users can read the feed
+    def test_staff_only(self):
+        self.client.force_login(self.client_profile.user)
+        response = self.client.get(self.changes_url)
+        self.assertEqual(response.status_code, 302)
+
+    # Entries after the cursor come with the current state of the row
+    def test_feed_after_cursor(self):
+        item = Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+        cursor = ChangeLogEntry.objects.latest('seq').seq
+        Order.objects.create(orderNo=7, client=self.client_profile, item=item, quantity=4)
+        Item.objects.create(code=2, description='otro', price=5.0, supplier=self.supplier).delete()
+
+        self.client.force_login(self.staff_user)
+        lines = self.feed(after=cursor)
+        self.assertEqual([(line['model'], line['pk'], line['action']) for line in lines],
+                         [('order', 7, 'insert'), ('item', 2, 'insert'), ('item', 2, 'delete')])
+        self.assertEqual(lines[0]['data']['quantity'], 4)
+        self.assertIsNone(lines[1]['data'])
+        self.assertEqual(self.feed(after=lines[-1]['seq']), [])
+
+    # limit bounds the number of entries, the feed resumes from the last sequence number
+    def test_feed_limit(self):
+        Item.objects.bulk_create([Item(code=code, description='a', price=1.0, supplier=self.supplier) for code in range(1, 11)])
+        self.client.force_login(self.staff_user)
+        first = self.feed(limit=4)
+        self.assertEqual([line['pk'] for line in first], [1, 2, 3, 4])
+        rest = self.feed(after=first[-1]['seq'])
+        self.assertEqual([line['pk'] for line in rest], list(range(5, 11)))
@@ -0,0 +1,104 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .lifecycle import transition
+from .models import User, Client, Supplier, Item, Order
+from .repricing import price_expression, reprice_items
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        self.item = Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+        Item.objects.create(code=2, description='otro articulo', price=5.0, supplier=self.supplier)
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=self.client_user, code='c1', address='calle2')
+
+    # First response with validators, then the same request again with its ETag
+    def revalidate(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+        return etag, self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_catalog(self):
+        self.client.force_login(self.client_user)
+        url = reverse('client-home')
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Changed, added and deleted items change the validators of the catalog
+        for change in (lambda: Item.objects.filter(code=2).get().save(),
+                       lambda: Item.objects.create(code=3, description='nuevo', price=1.0, supplier=self.supplier),
+                       lambda: Item.objects.get(code=3).delete(),
+                       lambda: reprice_items(self.supplier.pk, price_expression(percent=10))):
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+        # Filtered pages have their own validators
+        self.assertNotEqual(self.client.get(url, {'min_price': 6})['ETag'], etag)
+
+    # The page is not rendered again: validators come from the cache (a cached page does
+    # not query the database either)
+    def test_not_modified_queries(self):
+        self.client.force_login(self.client_user)
+        url = reverse('client-home')
+        etag, response = self.revalidate(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('pedidos_item' in query['sql'] for query in queries.captured_queries))
+
+    def test_order_detail(self):
+        self.client.force_login(self.client_user)
+        url = reverse('client-order-detail', args=[1])
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+
+        order = Order.objects.create(client=self.client_profile, item=self.item, quantity=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertTrue(response.context['ordered'])
+        etag = response['ETag']
+        order.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Another user never gets a 304 for the page of the first one
+        other_user = User.objects.create(username='cliente2', is_client=True)
+        Client.objects.create(user=other_user, code='c2', address='calle3')
+        self.client.force_login(other_user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_item_detail(self):
+        self.client.force_login(self.supplier_user)
+        url = reverse('supplier-item-detail', args=[1])
+        order = Order.objects.create(client=self.client_profile, item=self.item, quantity=1)
+        etag, response = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+
+        # Set-based changes of the orders change the validators too
+        def change_client_type():
+            client = Client.objects.get(pk=self.client_profile.pk)
+            client.client_type = Client.PLATINO
+            client.save()
+        for change in (lambda: transition([order.pk], Order.MANAGED), change_client_type, order.delete):
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+        # Items of other suppliers redirect, without validators
+        other_user = User.objects.create(username='otro', is_supplier=True)
+        Supplier.objects.create(user=other_user, address='calle3', items_supplied='items_y')
+        self.client.force_login(other_user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('ETag', response)
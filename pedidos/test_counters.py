@@ -0,0 +1,97 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from .bulk_orders import place_orders
+from .counters import repair_counters
+from .lifecycle import transition
+from .models import User, Client, Supplier, Item, Order, ItemStats, SupplierStats
+
+
+class CounterTest(TestCase):
+    def setUp(self):
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+        Item.objects.create(code=2, description='articulo', price=2.5, supplier=self.supplier)
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=self.client_user, code='c1', address='calle2')
+
+    def counters(self, stats):
+        stats.refresh_from_db()
+        return (stats.orders, stats.quantity, stats.revenue, stats.urgent_orders, stats.pending_orders)
+
+    # Counters follow the orders as they are placed, changed, managed, cancelled and deleted
+    def test_order_changes(self):
+        order = Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=3, is_urgent=True)
+        place_orders(self.client_profile, [{'item': 2, 'quantity': 4}])
+        item, supplier = ItemStats.objects.get(item_id=1), SupplierStats.objects.get(supplier=self.supplier)
+        self.assertEqual(self.counters(item), (1, 3, 30.0, 1, 1))
+        self.assertEqual(self.counters(supplier), (2, 7, 40.0, 1, 2))
+
+        order.quantity = 5
+        order.is_urgent = False
+        order.save()
+        self.assertEqual(self.counters(item), (1, 5, 50.0, 0, 1))
+        transition([1], Order.MANAGED)
+        self.assertEqual(self.counters(item), (1, 5, 50.0, 0, 0))
+        self.assertEqual(self.counters(supplier), (2, 9, 60.0, 0, 1))
+        # Cancelled orders count for nothing
+        transition([2], Order.CANCELLED)
+        self.assertEqual(self.counters(supplier), (1, 5, 50.0, 0, 0))
+
+        Order.objects.get(pk=1).delete()
+        self.assertEqual(self.counters(item), (0, 0, 0.0, 0, 0))
+        self.assertEqual(self.counters(supplier), (0, 0, 0.0, 0, 0))
+
+    # Orders removed after their counters (e.g. tables flushed in any order) leave no counters
+    def test_counters_deleted_first(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=3)
+        ItemStats.objects.all().delete()
+        SupplierStats.objects.all().delete()
+        Order.objects.all().delete()
+        self.assertFalse(ItemStats.objects.exists())
+        self.assertFalse(SupplierStats.objects.exists())
+
+    # Revenue is counted at the price of the orders, counters are deleted with the item
+    def test_item_changes(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=3)
+        item = Item.objects.get(code=1)
+        item.price = 20.0
+        item.save()
+        self.assertEqual(ItemStats.objects.get(item_id=1).revenue, 30.0)
+        other_user = User.objects.create(username='cliente2', is_client=True)
+        other = Client.objects.create(user=other_user, code='c2', address='calle3')
+        Order.objects.create(orderNo=2, client=other, item_id=1, quantity=1)
+        self.assertEqual(ItemStats.objects.get(item_id=1).revenue, 50.0)
+        self.assertEqual(SupplierStats.objects.get(supplier=self.supplier).revenue, 50.0)
+        self.assertEqual(repair_counters(), [])
+        item.delete()
+        self.assertFalse(ItemStats.objects.exists())
+        self.assertEqual(self.counters(SupplierStats.objects.get(supplier=self.supplier)), (0, 0, 0.0, 0, 0))
+
+    def test_dashboard(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=2, quantity=4)
+        self.client.force_login(self.supplier_user)
+        response = self.client.get(reverse('supplier-home'))
+        self.assertEqual([(item.code, item.counters and item.counters.orders) for item in response.context['items']],
+                         [(1, None), (2, 1)])
+        self.assertEqual(response.context['supplier_stats'].revenue, 10.0)
+
+    # Counters changed behind the triggers are reported and fixed
+    def test_repair(self):
+        Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=3)
+        self.assertEqual(repair_counters(), [])
+        ItemStats.objects.filter(item_id=1).update(quantity=7)
+        SupplierStats.objects.all().delete()
+
+        output = StringIO()
+        call_command('repair_counters', '--dry-run', stdout=output)
+        self.assertIn('ItemStats 1: quantity 7 -> 3', output.getvalue())
+        self.assertIn('2 counters drifted', output.getvalue())
+        self.assertEqual(ItemStats.objects.get(item_id=1).quantity, 7)
+
+        call_command('repair_counters', stdout=output)
+        self.assertEqual(self.counters(ItemStats.objects.get(item_id=1)), (1, 3, 30.0, 0, 1))
+        self.assertEqual(self.counters(SupplierStats.objects.get(supplier=self.supplier)), (1, 3, 30.0, 0, 1))
+        self.assertEqual(repair_counters(), [])
@@ -0,0 +1,59 @@
+import csv
+import json
+from datetime import datetime
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from .dispatch import save_dispatch
+from .exports import EXPORT_COLUMNS, export_rows
+from .models import User, Client, Supplier, Item, Order, ManageOrder
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.create(code=1, description='articulo, grande', price=10.0, supplier=supplier)
+        other_user = User.objects.create(username='otro', is_supplier=True)
+        other = Supplier.objects.create(user=other_user, address='calle3', items_supplied='items_y')
+        Item.objects.create(code=2, description='otro articulo', price=5.0, supplier=other)
+        client_user = User.objects.create(username='cliente', is_client=True)
+        client = Client.objects.create(user=client_user, code='c1', address='calle2')
+        second_user = User.objects.create(username='cliente2', is_client=True)
+        second = Client.objects.create(user=second_user, code='c2', address='calle4')
+
+        Order.objects.create(orderNo=1, client=client, item_id=1, quantity=3, is_urgent=True)
+        Order.objects.create(orderNo=2, client=second, item_id=1, quantity=1)
+        Order.objects.create(orderNo=3, client=client, item_id=2, quantity=2)
+        save_dispatch(ManageOrder(orderNo=Order.objects.get(pk=1), warehouse='almacen'))
+        for number, day in ((1, 5), (2, 20), (3, 5)):
+            Order.objects.filter(pk=number).update(created_at=timezone.make_aware(datetime(2024, 3, day, 12)))
+        self.client.force_login(self.supplier_user)
+
+    def test_csv(self):
+        response = self.client.get(reverse('export-orders'))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="pedidos-proveedor.csv"')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], [name for name, field in EXPORT_COLUMNS])
+        # Only the orders of the supplier items, dispatch columns empty when not managed
+        self.assertEqual([row[:4] for row in rows[1:]], [['1', rows[1][1], 'managed', 'cliente'], ['2', rows[2][1], 'placed', 'cliente2']])
+        self.assertEqual(rows[1][6], 'articulo, grande')
+        self.assertEqual(rows[1][15], 'almacen')
+        self.assertEqual(rows[2][14:], ['', '', '', '', ''])
+
+    def test_jsonl_dates(self):
+        response = self.client.get(reverse('export-orders'), {'format': 'jsonl', 'date_from': '2024-03-20', 'date_to': '2024-03-20'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['order'], row['quantity'], row['unit_price']) for row in rows], [(2, 1, 10.0)])
+        self.assertEqual(self.client.get(reverse('export-orders'), {'date_to': '2024-03-19'}).status_code, 200)
+        response = self.client.get(reverse('export-orders'), {'date_from': '2024-03-20', 'date_to': '2024-03-19'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('export-orders'), {'format': 'xml'}).status_code, 400)
+
+    # Orders are read in chunks with one query, only when the rows are consumed
+    def test_streamed(self):
+        rows = export_rows(self.supplier_user.pk, chunk_size=1)
+        with self.assertNumQueries(1):
+            self.assertEqual([row['order'] for row in rows], [1, 2])
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .idempotency import purge_expired_keys
+from .models import User, Client, Supplier, Item, Order, IdempotencyKey
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.bulk_create([
+            Item(code=code, description='articulo %d' % code, price=1.0, supplier=supplier) for code in range(1, 4)
+        ])
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=self.client_user, code='c1', address='calle2')
+        self.client.force_login(self.client_user)
+        return super().setUp()
+
+    # Number of INSERT, UPDATE and DELETE statements run by ``request``
+    def count_writes(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        writes = [query for query in queries if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+        # Session and last login updates are not part of the order creation
+        writes = [query for query in writes if 'django_session' not in query['sql']]
+        return response, len(writes)
+
+class CreateOrderTest(BaseTest):
+    # The order form carries a new idempotency key
+    def test_form_has_key(self):
+        response = self.client.get(reverse('create-order', args=[1]))
+        key = response.context['form']['idempotency_key'].value()
+        self.assertEqual(len(key), 32)
+        response = self.client.get(reverse('create-order', args=[2]))
+        self.assertNotEqual(response.context['form']['idempotency_key'].value(), key)
+
+    # A resubmitted form places the order once and does not write again
+    def test_resubmit(self):
+        url = reverse('create-order', args=[1])
+        data = {'quantity': 2, 'idempotency_key': 'abc'}
+        response = self.client.post(url, data)
+        self.assertRedirects(response, reverse('client-home'), fetch_redirect_response=False)
+        response, writes = self.count_writes(lambda: self.client.post(url, data))
+        self.assertRedirects(response, reverse('client-home'), fetch_redirect_response=False)
+        self.assertEqual(writes, 0)
+        self.assertEqual(Order.objects.filter(client=self.client_profile, item_id=1).count(), 1)
+
+    # Without a key, the database still rejects a second order of the same item
+    def test_second_order_without_key(self):
+        url = reverse('create-order', args=[1])
+        self.client.post(url, {'quantity': 2})
+        response = self.client.post(url, {'quantity': 3})
+        self.assertRedirects(response, reverse('client-home'), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.get(client=self.client_profile, item_id=1).quantity, 2)
+
+class OrderApiTest(BaseTest):
+    def post(self, data, key):
+        return self.client.post(reverse('api-order-list'), data, HTTP_IDEMPOTENCY_KEY=key)
+
+    # A retry with the same key returns the order of the first request
+    def test_retry(self):
+        response = self.post({'item': 1, 'quantity': 3}, 'key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        retry, writes = self.count_writes(lambda: self.post({'item': 1, 'quantity': 3}, 'key-1'))
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(writes, 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+    # Keys belong to a client
+    def test_keys_per_client(self):
+        self.post({'item': 1, 'quantity': 3}, 'key-1')
+        other_user = User.objects.create(username='otro', is_client=True)
+        Client.objects.create(user=other_user, code='c2', address='calle3')
+        self.client.force_login(other_user)
+        response = self.post({'item': 1, 'quantity': 1}, 'key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    # Failed requests are not stored, the retry runs again
+    def test_error_not_stored(self):
+        response = self.post({'item': 99, 'quantity': 3}, 'key-1')
+        self.assertEqual(response.status_code, 400)
+        response = self.post({'item': 1, 'quantity': 3}, 'key-1')
+        self.assertEqual(response.status_code, 201)
+
+    def test_key_too_long(self):
+        response = self.post({'item': 1, 'quantity': 3}, 'k' * 65)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    # A bulk order retried with the same key is placed once
+    def test_bulk_retry(self):
+        url = reverse('api-order-bulk')
+        data = {'lines': [{'item': 1, 'quantity': 1}, {'item': 2, 'quantity': 2}]}
+        response = self.client.post(url, data, content_type='application/json', HTTP_IDEMPOTENCY_KEY='bulk-1')
+        retry = self.client.post(url, data, content_type='application/json', HTTP_IDEMPOTENCY_KEY='bulk-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), response.json())
+        self.assertEqual(Order.objects.count(), 2)
+
+class ExpiryTest(BaseTest):
+    # Expired keys are not replayed and are purged
+    def test_expired_key(self):
+        self.client.post(reverse('api-order-list'), {'item': 1, 'quantity': 3}, HTTP_IDEMPOTENCY_KEY='key-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.client.post(reverse('api-order-list'), {'item': 2, 'quantity': 1}, HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['item'], 2)
+        self.assertEqual(purge_expired_keys(), 0)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired_keys(), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
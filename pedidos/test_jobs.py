@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .jobs import TASKS, Task, claim_job, enqueue, requeue_lost_jobs, run_workers, work
+from .models import User, Client, Supplier, Item, Order, Job
+
+
+def run_due_jobs():
+    return work(threading.Event(), once=True)
+
+
+def flaky_task(using, fail=True):
+    if fail:
+        raise ValueError('fallo')
+
+
+class JobTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(TASKS, {
+            'flaky': Task('flaky', flaky_task, 2, None),
+            'limited': Task('limited', flaky_task, None, 1),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+    # Failed jobs wait for their backoff, twice as long after every attempt, until they fail
+    @override_settings(JOB_RETRY_DELAY=10)
+    def test_retries(self):
+        job = enqueue('flaky')
+        self.assertEqual(job.max_attempts, 2)
+        with self.assertLogs('pedidos.jobs', 'ERROR'):
+            self.assertEqual(run_due_jobs(), {Job.PENDING: 1})
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('ValueError: fallo', job.last_error)
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 10, delta=2)
+        self.assertEqual(run_due_jobs(), {})
+
+        self.due(job)
+        with self.assertLogs('pedidos.jobs', 'ERROR'):
+            self.assertEqual(run_due_jobs(), {Job.FAILED: 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_done(self):
+        job = enqueue('flaky', {'fail': False}, delay=60)
+        self.assertEqual(run_due_jobs(), {})
+        self.due(job)
+        self.assertEqual(run_due_jobs(), {Job.DONE: 1})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.DONE, 1, ''))
+
+    # Jobs of a task at its concurrency limit wait, the other ones run
+    def test_concurrency(self):
+        enqueue('limited')
+        self.assertEqual(claim_job('default', 'worker-1').status, Job.RUNNING)
+        enqueue('limited')
+        self.assertIsNone(claim_job('default', 'worker-2'))
+        other = enqueue('flaky', {'fail': False})
+        self.assertEqual(claim_job('default', 'worker-2'), other)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_lost_jobs(self):
+        job = enqueue('flaky')
+        claim_job('default', 'worker-1')
+        self.assertEqual(requeue_lost_jobs('default'), 0)
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(requeue_lost_jobs('default'), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        claim_job('default', 'worker-2')
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=61))
+        self.assertEqual(requeue_lost_jobs('default'), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+
+class DispatchJobTest(TestCase):
+    def setUp(self):
+        self.label_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.label_dir)
+        settings = override_settings(DISPATCH_LABEL_DIR=self.label_dir, DISPATCH_NOTIFICATION_EMAIL='empresa@example.com')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.create(code=1, description='articulo', price=10.0, supplier=supplier)
+        client_user = User.objects.create(username='cliente', is_client=True)
+        client = Client.objects.create(user=client_user, code='c1', address='calle2')
+        Order.objects.create(orderNo=1, client=client, item_id=1, quantity=3)
+        Order.objects.create(orderNo=2, client=Client.objects.create(
+            user=User.objects.create(username='cliente2', is_client=True), code='c2', address='calle3'), item_id=1, quantity=1)
+        self.client.force_login(supplier_user)
+
+    def label(self, order):
+        with open(os.path.join(self.label_dir, 'pedido-%d.txt' % order), encoding='utf-8') as label:
+            return label.read()
+
+    # The request saves the dispatch and its job, the worker writes the label
+    def test_dispatch(self):
+        response = self.client.post(reverse('manage-order', args=[1, 1]), {'warehouse': 'almacen'})
+        self.assertEqual(response.status_code, 302)
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.payload, job.status), ('process-dispatch', {'order': 1}, Job.PENDING))
+        self.assertEqual(os.listdir(self.label_dir), [])
+
+        with self.assertLogs('pedidos.audit', 'INFO') as audit:
+            self.assertEqual(run_due_jobs(), {Job.DONE: 1})
+        self.assertIn('Order 1 dispatched to distribution center', audit.output[0])
+        self.assertIn('Almacen: almacen', self.label(1))
+        self.assertIn('Cantidad: 3', self.label(1))
+        self.assertEqual(mail.outbox, [])
+
+    # Dispatches to an associated company are notified, also when created through the API
+    def test_associated_company(self):
+        response = self.client.post(reverse('api-manage-order-list'), {'orderNo': 2, 'reference': 'ref', 'details': 'empresa'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Job.objects.get().payload, {'order': 2})
+        with self.assertLogs('pedidos.audit', 'INFO'):
+            run_due_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['empresa@example.com'])
+        self.assertIn('Detalles: empresa', self.label(2))
+
+    # The dispatch form of the supplier keeps the details, so the company is notified
+    def test_associated_company_form(self):
+        response = self.client.post(reverse('manage-order', args=[1, 1]),
+                                    {'reference': 'ref', 'branch_code': 7, 'details': 'empresa'})
+        self.assertEqual(response.status_code, 302)
+        with self.assertLogs('pedidos.audit', 'INFO') as audit:
+            self.assertEqual(run_due_jobs(), {Job.DONE: 1})
+        self.assertIn('Order 1 dispatched to associated company', audit.output[0])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Detalles: empresa', self.label(1))
+
+    # Branch dispatches are not notified
+    def test_branch_form(self):
+        response = self.client.post(reverse('manage-order', args=[1, 1]), {'reference': 'ref', 'branch_code': 7})
+        self.assertEqual(response.status_code, 302)
+        with self.assertLogs('pedidos.audit', 'INFO') as audit:
+            self.assertEqual(run_due_jobs(), {Job.DONE: 1})
+        self.assertIn('Order 1 dispatched to branch', audit.output[0])
+        self.assertEqual(mail.outbox, [])
+
+
+class WorkerTest(TransactionTestCase):
+
+    # Every job runs once with several workers
+    def test_workers(self):
+        ran = []
+        with mock.patch.dict(TASKS, {'count': Task('count', lambda using, number: ran.append(number), None, None)}):
+            for number in range(30):
+                enqueue('count', {'number': number})
+            self.assertEqual(run_workers(concurrency=4, once=True), {Job.DONE: 30})
+        self.assertEqual(sorted(ran), list(range(30)))
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
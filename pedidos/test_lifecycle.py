@@ -0,0 +1,130 @@
+import shutil
+import tempfile
+import threading
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .jobs import work
+from .lifecycle import InvalidTransition, transition
+from .models import User, Client, Supplier, Item, Order, OrderEvent
+
+
+class LifecycleTest(TestCase):
+    def setUp(self):
+        self.label_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.label_dir)
+        settings = override_settings(DISPATCH_LABEL_DIR=self.label_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.create(code=1, description='articulo', price=10.0, supplier=supplier)
+        Item.objects.create(code=2, description='articulo', price=20.0, supplier=supplier)
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        client = Client.objects.create(user=self.client_user, code='c1', address='calle2')
+        Order.objects.create(orderNo=1, client=client, item_id=1, quantity=3)
+        Order.objects.create(orderNo=2, client=client, item_id=2, quantity=1)
+
+    def history(self, order):
+        return list(OrderEvent.objects.filter(order_no=order).order_by('pk').values_list('from_status', 'to_status'))
+
+    # Orders are placed, managed by the supplier and dispatched by the job of the dispatch
+    def test_dispatch(self):
+        self.assertEqual(Order.objects.get(pk=1).status, Order.PLACED)
+        self.client.force_login(self.supplier_user)
+        self.client.post(reverse('manage-order', args=[1, 1]), {'warehouse': 'almacen'})
+        self.assertEqual(Order.objects.get(pk=1).status, Order.MANAGED)
+        # Editing the dispatch keeps the order managed
+        self.client.post(reverse('manage-order', args=[1, 1]), {'warehouse': 'norte'})
+        self.assertEqual(Order.objects.get(pk=1).status, Order.MANAGED)
+
+        work(threading.Event(), once=True)
+        self.assertEqual(Order.objects.get(pk=1).status, Order.DISPATCHED)
+        self.assertEqual(self.history(1), [(None, Order.PLACED), (Order.PLACED, Order.MANAGED),
+                                           (Order.MANAGED, Order.DISPATCHED)])
+
+        # Dispatched orders are closed
+        response = self.client.post(reverse('manage-order', args=[1, 1]), {'warehouse': 'sur'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('not pending (dispatched)', response.context['error'])
+        response = self.client.post(reverse('api-manage-order-list'), {'orderNo': 1, 'warehouse': 'sur'})
+        self.assertEqual(response.status_code, 400)
+
+    # Clients cancel placed orders only, cancelled orders cannot be managed or changed
+    def test_cancel(self):
+        self.client.force_login(self.client_user)
+        response = self.client.post(reverse('api-order-cancel', args=[1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], Order.CANCELLED)
+        self.assertEqual(self.history(1), [(None, Order.PLACED), (Order.PLACED, Order.CANCELLED)])
+        response = self.client.post(reverse('api-order-cancel', args=[1]))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(reverse('api-order-detail', args=[1]), {'quantity': 5}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_login(self.supplier_user)
+        response = self.client.post(reverse('api-manage-order-list'), {'orderNo': 1, 'warehouse': 'almacen'})
+        self.assertIn('not pending (cancelled)', response.data['orderNo'][0])
+        # Cancelled orders leave the queue
+        response = self.client.get(reverse('supplier-queue'))
+        self.assertEqual([order.orderNo for order in response.context['orders']], [2])
+
+    # The order detail cancels placed orders of the client, it does not delete them
+    def test_delete_order_cancels(self):
+        self.client.force_login(self.client_user)
+        url = reverse('delete-order', args=[1, 1])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.get(pk=1).status, Order.CANCELLED)
+        self.assertEqual(self.history(1), [(None, Order.PLACED), (Order.PLACED, Order.CANCELLED)])
+
+        # Managed orders stay as they are
+        transition([2], Order.MANAGED)
+        response = self.client.post(reverse('delete-order', args=[2, 2]))
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('this one is managed', response.context['error'])
+        self.assertEqual(Order.objects.get(pk=2).status, Order.MANAGED)
+
+    # DELETE on the API cancels placed orders, the rest are kept as they are
+    def test_api_delete_cancels(self):
+        self.client.force_login(self.client_user)
+        response = self.client.delete(reverse('api-order-detail', args=[1]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Order.objects.get(pk=1).status, Order.CANCELLED)
+        self.assertEqual(self.history(1), [(None, Order.PLACED), (Order.PLACED, Order.CANCELLED)])
+
+        for status in (Order.MANAGED, Order.DISPATCHED):
+            transition([2], status)
+            response = self.client.delete(reverse('api-order-detail', args=[2]))
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(Order.objects.get(pk=2).status, status)
+        self.assertEqual(self.history(2), [(None, Order.PLACED), (Order.PLACED, Order.MANAGED),
+                                           (Order.MANAGED, Order.DISPATCHED)])
+
+    # Clients cannot cancel the orders of other clients
+    def test_delete_order_of_other_client(self):
+        other_user = User.objects.create(username='cliente2', is_client=True)
+        Client.objects.create(user=other_user, code='c2', address='calle3')
+        self.client.force_login(other_user)
+        response = self.client.post(reverse('delete-order', args=[1, 1]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Order.objects.get(pk=1).status, Order.PLACED)
+
+    # Edits of an order do not write back the status they read
+    def test_edit_keeps_status(self):
+        order = Order.objects.get(pk=1)
+        transition([1], Order.CANCELLED)
+        order.quantity = 7
+        order.save()
+        order = Order.objects.get(pk=1)
+        self.assertEqual((order.quantity, order.status), (7, Order.CANCELLED))
+
+    # Invalid transitions change none of the orders
+    def test_invalid_transition(self):
+        transition([2], Order.MANAGED)
+        with self.assertRaises(InvalidTransition) as raised:
+            transition([1, 2, 3], Order.CANCELLED)
+        self.assertEqual(raised.exception.invalid, {2: Order.MANAGED, 3: None})
+        self.assertEqual(Order.objects.get(pk=1).status, Order.PLACED)
+        self.assertEqual(OrderEvent.objects.filter(to_status=Order.CANCELLED).count(), 0)
+        self.assertEqual(transition([1, 2], Order.MANAGED, unchanged={Order.MANAGED}), 1)
@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from .metrics import ROUTE_METRICS
+from .models import User, Client, Supplier, Item
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ROUTE_METRICS.clear()
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.create(code=1, description='articulo', price=10.0, supplier=supplier)
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        Client.objects.create(user=self.client_user, code='c1', address='calle2')
+        self.staff_user = User.objects.create(username='almacen', is_staff=True)
+
+    # Every response tells its SQL, template and total time
+    def test_server_timing(self):
+        self.client.force_login(self.client_user)
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('client-home'))
+        self.assertRegex(response['Server-Timing'],
+                         r'^sql;desc="4 queries";dur=[\d.]+, template;dur=[\d.]+, total;dur=[\d.]+$')
+
+    # Requests are added to the histograms of their route
+    def test_metrics(self):
+        self.client.force_login(self.client_user)
+        self.client.get(reverse('client-home'))
+        self.client.get(reverse('client-home'))
+        self.client.get('/no-such-page/')
+        self.assertEqual(ROUTE_METRICS['client-home'].duration.count, 2)
+        self.assertGreater(ROUTE_METRICS['client-home'].template_time, 0)
+        self.assertEqual(ROUTE_METRICS['unmatched'].duration.count, 1)
+
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('pedidos_request_duration_seconds_count{route="client-home"} 2', body)
+        self.assertIn('pedidos_request_queries_bucket{route="client-home",le="+Inf"} 2', body)
+        self.assertIn('# TYPE pedidos_request_sql_seconds_total counter', body)
+        self.assertIn('pedidos_cache_misses_total', body)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_access(self):
+        self.client.force_login(self.client_user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+
+    # Slow requests are logged with their SQL
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        self.client.force_login(self.client_user)
+        with self.assertLogs('pedidos.slow_requests', 'WARNING') as log:
+            self.client.get(reverse('client-home'))
+        self.assertIn('Slow request GET / (client-home) 200', log.output[0])
+        self.assertIn('FROM "pedidos_item"', log.output[0])
+        self.assertEqual(ROUTE_METRICS['client-home'].slow, 1)
@@ -1,6 +1,7 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from .models import Client, Supplier, Item, Order, ManageOrder
 
 class BaseTest(TestCase):
       def setUp(self):
@@ -24,3 +25,32 @@ class SupplierTest(BaseTest):
     def test_supplier_cannot_create_item(self):
         response = self.client.get(self.supplier_create_item)
         self.assertEqual(response.status_code, 302)
+
+class ManageOrderTest(TestCase):
+    def setUp(self):
+        supplier_user = get_user_model().objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.create(code=1, description='articulo', price=10.0, supplier=supplier)
+        client_user = get_user_model().objects.create(username='cliente', is_client=True)
+        client = Client.objects.create(user=client_user, code='c1', address='calle2')
+        Order.objects.create(orderNo=1, client=client, item_id=1, quantity=1)
+        self.client.force_login(supplier_user)
+
+    # The dispatch is saved for the order of the url
+    def test_dispatch_to_distribution_center(self):
+        response = self.client.post(reverse('manage-order', args=[1, 1]), {'warehouse': 'almacen'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(ManageOrder.objects.get(orderNo=1).warehouse, 'almacen')
+
+    def test_dispatch_to_associated_company(self):
+        response = self.client.post(reverse('manage-order', args=[1, 1]),
+                                    {'reference': 'ref', 'branch_code': 7, 'details': 'empresa'})
+        self.assertEqual(response.status_code, 302)
+        dispatch = ManageOrder.objects.get(orderNo=1)
+        self.assertEqual((dispatch.branch_code, dispatch.details), (7, 'empresa'))
+
+    def test_dispatch_to_branch(self):
+        response = self.client.post(reverse('manage-order', args=[1, 1]), {'reference': 'ref', 'branch_code': 7})
+        self.assertEqual(response.status_code, 302)
+        dispatch = ManageOrder.objects.get(orderNo=1)
+        self.assertEqual((dispatch.reference, dispatch.branch_code, dispatch.details), ('ref', 7, ''))
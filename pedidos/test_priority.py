@@ -0,0 +1,74 @@
+from django.test import TestCase
+from django.urls import reverse
+from .dispatch import save_dispatch
+from .models import User, Client, Supplier, Item, Order, ManageOrder, PRIORITY_CRITICAL, dispatch_priority
+
+
+class BaseTest(TestCase):
+    def setUp(self):
+        # Supplier queue url
+        self.queue_url = reverse('supplier-queue')
+
+        # Supplier with two items
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        self.item = Item.objects.create(code=1, description='articulo', price=10.0, supplier=supplier)
+        self.other_item = Item.objects.create(code=2, description='articulo', price=20.0, supplier=supplier)
+
+        # Clients of different type
+        self.normal = self.create_client('normal', Client.NORMAL)
+        self.platino = self.create_client('platino', Client.PLATINO)
+
+        return super().setUp()
+
+    def create_client(self, username, client_type):
+        user = User.objects.create(username=username, is_client=True)
+        return Client.objects.create(user=user, code='c', address='calle', client_type=client_type)
+
+class DispatchPriorityTest(BaseTest):
+    # Priority is computed when the order is saved
+    def test_priority_on_save(self):
+        order = Order.objects.create(orderNo=1, client=self.platino, item=self.item, quantity=1,
+                                     is_urgent=True, distribution_center=True)
+        self.assertEqual(order.priority, dispatch_priority(True, True, Client.PLATINO))
+        self.assertTrue(order.is_critical)
+        order = Order.objects.create(orderNo=2, client=self.normal, item=self.item, quantity=1,
+                                     is_urgent=True, distribution_center=True)
+        self.assertFalse(order.is_critical)
+        self.assertLess(order.priority, PRIORITY_CRITICAL)
+
+    # Editing the order recomputes its priority
+    def test_edit_order_updates_priority(self):
+        order = Order.objects.create(orderNo=1, client=self.platino, item=self.item, quantity=1)
+        self.client.force_login(self.platino.user)
+        self.client.post(reverse('edit-order', args=[self.item.code, order.orderNo]),
+                         {'is_urgent': 'on', 'distribution_center': 'on', 'quantity': 3})
+        order.refresh_from_db()
+        self.assertTrue(order.is_critical)
+
+    # Changing the client type updates the priority of all its orders
+    def test_client_type_change_updates_orders(self):
+        Order.objects.create(orderNo=1, client=self.normal, item=self.item, quantity=1, is_urgent=True, distribution_center=True)
+        Order.objects.create(orderNo=2, client=self.normal, item=self.other_item, quantity=1, is_urgent=True)
+        self.normal.client_type = Client.PLATINO
+        self.normal.save()
+        priorities = dict(Order.objects.values_list('orderNo', 'priority'))
+        self.assertEqual(priorities[1], dispatch_priority(True, True, Client.PLATINO))
+        self.assertEqual(priorities[2], dispatch_priority(True, False, Client.PLATINO))
+
+class DispatchQueueTest(BaseTest):
+    # Queue lists pending orders of every item of the supplier by priority
+    def test_queue_order(self):
+        Order.objects.create(orderNo=1, client=self.normal, item=self.item, quantity=1)
+        Order.objects.create(orderNo=2, client=self.platino, item=self.other_item, quantity=1, is_urgent=True, distribution_center=True)
+        Order.objects.create(orderNo=3, client=self.platino, item=self.item, quantity=1, is_urgent=True)
+        managed = Order.objects.create(orderNo=4, client=self.normal, item=self.other_item, quantity=1, is_urgent=True)
+        save_dispatch(ManageOrder(orderNo=managed, warehouse='almacen'))
+
+        self.client.force_login(self.supplier_user)
+        response = self.client.get(self.queue_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([order.orderNo for order in response.context['orders']], [2, 3, 1])
+
+        response = self.client.get(self.queue_url, {'min_priority': PRIORITY_CRITICAL})
+        self.assertEqual([order.orderNo for order in response.context['orders']], [2])
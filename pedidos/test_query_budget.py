@@ -0,0 +1,122 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from .dispatch import save_dispatch
+from .models import User, Client, Supplier, Item, Order, ManageOrder
+from .query_budget import QueryBudgetMixin, route_names
+
+
+class BaseTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        # Supplier with one item
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        self.item = Item.objects.create(code=1, description='articulo', price=10.0, supplier=self.supplier)
+        self.other_item = Item.objects.create(code=2, description='articulo', price=20.0, supplier=self.supplier)
+
+        # Client that ordered the item
+        client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=client_user, code='c1', address='calle2')
+        self.order = Order.objects.create(orderNo=1, client=self.client_profile, item=self.item, quantity=1)
+        save_dispatch(ManageOrder(orderNo=self.order, warehouse='almacen'))
+        # Placed order the client cancels
+        cancel_item = Item.objects.create(code=3, description='articulo', price=30.0, supplier=self.supplier)
+        self.placed_order = Order.objects.create(orderNo=2, client=self.client_profile, item=cancel_item, quantity=1)
+        # Placed order the client cancels from the order detail
+        delete_item = Item.objects.create(code=4, description='articulo', price=40.0, supplier=self.supplier)
+        self.deleted_order = Order.objects.create(orderNo=3, client=self.client_profile, item=delete_item, quantity=1)
+
+        self.staff_user = User.objects.create(username='almacen', is_staff=True)
+        self.supplier_user = supplier_user
+        self.client_user = client_user
+        return super().setUp()
+
+    # Add more orders of other clients to the item (N+1 queries would grow with them)
+    def add_orders(self, count):
+        for number in range(count):
+            user = User.objects.create(username='cliente_extra_%d' % number, is_client=True)
+            client = Client.objects.create(user=user, code='c', address='calle', client_type=Client.PLATINO)
+            Order.objects.create(orderNo=100 + number, client=client, item=self.item, quantity=2, is_urgent=True)
+
+    # Requests issued by the client and the supplier for every named route
+    def requests(self):
+        item, order = self.item.code, self.order.orderNo
+        return [
+            ('client-home', self.client_user, reverse('client-home')),
+            ('catalog-search', self.client_user, reverse('catalog-search') + '?q=art&max_price=15'),
+            ('supplier-home', self.supplier_user, reverse('supplier-home')),
+            ('supplier-queue', self.supplier_user, reverse('supplier-queue')),
+            ('bulk-dispatch', self.supplier_user, reverse('bulk-dispatch') + '?min_priority=1'),
+            ('export-orders', self.supplier_user, reverse('export-orders') + '?format=jsonl&date_from=2020-01-01'),
+            ('login', None, reverse('login')),
+            ('client-signup', None, reverse('client-signup')),
+            ('supplier-signup', None, reverse('supplier-signup')),
+            ('logout', None, reverse('logout')),
+            ('create-item', self.supplier_user, reverse('create-item')),
+            ('import-items', self.supplier_user, reverse('import-items')),
+            ('reprice-items', self.supplier_user, reverse('reprice-items')),
+            ('create-order', self.client_user, reverse('create-order', args=[self.other_item.code])),
+            ('edit-order', self.client_user, reverse('edit-order', args=[item, order])),
+            ('client-order-detail', self.client_user, reverse('client-order-detail', args=[item])),
+            ('supplier-item-detail', self.supplier_user, reverse('supplier-item-detail', args=[item])),
+            ('edit-item', self.supplier_user, reverse('edit-item', args=[item])),
+            ('manage-order', self.supplier_user, reverse('manage-order', args=[item, order])),
+            ('change-feed', self.staff_user, reverse('change-feed')),
+            ('metrics', self.staff_user, reverse('metrics')),
+            ('api-item-list', self.client_user, reverse('api-item-list')),
+            ('api-item-detail', self.client_user, reverse('api-item-detail', args=[item])),
+            ('api-item-search', self.client_user, reverse('api-item-search') + '?q=art'),
+            ('api-order-list', self.supplier_user, reverse('api-order-list')),
+            ('api-order-detail', self.supplier_user, reverse('api-order-detail', args=[order])),
+            ('api-manage-order-list', self.supplier_user, reverse('api-manage-order-list')),
+            ('api-manage-order-detail', self.supplier_user, reverse('api-manage-order-detail', args=[order])),
+            ('api-order-bulk', self.client_user, reverse('api-order-bulk'),
+             {'lines': [{'item': self.other_item.code, 'quantity': 1}, {'item': 999, 'quantity': 1}]}),
+            # Before the bulk dispatch, that dispatches the placed orders
+            ('delete-order', self.client_user, reverse('delete-order', args=[4, self.deleted_order.orderNo]), {}),
+            ('api-order-cancel', self.client_user, reverse('api-order-cancel', args=[self.placed_order.orderNo]), {}),
+            ('api-manage-order-bulk', self.supplier_user, reverse('api-manage-order-bulk'),
+             {'destination': 'branch', 'reference': 'r1', 'branch_code': 7}),
+            ('delete-item', self.supplier_user, reverse('delete-item', args=[item])),
+        ]
+
+    # GET the url, or POST the data as JSON when given
+    def get(self, route_name, user, url, data=None):
+        # Budgets are measured with a cold cache
+        cache.clear()
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        with self.assertWithinQueryBudget(route_name) as queries:
+            if data is None:
+                response = self.client.get(url)
+            else:
+                response = self.client.post(url, data, content_type='application/json')
+        self.assertLess(response.status_code, 400)
+        return len(queries.captured_queries)
+
+
+class QueryBudgetTest(BaseTest):
+    # Every named route must declare a query budget
+    def test_all_routes_have_budget(self):
+        missing = set(route_names()) - set(self.query_budgets)
+        self.assertFalse(missing, 'Routes without query budget: %s' % ', '.join(sorted(missing)))
+
+    # Every route stays within its budget
+    def test_routes_within_budget(self):
+        requested = set()
+        for route_name, user, url, *data in self.requests():
+            with self.subTest(route=route_name):
+                self.get(route_name, user, url, *data)
+            requested.add(route_name)
+        self.assertEqual(requested, set(route_names()))
+
+    # The number of queries does not grow with the number of orders of the item
+    def test_queries_do_not_grow_with_orders(self):
+        # Requests that change data are left out, they cannot be repeated
+        requests = [request for request in self.requests()[:-2] if len(request) == 3]
+        few = {route_name: self.get(route_name, user, url) for route_name, user, url in requests}
+        self.add_orders(20)
+        many = {route_name: self.get(route_name, user, url) for route_name, user, url in requests}
+        self.assertEqual(few, many)
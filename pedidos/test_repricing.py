@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .caching import catalog_version
+from .models import User, Client, Supplier, Item, Order, ItemPriceChange
+from .repricing import preview_repricing, price_expression, reprice_items
+
+
+class RepricingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=self.supplier_user, address='calle1', items_supplied='items_x')
+        other_user = User.objects.create(username='otro', is_supplier=True)
+        other = Supplier.objects.create(user=other_user, address='calle3', items_supplied='items_y')
+        Item.objects.create(code=1, description='cable rojo', price=10.0, supplier=self.supplier)
+        Item.objects.create(code=2, description='cable azul', price=3.0, supplier=self.supplier)
+        Item.objects.create(code=3, description='enchufe', price=20.0, supplier=self.supplier)
+        Item.objects.create(code=4, description='cable', price=10.0, supplier=other)
+        client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=client_user, code='c1', address='calle2')
+
+    def prices(self):
+        return dict(Item.objects.values_list('code', 'price'))
+
+    # Every item is repriced by one UPDATE, orders keep their price and the changes are recorded
+    def test_reprice(self):
+        order = Order.objects.create(orderNo=1, client=self.client_profile, item_id=1, quantity=2)
+        self.assertEqual(order.unit_price, 10.0)
+        version = catalog_version(self.supplier.pk)
+        cheaper = lambda items: items.filter(code__lte=2)
+        self.assertEqual(preview_repricing(self.supplier.pk, price_expression(percent=12.5), cheaper)[0], 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reprice_items(self.supplier.pk, price_expression(percent=12.5), cheaper), 2)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(self.prices(), {1: 11.25, 2: 3.38, 3: 20.0, 4: 10.0})
+        self.assertNotEqual(catalog_version(self.supplier.pk), version)
+
+        order.refresh_from_db()
+        self.assertEqual(order.unit_price, 10.0)
+        self.assertEqual(sorted(ItemPriceChange.objects.values_list('item_code', 'old_price', 'new_price')),
+                         [(1, 10.0, 11.25), (2, 3.0, 3.38)])
+
+    # Prices never go below zero
+    def test_amount(self):
+        reprice_items(self.supplier.pk, price_expression(amount=-5))
+        self.assertEqual(self.prices(), {1: 5.0, 2: 0.0, 3: 15.0, 4: 10.0})
+
+    def test_view(self):
+        self.client.force_login(self.supplier_user)
+        data = {'change': 'percent', 'value': '-10', 'description': 'cable', 'code_to': '2'}
+        response = self.client.post(reverse('reprice-items'), data)
+        count, items = response.context['preview']
+        self.assertEqual((count, [(item.code, item.new_price) for item in items]), (2, [(1, 9.0), (2, 2.7)]))
+        self.assertEqual(self.prices()[1], 10.0)
+
+        response = self.client.post(reverse('reprice-items'), {**data, 'action': 'apply'})
+        self.assertEqual(response.context['repriced'], 2)
+        self.assertEqual(self.prices(), {1: 9.0, 2: 2.7, 3: 20.0, 4: 10.0})
+
+        response = self.client.post(reverse('reprice-items'), {'change': 'percent', 'value': '-150'})
+        self.assertIn('value', response.context['form'].errors)
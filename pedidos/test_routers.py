@@ -0,0 +1,290 @@
+import json
+from unittest import mock
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .middleware import PINNED_COOKIE
+from .bulk_items import import_items
+from .counters import repair_counters
+from .models import User, Client, Supplier, Item, Order, ManageOrder, IdempotencyKey, ItemStats
+from .routers import DatabaseRouter, RoutingState, migrating_database, routing_state
+from .sequences import SequenceAllocator, order_number_floor
+from .shards import sync_shards
+
+SHARDED_SUPPLIER = 100
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], SUPPLIER_SHARDS={'shard1': [SHARDED_SUPPLIER]})
+class RouterTest(SimpleTestCase):
+    router = DatabaseRouter()
+
+    def loaded(self, obj, database):
+        obj._state.adding = False
+        obj._state.db = database
+        return obj
+
+    def test_replica_reads(self):
+        state = RoutingState()
+        token = routing_state.set(state)
+        self.addCleanup(routing_state.reset, token)
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+        state.replica = True
+        self.assertEqual(self.router.db_for_read(Item), 'replica1')
+        self.assertIsNone(self.router.db_for_read(Session))
+        # Writes go to the default database, and so do the reads that follow them
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+
+    # A client that wrote recently does not read from a replica
+    def test_pinned(self):
+        state = RoutingState(pinned=True)
+        state.replica = True
+        token = routing_state.set(state)
+        self.addCleanup(routing_state.reset, token)
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+
+    # Rows follow their parent, rows read from a replica are written to the default database
+    def test_shards(self):
+        item = Item(code=1, supplier_id=SHARDED_SUPPLIER)
+        self.assertEqual(self.router.db_for_write(Item, instance=item), 'shard1')
+        self.assertEqual(self.router.db_for_write(Item, instance=Item(code=2, supplier_id=1)), 'default')
+        order = Order(item=self.loaded(item, 'shard1'), client_id=1)
+        self.assertEqual(self.router.db_for_write(Order, instance=order), 'shard1')
+        self.assertEqual(self.router.db_for_write(ManageOrder, instance=ManageOrder(orderNo=self.loaded(order, 'shard1'))), 'shard1')
+        self.assertEqual(self.router.db_for_read(Order, instance=item), 'shard1')
+        replica_item = self.loaded(Item(code=3, supplier_id=1), 'replica1')
+        self.assertEqual(self.router.db_for_write(Item, instance=replica_item), 'default')
+
+    # The data migrations use the database being migrated
+    def test_migrating(self):
+        token = migrating_database.set('shard1')
+        self.addCleanup(migrating_database.reset, token)
+        self.assertEqual(self.router.db_for_write(Order), 'shard1')
+        self.assertEqual(self.router.db_for_read(Item), 'shard1')
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    # A failed migrate does not leave the router on the database it was migrating
+    def test_failed_migration(self):
+        def fail(*args, **options):
+            self.assertEqual(migrating_database.get(), 'shard1')
+            raise RuntimeError
+
+        with mock.patch('django.core.management.commands.migrate.Command.handle', side_effect=fail):
+            with self.assertRaises(RuntimeError):
+                call_command('migrate', database='shard1', verbosity=0)
+        self.assertIsNone(migrating_database.get())
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+
+    def test_relations(self):
+        shard_item = self.loaded(Item(code=1, supplier_id=SHARDED_SUPPLIER), 'shard1')
+        default_order = self.loaded(Order(orderNo=1), 'default')
+        self.assertFalse(self.router.allow_relation(shard_item, default_order))
+        self.assertTrue(self.router.allow_relation(shard_item, Order()))
+        self.assertTrue(self.router.allow_relation(self.loaded(Client(), 'default'), self.loaded(Order(), 'shard1')))
+        self.assertTrue(self.router.allow_relation(self.loaded(Item(), 'replica1'), default_order))
+
+
+class RoutingTest(TransactionTestCase):
+
+    def create_users(self):
+        cache.clear()
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        self.supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        self.client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=self.client_user, code='c1', address='calle2')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaTest(RoutingTest):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        self.create_users()
+        Item.objects.create(code=1, description='articulo', price=1.0, supplier=self.supplier)
+        self.client.force_login(self.client_user)
+
+    # Queries on the pedidos tables of each database
+    def order_detail(self):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.client.get(reverse('client-order-detail', args=[1]))
+        return response, [[query['sql'] for query in queries if 'pedidos_order' in query['sql']] for queries in (default, replica)]
+
+    def test_read_your_writes(self):
+        response, (default, replica) = self.order_detail()
+        self.assertFalse(response.context['ordered'])
+        # The validators of the page (see conditional.py) and the page read the order
+        self.assertEqual((len(default), len(replica)), (0, 2))
+
+        response = self.client.post(reverse('create-order', args=[1]), {'quantity': 2})
+        self.assertIn(PINNED_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PINNED_COOKIE]['max-age'], settings.REPLICA_MAX_LAG)
+        response, (default, replica) = self.order_detail()
+        self.assertTrue(response.context['ordered'])
+        self.assertEqual((len(default), len(replica)), (2, 0))
+
+    # Writes always go to the default database
+    def test_views_without_replica_reads(self):
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            self.client.get(reverse('create-order', args=[1]))
+        self.assertEqual(len(replica), 0)
+
+
+@override_settings(SUPPLIER_SHARDS={'shard1': [SHARDED_SUPPLIER]})
+class ShardTest(RoutingTest):
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        self.create_users()
+        shard_user = User.objects.create(pk=SHARDED_SUPPLIER, username='grande', is_supplier=True)
+        self.shard_supplier = Supplier.objects.create(user=shard_user, address='calle3', items_supplied='items_y')
+        Item.objects.create(code=1, description='articulo', price=1.0, supplier=self.supplier)
+        Item.objects.create(code=3, description='articulo', price=1.0, supplier=self.supplier)
+
+    def test_accounts_copied(self):
+        self.assertEqual(User.objects.using('shard1').count(), 3)
+        self.assertEqual(Client.objects.using('shard1').get().address, 'calle2')
+        self.client_profile.address = 'calle4'
+        self.client_profile.save()
+        self.assertEqual(Client.objects.using('shard1').get().address, 'calle4')
+        self.client_user.delete()
+        self.assertFalse(Client.objects.using('shard1').exists())
+
+    # Items, orders and dispatches of the supplier are kept in its shard
+    def test_order_flow(self):
+        self.client.force_login(self.shard_supplier.user)
+        self.client.post(reverse('create-item'), {'code': 2, 'description': 'grande', 'price': 5.0})
+        self.assertFalse(Item.objects.filter(code=2).exists())
+        self.assertEqual(Item.objects.using('shard1').get().supplier_id, SHARDED_SUPPLIER)
+        response = self.client.get(reverse('supplier-home'))
+        self.assertEqual([item.code for item in response.context['items']], [2])
+
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('client-home'))
+        self.assertEqual([item.code for item in response.context['items']], [1, 2, 3])
+        response = self.client.post(reverse('create-order', args=[2]), {'quantity': 2, 'idempotency_key': 'abc'})
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.using('shard1').get()
+        self.assertTrue(IdempotencyKey.objects.using('shard1').filter(key='abc').exists())
+        self.assertFalse(Order.objects.exists())
+        response = self.client.get(reverse('client-order-detail', args=[2]))
+        self.assertEqual(response.context['order'], order)
+
+        self.client.force_login(self.shard_supplier.user)
+        response = self.client.get(reverse('supplier-item-detail', args=[2]))
+        self.assertEqual(list(response.context['orders']), [order])
+        self.client.post(reverse('manage-order', args=[2, order.orderNo]), {'warehouse': 'almacen'})
+        self.assertEqual(ManageOrder.objects.using('shard1').get().warehouse, 'almacen')
+
+    # The client API reaches the items and orders of every database, the order and its
+    # idempotency key are written to the shard of the item
+    def test_client_api(self):
+        Item.objects.using('shard1').create(code=2, description='grande', price=5.0, supplier=self.shard_supplier)
+        Item.objects.using('shard1').create(code=4, description='grande', price=6.0, supplier=self.shard_supplier)
+        self.client.force_login(self.client_user)
+        response = self.client.get(reverse('api-item-list'), {'page_size': 3})
+        self.assertEqual([item['code'] for item in response.data['results']], [1, 2, 3])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['code'] for item in response.data['results']], [4])
+        self.assertEqual(self.client.get(reverse('api-item-detail', args=[2])).data['price'], 5.0)
+
+        for attempt in range(2):
+            response = self.client.post(reverse('api-order-list'), {'item': 2, 'quantity': 1}, HTTP_IDEMPOTENCY_KEY='k1')
+            self.assertEqual(response.status_code, 201)
+        order = Order.objects.using('shard1').get()
+        self.assertEqual(response.data['orderNo'], order.orderNo)
+        self.assertTrue(IdempotencyKey.objects.using('shard1').filter(key='k1').exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        response = self.client.post(reverse('api-order-bulk'), {'lines': [{'item': 4, 'quantity': 1}, {'item': 1, 'quantity': 1}]},
+                                    content_type='application/json', HTTP_IDEMPOTENCY_KEY='k2')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'error'])
+        self.assertIn('another database', response.data['results'][1]['errors']['item'][0])
+        self.assertEqual(Order.objects.using('shard1').count(), 2)
+        self.assertTrue(IdempotencyKey.objects.using('shard1').filter(key='k2').exists())
+
+        response = self.client.get(reverse('api-order-list'))
+        self.assertEqual([order['item'] for order in response.data['results']], [2, 4])
+        response = self.client.post(reverse('api-order-cancel', args=[order.orderNo]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.using('shard1').get(pk=order.pk).status, Order.CANCELLED)
+
+    # The change feed merges the change logs of every database
+    def test_change_feed(self):
+        staff_user = User.objects.create(username='almacen', is_staff=True)
+        self.client.force_login(staff_user)
+
+        def feed(**params):
+            response = self.client.get(reverse('change-feed'), params)
+            return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+        # Sequence numbers of the default database and of the shard
+        cursor = feed()[-1]['cursor']
+        self.assertRegex(cursor, r'^\d+\.0$')
+        # Changes at the same time are ordered by database (the default one first)
+        Item.objects.filter(code=1).update(price=2.0)
+        item = Item.objects.using('shard1').create(code=2, description='grande', price=5.0, supplier=self.shard_supplier)
+        Order(client=self.client_profile, item=item, quantity=1).save()
+        lines = feed(after=cursor, limit=2)
+        self.assertEqual([(line['database'], line['model'], line['pk']) for line in lines],
+                         [('default', 'item', 1), ('shard1', 'item', 2)])
+        self.assertEqual(lines[0]['data']['price'], 2.0)
+        lines = feed(after=lines[-1]['cursor'])
+        self.assertEqual([(line['database'], line['model']) for line in lines], [('shard1', 'order')])
+        self.assertEqual(lines[0]['data']['item'], 2)
+        self.assertEqual(feed(after=lines[-1]['cursor']), [])
+
+    # Item codes are unique across databases
+    def test_duplicate_code(self):
+        self.client.force_login(self.supplier.user)
+        Item.objects.using('shard1').create(code=2, description='grande', price=5.0, supplier=self.shard_supplier)
+        response = self.client.post(reverse('create-item'), {'code': 2, 'description': 'otro', 'price': 1.0})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('code', response.context['form'].errors)
+
+    # Imported items are kept in the shard, codes of the other databases are rejected
+    def test_import_items(self):
+        result = import_items(SHARDED_SUPPLIER, [(2, {'code': 2, 'description': 'grande', 'price': 5}),
+                                                 (3, {'code': 3, 'description': 'otro', 'price': 1})])
+        self.assertEqual((result['created'], result['failed']), (1, 1))
+        self.assertEqual(result['errors'][0]['code'], 3)
+        self.assertEqual(Item.objects.using('shard1').get().code, 2)
+
+    # Order numbers continue after the highest one of every database
+    def test_order_number_floor(self):
+        item = Item.objects.using('shard1').create(code=2, description='grande', price=5.0, supplier=self.shard_supplier)
+        Order(orderNo=700, client=self.client_profile, item=item, quantity=1).save()
+        Order.objects.create(orderNo=500, client=self.client_profile, item_id=1, quantity=1)
+        allocator = SequenceAllocator('order', block_size=10, floor=order_number_floor)
+        self.assertEqual(allocator.allocate(), [701])
+
+    def test_client_type_priority(self):
+        item = Item.objects.using('shard1').create(code=2, description='grande', price=5.0, supplier=self.shard_supplier)
+        Order(client=self.client_profile, item=item, quantity=1, is_urgent=True).save()
+        priority = Order.objects.using('shard1').get().priority
+        self.client_profile.client_type = Client.PLATINO
+        self.client_profile.save()
+        self.assertGreater(Order.objects.using('shard1').get().priority, priority)
+
+    # Rows move to the database of their supplier
+    def test_sync_shards(self):
+        item = Item.objects.get(code=1)
+        order = Order.objects.create(client=self.client_profile, item=item, quantity=1)
+        ManageOrder.objects.create(orderNo=order, warehouse='almacen')
+        with override_settings(SUPPLIER_SHARDS={'shard1': [SHARDED_SUPPLIER, self.supplier.pk]}):
+            self.assertEqual(sync_shards(), {'shard1': 4})
+        self.assertFalse(Item.objects.exists())
+        self.assertEqual(ManageOrder.objects.using('shard1').get().orderNo_id, order.orderNo)
+        # Order counters move with the orders
+        self.assertEqual(ItemStats.objects.using('shard1').get(item_id=1).orders, 1)
+        self.assertFalse(ItemStats.objects.exists())
+        self.assertEqual((repair_counters('default'), repair_counters('shard1')), ([], []))
+        self.assertEqual(sync_shards(), {'default': 4})
+        self.assertEqual(Item.objects.count(), 2)
+        self.assertFalse(Order.objects.using('shard1').exists())
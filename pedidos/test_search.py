@@ -0,0 +1,80 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from .models import User, Client, Supplier, Item
+from .search import search_items
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        first = User.objects.create(username='proveedor1', is_supplier=True)
+        second = User.objects.create(username='proveedor2', is_supplier=True)
+        self.first = Supplier.objects.create(user=first, address='calle1', items_supplied='cables')
+        self.second = Supplier.objects.create(user=second, address='calle2', items_supplied='cables')
+        Item.objects.bulk_create([
+            Item(code=1, description='Cable eléctrico de cobre, cable flexible', price=10.0, supplier=self.first),
+            Item(code=2, description='Cable de red para oficina y almacén con conectores de cobre', price=50.0, supplier=self.second),
+            Item(code=3, description='Tornillo de acero', price=1.0, supplier=self.first),
+            Item(code=4, description='Cabezal de taladro', price=80.0, supplier=self.second),
+        ])
+
+    def codes(self, text, **filters):
+        return [item.code for item in search_items(text, **filters)]
+
+    # Best matches first, every word must match
+    def test_ranking(self):
+        self.assertEqual(self.codes('cable'), [1, 2])
+        self.assertEqual(self.codes('cable cobre'), [1, 2])
+        self.assertEqual(self.codes('cable acero'), [])
+        self.assertLess(search_items('cable')[0].rank, 0)
+
+    # Words match as prefixes and accents are ignored (short descriptions rank higher)
+    def test_prefix(self):
+        self.assertEqual(self.codes('cab'), [1, 4, 2])
+        self.assertEqual(self.codes('ELECTRICO'), [1])
+        self.assertEqual(self.codes('almacen'), [2])
+
+    def test_filters(self):
+        self.assertEqual(self.codes('cab', supplier=self.second.pk), [4, 2])
+        self.assertEqual(self.codes('cab', min_price=20, max_price=60), [2])
+
+    # Broad searches rank the newest matches that pass the filters
+    def test_rank_window(self):
+        with mock.patch('pedidos.search.SEARCH_RANK_WINDOW', 1):
+            self.assertEqual(self.codes('cab'), [4])
+            self.assertEqual(self.codes('cab', supplier=self.first.pk), [1])
+
+    # Search operators and quotes are plain words
+    def test_syntax(self):
+        self.assertEqual(self.codes('cable AND "NEAR'), [])
+        self.assertEqual(self.codes('  ,; '), [])
+
+    # The index follows the item changes
+    def test_sync(self):
+        item = Item.objects.get(code=3)
+        item.description = 'Cable de acero'
+        item.save()
+        self.assertEqual(self.codes('tornillo'), [])
+        self.assertEqual(self.codes('cable acero'), [3])
+        item.delete()
+        self.assertEqual(self.codes('acero'), [])
+
+    # Without the index the descriptions are scanned
+    def test_fallback(self):
+        with mock.patch('pedidos.search._unindexed', {'default'}):
+            items = search_items('cab', max_price=60)
+        self.assertEqual([item.code for item in items], [1, 2])
+        self.assertIsNone(items[0].rank)
+
+    def test_views(self):
+        user = User.objects.create(username='cliente', is_client=True)
+        Client.objects.create(user=user, code='c1', address='calle3')
+        self.client.force_login(user)
+        response = self.client.get(reverse('catalog-search'), {'q': 'cable', 'supplier': self.second.pk})
+        self.assertEqual([item.code for item in response.context['items']], [2])
+        response = self.client.get(reverse('api-item-search'), {'q': 'cab', 'max_price': 60})
+        self.assertEqual([item['code'] for item in response.json()], [1, 2])
+        response = self.client.get(reverse('api-item-search'), {'min_price': -1})
+        self.assertEqual(response.status_code, 400)
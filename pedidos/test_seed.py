@@ -0,0 +1,36 @@
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from .models import Client, Supplier, Item, Order, dispatch_priority
+from .seed import seed
+
+
+class SeedTest(TestCase):
+    # Orders respect the one order per client and item constraint and get their priority
+    def test_seed(self):
+        created = seed(3, 50, 20, 400, random_seed=1)
+        self.assertEqual(created, {'suppliers': 3, 'items': 50, 'clients': 20, 'orders': 400})
+        self.assertEqual(Order.objects.count(), 400)
+        self.assertEqual(Order.objects.values('client', 'item').distinct().count(), 400)
+        order = Order.objects.select_related('client').first()
+        self.assertEqual(order.priority, dispatch_priority(order.is_urgent, order.distribution_center,
+                                                           order.client.client_type))
+        # Seeding again adds new rows
+        seed(1, 10, 5, 10, random_seed=1)
+        self.assertEqual(Item.objects.count(), 60)
+        self.assertEqual(Supplier.objects.count(), 4)
+
+    def test_too_many_orders(self):
+        with self.assertRaises(ValueError):
+            seed(1, 2, 2, 5)
+
+class SeedDataCommandTest(TestCase):
+    def test_command(self):
+        output = StringIO()
+        call_command('seed_data', suppliers=2, items=20, clients=10, orders=100, seed=0, stdout=output)
+        self.assertIn('100 orders', output.getvalue())
+        self.assertEqual(Client.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 100)
+        with self.assertRaises(CommandError):
+            call_command('seed_data', items=1, clients=1, orders=2, stdout=output)
@@ -0,0 +1,84 @@
+import threading
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from .models import User, Client, Supplier, Item, Order, Sequence
+from .sequences import order_number_floor, SequenceAllocator
+
+
+class AllocatorTest(TransactionTestCase):
+    # Blocks are only kept outside transactions, TestCase runs every test in one
+
+    # Numbers come from one block until it runs out
+    def test_blocks(self):
+        allocator = SequenceAllocator('test', block_size=10)
+        self.assertEqual(allocator.allocate(), [1])
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate(9), list(range(2, 11)))
+        # One UPDATE and one SELECT (and the transaction)
+        with self.assertNumQueries(4):
+            self.assertEqual(allocator.allocate(25), list(range(11, 36)))
+        self.assertEqual(Sequence.objects.get(name='test').next_value, 36)
+
+    # Processes reserve different blocks
+    def test_processes(self):
+        first = SequenceAllocator('test', block_size=5)
+        second = SequenceAllocator('test', block_size=5)
+        numbers = []
+        for _ in range(12):
+            numbers += first.allocate() + second.allocate(2)
+        self.assertEqual(len(set(numbers)), 36)
+
+    # Threads of a process share its blocks
+    def test_threads(self):
+        allocator = SequenceAllocator('test', block_size=7)
+        numbers = []
+
+        def work():
+            for _ in range(200):
+                numbers.extend(allocator.allocate())
+            connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(numbers)), 1600)
+
+    # A block reserved by a rolled back transaction is not kept
+    def test_rollback(self):
+        first = SequenceAllocator('test', block_size=10)
+        second = SequenceAllocator('test', block_size=10)
+        try:
+            with transaction.atomic():
+                rolled_back = first.allocate()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        numbers = second.allocate(10)
+        self.assertIn(rolled_back[0], numbers)
+        self.assertFalse(set(first.allocate(10)) & set(numbers))
+
+class OrderNumberTest(TestCase):
+    def setUp(self):
+        supplier_user = User.objects.create(username='proveedor', is_supplier=True)
+        supplier = Supplier.objects.create(user=supplier_user, address='calle1', items_supplied='items_x')
+        Item.objects.bulk_create([
+            Item(code=code, description='articulo %d' % code, price=1.0, supplier=supplier) for code in range(1, 4)
+        ])
+        client_user = User.objects.create(username='cliente', is_client=True)
+        self.client_profile = Client.objects.create(user=client_user, code='c1', address='calle2')
+        return super().setUp()
+
+    # Orders saved without a number get the next one
+    def test_order_numbered_on_save(self):
+        first = Order.objects.create(client=self.client_profile, item_id=1, quantity=1)
+        second = Order.objects.create(client=self.client_profile, item_id=2, quantity=1)
+        self.assertIsNotNone(first.orderNo)
+        self.assertGreater(second.orderNo, first.orderNo)
+
+    # Numbers given by hand are skipped
+    def test_floor(self):
+        Order.objects.create(orderNo=500, client=self.client_profile, item_id=1, quantity=1)
+        allocator = SequenceAllocator('order', block_size=10, floor=order_number_floor)
+        self.assertEqual(allocator.allocate(), [501])
@@ -0,0 +1,92 @@
+import os
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from mobilender.sqlite3.base import DatabaseWrapper
+from .models import Sequence
+from .writes import serialized_write
+
+
+@override_settings(WRITE_RETRIES=2, WRITE_RETRY_DELAY=0)
+class SerializedWriteTest(TransactionTestCase):
+
+    def failing(self, *errors):
+        # Raises the errors in turn, then writes a row
+        errors = list(errors)
+
+        def write():
+            if errors:
+                raise errors.pop(0)
+            return Sequence.objects.create(name='test')
+        return write
+
+    # A locked database is retried
+    def test_retry(self):
+        write = self.failing(OperationalError('database is locked'), OperationalError('database is locked'))
+        self.assertEqual(serialized_write(write).name, 'test')
+
+    # After the retries the error is raised
+    def test_retries_exhausted(self):
+        write = self.failing(*[OperationalError('database is locked')] * 3)
+        with self.assertRaises(OperationalError):
+            serialized_write(write)
+        self.assertFalse(Sequence.objects.exists())
+
+    # Other errors are not retried
+    def test_other_errors(self):
+        write = self.failing(OperationalError('no such table: pedidos_sequence'))
+        with self.assertRaises(OperationalError):
+            serialized_write(write)
+
+    # Inside a transaction of the caller the lock cannot be retried
+    def test_outer_transaction(self):
+        write = self.failing(OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            serialized_write(write)
+
+    @override_settings(SERIALIZE_WRITES=True)
+    def test_serialized(self):
+        lock = mock.MagicMock()
+        with mock.patch.dict('pedidos.writes.WRITE_LOCKS', {'default': lock}):
+            self.assertEqual(serialized_write(self.failing()).name, 'test')
+        lock.__enter__.assert_called_once()
+
+
+class BackendTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'test.sqlite3')
+
+    def wrapper(self):
+        wrapper = DatabaseWrapper({
+            **settings.DATABASES['default'], 'NAME': self.name, 'TIME_ZONE': None,
+            'OPTIONS': {**settings.SQLITE_PRODUCTION_OPTIONS,
+                        'pragmas': {**settings.SQLITE_PRODUCTION_OPTIONS['pragmas'], 'busy_timeout': 0}},
+        })
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    # The pragmas are set on every new connection
+    def test_pragmas(self):
+        cursor = self.wrapper().cursor()
+        cursor.execute('PRAGMA journal_mode')
+        self.assertEqual(cursor.fetchone()[0], 'wal')
+        cursor.execute('PRAGMA busy_timeout')
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    # Transactions take the write lock when they start, before their first write
+    def test_immediate_transactions(self):
+        first, second = self.wrapper(), self.wrapper()
+        first.cursor().execute('CREATE TABLE test (id INTEGER)')
+        # What transaction.atomic() does on SQLite
+        first.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        first.cursor().execute('SELECT * FROM test')
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            second.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        first.rollback()
+        first.set_autocommit(True)
+        second.cursor().execute('INSERT INTO test VALUES (1)')
@@ -1,16 +1,23 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
+from .api import router
 #from django.contrib.auth import views as auth_views
 
 
 urlpatterns = [
     path("", views.client_home, name="client-home"),
+    path("search/", views.catalog_search, name="catalog-search"),
     path("supplier/", views.supplier_home, name="supplier-home"),
+    path("supplier/queue/", views.supplier_queue, name="supplier-queue"),
+    path("supplier/queue/dispatch/", views.bulk_dispatch, name="bulk-dispatch"),
+    path("supplier/orders/export/", views.export_orders, name="export-orders"),
     path("login/", views.LoginView.as_view(), name="login"),
     path("signup/client/", views.ClientSignUpView.as_view(), name="client-signup"),
     path("signup/supplier/", views.SupplierSignUpView.as_view(), name="supplier-signup"),
     path('logout/', views.LogoutView.as_view(template_name="pedidos/logout.html"), name="logout"),
     path("supplier/item/create/", views.create_item, name="create-item"),
+    path("supplier/item/import/", views.import_items, name="import-items"),
+    path("supplier/item/reprice/", views.reprice_items, name="reprice-items"),
     path("item/<int:item_id>/order/", views.create_order, name="create-order"),
     path("item/<int:item_id>/order/edit/<int:order_id>/", views.edit_order, name="edit-order"),
     path("item/<int:item_id>/order/edit/<int:order_id>/delete/", views.delete_order, name="delete-order"),
@@ -19,4 +26,9 @@ urlpatterns = [
     path("supplier/item/<int:item_id>/edit/", views.edit_item, name="edit-item"),
     path("supplier/item/<int:item_id>/delete/", views.delete_item, name="delete-item"),
     path("supplier/item/<int:item_id>/order/edit/<int:order_id>/", views.manage_order_create, name="manage-order"),
+    path("changes/", views.change_feed, name="change-feed"),
+    path("metrics/", views.metrics, name="metrics"),
+
+    # REST API
+    path("api/", include(router.urls)),
 ]
\ No newline at end of file
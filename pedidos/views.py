@@ -1,12 +1,40 @@
+import io
+import uuid
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
 from django.views.generic import CreateView, TemplateView
-from .models import User, Item, Order
-from .forms import ClientSignUpForm, SupplierSignUpForm, LoginForm, ItemForm, OrderForm, ManageOrderOneForm, ManageOrderTwoForm, ManageOrderThreeForm
+from .models import User, Item, Order, ItemStats, SupplierStats
+from .forms import ClientSignUpForm, SupplierSignUpForm, LoginForm, ItemForm, OrderForm, CreateOrderForm, ManageOrderOneForm, ManageOrderTwoForm, ManageOrderThreeForm, CatalogFilterForm, CatalogSearchForm, DispatchQueueFilterForm, BulkDispatchForm, OrderExportForm, ItemImportForm, RepriceForm
 from django.contrib.auth import login
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
-from .decorators import client_required, supplier_required
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, Max
+from .decorators import client_required, supplier_required, staff_required, replica_reads
+from .pagination import keyset_paginate, parse_cursor
+from .caching import catalog_version, get_catalog_page, get_catalog_validators, get_item, get_supplier_items
+from .conditional import conditional_page, last_change
+from .changelog import stream_changes
+from .exports import EXPORT_FORMATS, export_rows
+from .bulk_items import import_items as import_item_rows, read_item_rows
+from .metrics import render_metrics
+from .sequences import order_numbers
+from .idempotency import run_once
+from .writes import serialized_write
+from .dispatch import save_dispatch
+from .lifecycle import InvalidTransition, transition
+from .routers import across_databases, get_across_databases, supplier_database
+
+# Number of items listed per page in the Client catalog
+CATALOG_PAGE_SIZE = 50
+# Number of orders listed in the Supplier dispatch queue
+DISPATCH_QUEUE_SIZE = 100
+# Maximum number of change log entries returned by one change feed request
+CHANGE_FEED_MAX_ENTRIES = 10000
 
 # Views for different user roles
 class ClientSignUpView(CreateView):
@@ -63,26 +91,172 @@ class LoginView(auth_views.LoginView):
 class LogoutView(TemplateView):
     template_name = 'pedidos/logout.html'
         
+# Validators of a catalog page: version of the cached catalog (bumped by every item change,
+# deletions included) and last item change of the filtered catalog (cached with the pages)
+def catalog_validators(request):
+    filter_form = CatalogFilterForm(request.GET or None)
+    latest = get_catalog_validators(filter_form.cache_key(), lambda: last_change(
+        across_databases(filter_form.filter_queryset(Item.objects.all()))))
+    return (catalog_version(), latest), latest
+
+@replica_reads
 @login_required
 @client_required
+@conditional_page(catalog_validators)
 def client_home(request):
     # Retrieve items published by Supplier and list them in the Client dashboard
-    items = Item.objects.all()
+    # The catalog is paginated by item code (keyset pagination) so every page costs
+    # a single indexed range query, no matter how many items exist
+    # Pages are served from the versioned catalog cache, the database is only read on a miss
+    # (the items of every database, see routers.py)
+    filter_form = CatalogFilterForm(request.GET or None)
+    after = parse_cursor(request.GET.get('after'))
+    before = parse_cursor(request.GET.get('before'))
+
+    def load_page():
+        items = across_databases(filter_form.filter_queryset(Item.objects.only('code', 'price')))
+        return keyset_paginate(items, 'code', after=after, before=before, per_page=CATALOG_PAGE_SIZE)
+    page = get_catalog_page(filter_form.cache_key() + (after, before), load_page)
+    # Keep the filters in the pagination links
+    filter_query = request.GET.copy()
+    filter_query.pop('after', None)
+    filter_query.pop('before', None)
     context = {
-        'items': items
+        'items': page,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': filter_query.urlencode(),
     }
     return render(request, 'pedidos/client_home.html', context)
 
+@replica_reads
+@login_required
+@client_required
+def catalog_search(request):
+    # Items whose description matches the search words, best matches first
+    # (FTS5 index of the descriptions, see search.py), with the catalog filters
+    form = CatalogSearchForm(request.GET or None)
+    context = {
+        'form': form,
+        'items': form.search(),
+    }
+    return render(request, 'pedidos/catalog_search.html', context)
+
+@replica_reads
 @login_required
 @supplier_required
 def supplier_home(request):
     # Retrieve items published and list them in the Supplier dashboard
-    items = Item.objects.filter(supplier=request.user.supplier)
+    # Supplier primary key is the user id, so there is no need to load the Supplier row
+    using = supplier_database(request.user.pk)
+    items = get_supplier_items(request.user.pk, lambda: list(
+        Item.objects.using(using).filter(supplier_id=request.user.pk).only('code').order_by('code')))
+    # Order counters kept up to date by the database (see counters.py), not cached: they
+    # change with every order. Items without orders have no counters yet.
+    stats = {stats.item_id: stats for stats in ItemStats.objects.using(using).filter(item__supplier_id=request.user.pk)}
+    for item in items:
+        item.counters = stats.get(item.code)
     context = {
         'items': items,
+        'supplier_stats': SupplierStats.objects.using(using).filter(supplier_id=request.user.pk).first(),
     }
     return render(request, 'pedidos/supplier_home.html', context)
 
+@replica_reads
+@login_required
+@supplier_required
+def supplier_queue(request):
+    # Pending orders (placed, not managed yet) of all the supplier items, highest dispatch priority first
+    # The pending orders are indexed by item and priority, so the database only reads the pending
+    # orders of the supplier items
+    filter_form = DispatchQueueFilterForm(request.GET or None)
+    orders = filter_form.filter_queryset(
+        Order.objects.using(supplier_database(request.user.pk)).filter(item__supplier_id=request.user.pk, status=Order.PLACED)
+    ).select_related('client__user').order_by('-priority', 'created_at')[:DISPATCH_QUEUE_SIZE]
+    context = {
+        'orders': orders,
+        'filter_form': filter_form,
+        'dispatch_form': BulkDispatchForm(initial=filter_form.cleaned_data if filter_form.is_valid() else None),
+    }
+    return render(request, 'pedidos/supplier_queue.html', context)
+
+# Every order of the supplier items with its dispatch, for accounting: a CSV or JSON lines
+# file streamed while the orders are read (see exports.py), so memory does not grow with them
+@replica_reads
+@login_required
+@supplier_required
+def export_orders(request):
+    form = OrderExportForm(request.GET)
+    if not form.is_valid():
+        errors = ['%s: %s' % (field, ' '.join(messages)) for field, messages in form.errors.items()]
+        return HttpResponse('\n'.join(errors) + '\n', status=400, content_type='text/plain')
+    stream, content_type, extension = EXPORT_FORMATS[form.cleaned_data['format']]
+    # The rows are read after the view returns: pick the database (or replica) now
+    using = supplier_database(request.user.pk) or router.db_for_read(Order)
+    rows = export_rows(request.user.pk, using=using, date_from=form.cleaned_data['date_from'],
+                       date_to=form.cleaned_data['date_to'])
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="pedidos-%s.%s"' % (request.user.username, extension)
+    return response
+
+# Dispatch many orders of the queue at once: the checked orders, or else the pending orders
+# that match the queue filters (at most BULK_DISPATCH_MAX_ORDERS), with the result of every order
+@login_required
+@supplier_required
+def bulk_dispatch(request):
+    results = None
+    if request.method == 'POST':
+        form = BulkDispatchForm(request.POST)
+        if form.is_valid():
+            results = form.dispatch(request.user.pk)
+    else:
+        # Filters of the queue
+        form = BulkDispatchForm(initial=request.GET.dict())
+    context = {
+        'form': form,
+        'results': results,
+        'dispatched': sum(1 for result in results if result['status'] == 'dispatched') if results is not None else 0,
+    }
+    return render(request, 'pedidos/bulk_dispatch.html', context)
+
+# Create or update many items of the supplier from an uploaded CSV or JSON lines file, with
+# the errors of every invalid row (see bulk_items.py). Uploads bigger than
+# FILE_UPLOAD_MAX_MEMORY_SIZE are kept in a temporary file and read a batch at a time.
+@login_required
+@supplier_required
+def import_items(request):
+    result = None
+    if request.method == 'POST':
+        form = ItemImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            file = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', errors='replace', newline='')
+            result = import_item_rows(request.user.pk, read_item_rows(file, form.cleaned_data['format']))
+    else:
+        form = ItemImportForm()
+    return render(request, 'pedidos/import_items.html', {'form': form, 'result': result})
+
+# Change the price of many items of the supplier at once: a preview with the number of
+# items and their new prices, then a single UPDATE (see repricing.py)
+@login_required
+@supplier_required
+def reprice_items(request):
+    preview = repriced = None
+    if request.method == 'POST':
+        form = RepriceForm(request.POST)
+        if form.is_valid():
+            if request.POST.get('action') == 'apply':
+                repriced = form.reprice(request.user.pk)
+            else:
+                preview = form.preview(request.user.pk)
+    else:
+        form = RepriceForm()
+    context = {
+        'form': form,
+        'preview': preview,
+        'repriced': repriced,
+    }
+    return render(request, 'pedidos/reprice_items.html', context)
+
 @login_required
 @supplier_required
 def create_item(request):
@@ -91,7 +265,8 @@ def create_item(request):
         # Validate the form before commiting database operations
         if form.is_valid():
             item = form.save(commit=False)
-            item.supplier = request.user.supplier
+            # Saved in the database of the supplier (see routers.py)
+            item.supplier_id = request.user.pk
             item.save()
             return redirect('supplier-home')
     else:
@@ -101,7 +276,7 @@ def create_item(request):
 @login_required
 @supplier_required
 def delete_item(request, item_id):
-    item = Item.objects.get(code=item_id)
+    item = Item.objects.using(supplier_database(request.user.pk)).get(code=item_id)
     item.delete()
 
     return redirect('supplier-home')
@@ -110,33 +285,52 @@ def delete_item(request, item_id):
 @login_required
 @client_required
 def create_order(request, item_id):
-    item = Item.objects.get(code=item_id)
-    if Order.objects.filter(item=item, client=request.user.client).exists():
-        return redirect('client-home')
+    item = get_item(item_id)
     if request.method == 'POST':
-        form = OrderForm(request.POST)
+        form = CreateOrderForm(request.POST)
         # Validate the form before commiting database operations
         if form.is_valid():
             order = form.save(commit=False)
+            # Client profile comes with the cached authenticated user
             order.client = request.user.client
             order.item = item
-            order.save()
+
+            # Orders are saved in the database of their item (see routers.py)
+            using = router.db_for_write(Order, instance=order)
+
+            def place_order(number):
+                order.orderNo = number
+                try:
+                    with transaction.atomic(using=using):
+                        order.save()
+                except IntegrityError:
+                    # The client already ordered this item (the database enforces one order
+                    # per client and item, no need to check before the insert)
+                    return None
+                return order.orderNo
+
+            # A resubmitted form (same key) is not placed again, new orders are numbered
+            # before the transaction from the block of order numbers of this process
+            run_once(order.client, form.cleaned_data['idempotency_key'], place_order,
+                     prepare=lambda: order_numbers.allocate()[0], using=using)
             return redirect('client-home')
     else:
-        form = OrderForm()
+        if item.orders.filter(client_id=request.user.pk).exists():
+            return redirect('client-home')
+        form = CreateOrderForm(initial={'idempotency_key': uuid.uuid4().hex})
     return render(request, 'pedidos/create_order.html', {'form': form, 'item': item})
 
 @login_required
 @client_required
 def edit_order(request, item_id, order_id):
-    # Getting item and order by their id
-    item = Item.objects.get(code=item_id)
-    order = Order.objects.get(orderNo=order_id)
+    # Getting item and order by their id (the order from the database of the item)
+    item = get_across_databases(Item.objects.filter(code=item_id))
+    order = item.orders.get(orderNo=order_id)
 
     if request.method == 'POST':
         form = OrderForm(request.POST, instance=order)
         if form.is_valid():
-            form.save()
+            serialized_write(form.save, using=router.db_for_write(Order, instance=order))
             return redirect('client-home')
     else:
         # Fill in the form with existing order
@@ -145,27 +339,54 @@ def edit_order(request, item_id, order_id):
 
 @login_required
 @client_required
+@require_POST
 def delete_order(request, item_id, order_id):
-    order = Order.objects.get(orderNo=order_id)
-    order.delete()
+    # Orders are not deleted but cancelled, only while they are placed (see lifecycle.TRANSITIONS)
+    # Order numbers are unique across databases, the order must be one of the client's
+    try:
+        order = get_across_databases(Order.objects.filter(orderNo=order_id, item_id=item_id, client_id=request.user.pk))
+    except Order.DoesNotExist:
+        raise Http404('No order matches the given query.')
+    using = router.db_for_write(Order, instance=order)
+    try:
+        serialized_write(lambda: transition([order.pk], Order.CANCELLED, using=using), using=using)
+    except InvalidTransition:
+        order.refresh_from_db(fields=['status'])
+        context = {
+            'item': get_item(item_id),
+            'order': order,
+            'ordered': True,
+            'error': 'Only placed orders can be cancelled (this one is %s).' % order.get_status_display().lower(),
+        }
+        return render(request, 'pedidos/client_order_detail.html', context, status=409)
 
     return redirect('client-home')
 
+# Validators of the order detail: last change of the item (from the catalog cache) and of
+# the order of the client, if any
+def order_detail_validators(request, item_id):
+    try:
+        item = get_item(item_id)
+    except Item.DoesNotExist:
+        return None
+    order = item.orders.filter(client_id=request.user.pk).aggregate(latest=Max('updated_at'))['latest']
+    return (item.updated_at, order), max(item.updated_at, order or item.updated_at)
+
+@replica_reads
 @login_required
 @client_required
+@conditional_page(order_detail_validators)
 def client_order_detail(request, item_id):
-    # Getting item by id to show its details
-    item = Item.objects.get(code=item_id)
+    # Getting item by id to show its details (from the catalog cache)
+    item = get_item(item_id)
     # Define variable ordered to determine if the item has been ordered
     # This variable is passed to templated through context data
     # If ordered == True the html template will render the option to edit the order
     # If ordered == False the html template will render the option to place an order 
-    if Order.objects.filter(item=item, client=request.user.client).exists():
-        order = Order.objects.get(item=item, client=request.user.client)
-        ordered = True
-    else:
-        order = None
-        ordered = False
+    # A single query fetches the order (if any) instead of checking and then fetching it
+    # (from the database of the item)
+    order = item.orders.filter(client_id=request.user.pk).first()
+    ordered = order is not None
     # All data passed to template through context data
     context = {
         'item': item,
@@ -174,14 +395,28 @@ def client_order_detail(request, item_id):
     }
     return render(request, 'pedidos/client_order_detail.html', context)
 
-@login_required 
+# Validators of the item detail: last change of the item and number and last change of its
+# orders, in one query (no validators when the item is not the supplier's)
+def item_detail_validators(request, item_id):
+    values = Item.objects.using(supplier_database(request.user.pk)).filter(
+        code=item_id, supplier_id=request.user.pk).aggregate(
+        item_changed=Max('updated_at'), order_count=Count('orders'), orders_changed=Max('orders__updated_at'))
+    item_changed, orders_changed = values['item_changed'], values['orders_changed']
+    if item_changed is None:
+        return None
+    return (item_changed, values['order_count'], orders_changed), max(item_changed, orders_changed or item_changed)
+
+@replica_reads
+@login_required
 @supplier_required
+@conditional_page(item_detail_validators)
 def supplier_item_detail(request, item_id):
     # Getting item by id to show its details
-    item = Item.objects.get(code=item_id)
-    if item.supplier != request.user.supplier:
+    item = Item.objects.using(supplier_database(request.user.pk)).get(code=item_id)
+    if item.supplier_id != request.user.pk:
         return redirect('supplier-home')
-    orders = Order.objects.filter(item=item)
+    # Client and its user are loaded in the same query (the template shows both for every order)
+    orders = item.orders.select_related('client__user').order_by('created_at')
     # All data passed to template through context data
     context = {
         'item': item,
@@ -193,7 +428,7 @@ def supplier_item_detail(request, item_id):
 @supplier_required
 def edit_item(request, item_id):
     # Getting item by its id
-    item = Item.objects.get(code=item_id)
+    item = Item.objects.using(supplier_database(request.user.pk)).get(code=item_id)
 
     if request.method == 'POST':
         form = ItemForm(request.POST, instance=item)
@@ -210,30 +445,47 @@ def edit_item(request, item_id):
 @supplier_required
 def manage_order_create(request, item_id, order_id):
     # Getting item and order by their id
-    item = Item.objects.get(code=item_id)
-    order = Order.objects.get(orderNo=order_id)
-
-    if request.method == 'POST':        
-        # Form order to center of distribution
-        form_one = ManageOrderOneForm(request.POST)
-        if form_one.is_valid():
-            manage_order_one = form_one.save(commit=False)
-            manage_order_one.save()
-            return redirect('supplier-home')
-        
-        # Form order to branch
-        form_two = ManageOrderTwoForm(request.POST)
-        if form_two.is_valid():
-            manage_order_two = form_two.save(commit=False)
-            manage_order_two.save()
-            return redirect('supplier-home')
-        
-        # Form order to associated company
-        form_three = ManageOrderThreeForm(request.POST)
-        if form_two.is_valid():
-            manage_order_three = form_three.save(commit=False)
-            manage_order_three.save()
-            return redirect('supplier-home')
+    item = Item.objects.using(supplier_database(request.user.pk)).get(code=item_id)
+    order = item.orders.get(orderNo=order_id)
+    error = None
+
+    if request.method == 'POST':
+        # Dispatches are saved in the database of their order (see routers.py), the work
+        # that follows them is left to the job workers (see dispatch.py)
+        using = router.db_for_write(Order, instance=order)
+        try:
+            # The most specific form is tried first: an associated company dispatch is also a
+            # valid branch dispatch (reference and branch code) that would lose its details
+            # Form order to associated company
+            form_three = ManageOrderThreeForm(request.POST)
+            if form_three.is_valid():
+                manage_order_three = form_three.save(commit=False)
+                manage_order_three.orderNo = order
+                save_dispatch(manage_order_three, using=using)
+                return redirect('supplier-home')
+
+            # Form order to branch
+            form_two = ManageOrderTwoForm(request.POST)
+            if form_two.is_valid():
+                manage_order_two = form_two.save(commit=False)
+                manage_order_two.orderNo = order
+                save_dispatch(manage_order_two, using=using)
+                return redirect('supplier-home')
+
+            # Form order to center of distribution
+            form_one = ManageOrderOneForm(request.POST)
+            if form_one.is_valid():
+                manage_order_one = form_one.save(commit=False)
+                manage_order_one.orderNo = order
+                save_dispatch(manage_order_one, using=using)
+                return redirect('supplier-home')
+        except InvalidTransition:
+            # Dispatched and cancelled orders cannot be managed (see lifecycle.TRANSITIONS)
+            order.refresh_from_db(fields=['status'])
+            error = 'This order is not pending (%s).' % order.get_status_display().lower()
+            form_one = ManageOrderOneForm()
+            form_two = ManageOrderTwoForm()
+            form_three = ManageOrderThreeForm()
     else:
         form_one = ManageOrderOneForm()
         form_two = ManageOrderTwoForm()
@@ -242,4 +494,23 @@ def manage_order_create(request, item_id, order_id):
                                                          'form_two': form_two,
                                                          'form_three': form_three,
                                                          'item': item,
-                                                         'order': order})
\ No newline at end of file
+                                                         'order': order,
+                                                         'error': error})
+
+# Change feed for downstream systems: JSON lines with the changes of items, orders and
+# dispatches of every database after the ?after= cursor (at most ?limit= entries)
+@login_required
+@staff_required
+def change_feed(request):
+    limit = parse_cursor(request.GET.get('limit')) or CHANGE_FEED_MAX_ENTRIES
+    limit = max(1, min(limit, CHANGE_FEED_MAX_ENTRIES))
+    return StreamingHttpResponse(stream_changes(request.GET.get('after'), limit), content_type='application/x-ndjson')
+
+# Request metrics of this process in the Prometheus text format (see metrics.py), for staff
+# users or with the METRICS_TOKEN bearer token (the token check needs no database query)
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if not (token and constant_time_compare(request.headers.get('Authorization', ''), 'Bearer ' + token)):
+        if not (request.user.is_active and request.user.is_staff):
+            return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,44 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, transaction
+
+# Order writes of this process take turns (SQLite has a single writer per database),
+# each database (the default one and every shard) has its own turn
+WRITE_LOCKS = defaultdict(threading.Lock)
+
+
+def is_locked_error(error):
+    # SQLite reports a busy write lock as "database is locked" (or "database table is locked")
+    return 'locked' in str(error)
+
+
+def serialized_write(write, retries=None, delay=None, using=None):
+    '''
+    Run ``write`` in a transaction of the ``using`` database and return its result.
+    With SERIALIZE_WRITES the writes of the threads of a process wait for their turn
+    on the lock of the database, so only one connection per process competes for the SQLite write
+    lock. When the database stays locked (a writer of another process holds it for
+    longer than busy_timeout) the write is retried ``retries`` times with exponential
+    backoff before the error is raised.
+    ``write`` may run more than once: it must not have side effects outside the database.
+    '''
+    retries = settings.WRITE_RETRIES if retries is None else retries
+    delay = settings.WRITE_RETRY_DELAY if delay is None else delay
+    using = using or DEFAULT_DB_ALIAS
+    for attempt in range(retries + 1):
+        try:
+            if settings.SERIALIZE_WRITES:
+                with WRITE_LOCKS[using], transaction.atomic(using=using):
+                    return write()
+            with transaction.atomic(using=using):
+                return write()
+        except OperationalError as error:
+            # Inside a transaction of the caller the lock belongs to the outer transaction,
+            # retrying the inner block cannot help
+            if attempt == retries or not is_locked_error(error) or transaction.get_connection(using).in_atomic_block:
+                raise
+        # Jitter keeps the retries of concurrent writers apart
+        time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))